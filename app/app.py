@@ -6,37 +6,52 @@ from __future__ import annotations
 
 import asyncio
 import os
+import sqlite3
 import textwrap
+import time
 import traceback
 import uuid
 import argparse
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from langchain.agents import create_agent
-from langchain.agents.middleware import (
-    ModelRequest,
-    SummarizationMiddleware,
-    TodoListMiddleware,
-    dynamic_prompt,
-)
-from langchain.tools import ToolRuntime, tool
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import ChatOpenAI
 
-from config.mcp_config import get_mcp_dict
-from prompts import middleware_todolist, prompt_enhance, subagent_search
-from tools.tool_role import role_play
+from config.mcp_config import gen_abspath, get_mcp_dict
+from prompts import conversation_summary, middleware_todolist, prompt_enhance, subagent_search
 from tools.tool_runtime import ToolSchema
-from tools.tool_sci import calculator
-from tools.tool_search import dashscope_search
-from utils.remove_html import get_cleaned_text
+from utils.conversation_store import ConversationStore, format_transcript
+from utils.lazy_import import LazyModule, preload
+from utils.model_limiter import LimiterStats, ModelBusyError, ModelCallLimiter
+from utils.remove_html import get_cleaned_text_cached
+from utils.search_cache import SearchCache
+from utils.stream_buffer import StreamBuffer, with_flush_ticks
 from utils.tool_view import format_tool_call, format_tool_result
-from utils.web_ui import create_ui, custom_css, theme
+
+if TYPE_CHECKING:
+    from langchain.agents.middleware import ModelRequest
+    from langchain_openai import ChatOpenAI
+
+    from utils.checkpoint_store import SqliteCheckpointSaver
+    from utils.mcp_batch import ToolCallCoalescer
+    from utils.mcp_session import PersistentSessionInterceptor
+    from utils.mcp_tools import MCPToolCache, MCPToolLoader
 
 load_dotenv()
 
+# 创建 Agent 时才用到的依赖按需导入，`import app` 与 Web 服务绑定端口都不必等待它们
+agents = LazyModule("langchain.agents")
+agent_middleware = LazyModule("langchain.agents.middleware")
+langchain_openai = LazyModule("langchain_openai")
+tool_role = LazyModule("tools.tool_role")
+tool_sci = LazyModule("tools.tool_sci")
+tool_search = LazyModule("tools.tool_search")  # 仅 dashscope 提供商
+mcp_tool_loader = LazyModule("utils.mcp_tools")  # 仅启用了 MCP 服务时
+mcp_batch = LazyModule("utils.mcp_batch")
+mcp_session = LazyModule("utils.mcp_session")
+checkpoint_store = LazyModule("utils.checkpoint_store")  # 仅启用了会话持久化时
+
 TYPING_INDICATOR_HTML = (
     '<span class="typing-indicator" aria-label="AI 正在回复">'
     "<span></span><span></span><span></span>"
@@ -133,15 +148,136 @@ class MCPConfig:
                 # "antv-chart:stdio",
                 # "filesystem:stdio",
                 # "amap-maps:http",
+                # "math:http",
+                # "weather:http",
             }
         )
     )
     base_path: str = "./"
+    # stdio 服务复用常驻会话，避免每次工具调用都重新启动子进程
+    keep_alive: bool = True
+    # 服务提供 <工具>_batch 时，把同一步中并发的同名调用合并为一次批量调用
+    coalesce: bool = True
+    coalesce_window: float = 0.005  # 合并窗口（秒）
+    # 工具定义缓存文件（相对 base_path），启动时直接使用，不必等待各服务连接；为 None 时不写磁盘
+    tool_cache: Optional[str] = ".cache/mcp_tools.json"
+    # 后台核对工具列表的间隔（秒），有变化时更新缓存并替换主 Agent
+    tool_refresh_interval: float = 600.0
+    # 启动时等待每个服务的时间（秒），超时的服务在后台继续连接，连上后再加入 Agent
+    connect_timeout: float = 5.0
+    # 按服务名称覆盖 connect_timeout，例如 {"antv-chart:stdio": 30.0}
+    server_timeouts: Dict[str, float] = field(default_factory=dict)
+    # 单次获取工具列表的时间上限（秒），避免卡住的服务一直占着后台任务
+    fetch_timeout: float = 60.0
+    # 有服务连接失败时，隔多久再重试（秒）
+    retry_interval: float = 30.0
 
     def get_active_dict(self) -> dict:
         """获取已启用的 MCP 配置字典"""
         return {k: v for k, v in get_mcp_dict(self.base_path).items() if k in self.enabled}
 
+    def build_tool_cache(self) -> MCPToolCache:
+        if self.tool_cache is None:
+            return mcp_tool_loader.MCPToolCache()
+        return mcp_tool_loader.MCPToolCache(gen_abspath(self.base_path, self.tool_cache))
+
+
+@dataclass
+class ModelLimitConfig:
+    """模型调用并发限制配置，所有会话共用一个 Agent，只限制同时进行的模型调用"""
+
+    max_concurrency: int = 32  # 同时进行的模型调用数上限
+    max_waiting: int = 256  # 排队上限，超出后直接拒绝
+    acquire_timeout: float = 60.0  # 排队等待超时（秒）
+
+    def build(self) -> ModelCallLimiter:
+        return ModelCallLimiter(
+            limit=self.max_concurrency,
+            max_waiting=self.max_waiting,
+            acquire_timeout=self.acquire_timeout,
+        )
+
+
+@dataclass
+class StreamConfig:
+    """流式输出配置"""
+
+    interval: float = 0.03  # 合并窗口（秒）
+    max_bytes: int = 256  # 未刷新内容达到该字节数时立即刷新
+
+
+@dataclass
+class HistoryConfig:
+    """
+    对话历史窗口配置：较早的对话并入服务端保存的摘要，每轮只发送摘要与最近的消息
+
+    默认配置下不生效：会话持久化默认启用，历史保存在 checkpoint 中，每轮只发送新消息，
+    由主 Agent 的 SummarizationMiddleware 压缩 checkpoint 中的历史，本窗口只在用界面历史
+    初始化新会话时压缩一次。关闭会话持久化（SessionConfig.enabled=False）后每轮都生效，
+    界面上传的完整历史以「摘要 + 最近的消息」发给 Agent。
+    """
+
+    enabled: bool = True
+    # 未摘要的历史超过该 token 数时并入摘要；低于主 Agent 中 SummarizationMiddleware 的 2000，
+    # 使其只在单轮内工具输出过长时才介入
+    trigger_tokens: int = 1500
+    keep_tokens: int = 600  # 摘要后保留的最近消息的 token 数
+    maxsize: int = 1024  # 最多保存的摘要数
+
+    def build(self, summarize: Any) -> Optional[ConversationStore]:
+        if not self.enabled:
+            return None
+        return ConversationStore(
+            summarize,
+            trigger_tokens=self.trigger_tokens,
+            keep_tokens=self.keep_tokens,
+            maxsize=self.maxsize,
+        )
+
+
+@dataclass
+class SessionConfig:
+    """会话持久化配置：对话状态以 checkpoint 形式保存在 SQLite 中，界面每轮只发送新消息与会话 ID"""
+
+    enabled: bool = True
+    path: str = ".cache/sessions.sqlite"  # 为 ":memory:" 时不写磁盘，重启后会话丢失
+    batch_size: int = 64  # 缓冲的写入达到该条数时提交
+    flush_interval: float = 0.2  # 缓冲的写入最多等待的时间（秒）
+    # 每轮对话结束时才写入 checkpoint，而不是每一步都写；中途出错或被中止时也会写入已完成的步骤
+    durability: str = "exit"
+    snapshot_every: int = 20  # 消息列表每隔多少个版本保存一次完整快照，其余版本只保存新增的消息
+    keep_last: Optional[int] = 50  # 每个会话保留的 checkpoint 数，更早的无法再回溯
+    max_age: Optional[float] = 30 * 86400  # 超过该时间（秒）未更新的 checkpoint 被删除
+    compact_interval: Optional[float] = 3600.0  # 后台清理的间隔（秒），为 None 时不清理
+
+    def build(self) -> Optional[SqliteCheckpointSaver]:
+        if not self.enabled:
+            return None
+        return checkpoint_store.SqliteCheckpointSaver(
+            self.path,
+            batch_size=self.batch_size,
+            flush_interval=self.flush_interval,
+            snapshot_every=self.snapshot_every,
+        )
+
+
+@dataclass
+class SearchCacheConfig:
+    """搜索结果缓存配置（dashscope_search 与 subagent_search_brief 共用）"""
+
+    enabled: bool = True
+    maxsize: int = 256  # 进程内缓存的条目数
+    ttl: float = 600.0  # 有效期（秒）
+    stale_ttl: float = 3600.0  # 过期后的宽限期（秒），期间先返回旧结果再后台刷新
+    path: Optional[str] = None  # SQLite 文件路径，设置后启用二级缓存
+
+    def build(self) -> Optional[SearchCache]:
+        if not self.enabled:
+            return None
+        return SearchCache(
+            maxsize=self.maxsize, ttl=self.ttl, stale_ttl=self.stale_ttl, path=self.path
+        )
+
 
 @dataclass
 class AppConfig:
@@ -149,6 +285,11 @@ class AppConfig:
 
     llm: LLMConfig = field(default_factory=LLMConfig)
     mcp: MCPConfig = field(default_factory=MCPConfig)
+    model_limit: ModelLimitConfig = field(default_factory=ModelLimitConfig)
+    stream: StreamConfig = field(default_factory=StreamConfig)
+    search_cache: SearchCacheConfig = field(default_factory=SearchCacheConfig)
+    history: HistoryConfig = field(default_factory=HistoryConfig)
+    sessions: SessionConfig = field(default_factory=SessionConfig)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -156,13 +297,14 @@ class AppConfig:
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-@dynamic_prompt
+# 创建 Agent 时再用 dynamic_prompt 包装为中间件
+
+
 def _main_agent_prompt(_: ModelRequest) -> str:
     """主 Agent 的动态系统提示词"""
     return prompt_enhance.get_system_prompt()
 
 
-@dynamic_prompt
 def _search_subagent_prompt(_: ModelRequest) -> str:
     """搜索子 Agent 的动态系统提示词"""
     return subagent_search.get_system_prompt()
@@ -179,16 +321,31 @@ class AgentService:
 
     负责：
     - LLM 实例的懒加载
-    - 搜索子 Agent 的懒加载
-    - 主 Agent 的创建与并发安全缓存
+    - 搜索子 Agent 与搜索结果缓存的懒加载
+    - 主 Agent 的预热（所有会话共用）与模型调用的并发限制
+    - 对话历史的滚动摘要
+    - 会话状态的持久化
+    - MCP 工具定义的缓存与后台刷新
     """
 
     def __init__(self, config: AppConfig) -> None:
         self._config = config
         self._llm: Optional[ChatOpenAI] = None
         self._search_subagent: Optional[Any] = None
+        self._search_cache: Optional[SearchCache] = None
+        self._conversations: Optional[ConversationStore] = None
+        self._sessions: Optional[SqliteCheckpointSaver] = None
         self._agent: Optional[Any] = None
+        self._model_limiter = config.model_limit.build()
         self._lock = asyncio.Lock()
+        self._mcp_loader: Optional[MCPToolLoader] = None
+        self._coalescer: Optional[ToolCallCoalescer] = None
+        self._mcp_sessions: Optional[PersistentSessionInterceptor] = None
+        self._mcp_refresh: Optional[asyncio.Task] = None
+        self._mcp_refresh_at = 0.0  # 下一次允许后台刷新的时间（time.monotonic）
+        self._compaction: Optional[asyncio.Task] = None
+        self._compact_at = 0.0  # 下一次清理会话存储的时间（time.monotonic）
+        self.warmup_error: Optional[BaseException] = None  # 最近一次后台预热的异常
 
     # ── LLM ──────────────────────────────────────────────────────────────────
 
@@ -196,7 +353,7 @@ class AgentService:
     def llm(self) -> ChatOpenAI:
         """获取 LLM 实例（懒加载）"""
         if self._llm is None:
-            self._llm = ChatOpenAI(**self._config.llm.to_kwargs())
+            self._llm = langchain_openai.ChatOpenAI(**self._config.llm.to_kwargs())
         return self._llm
 
     # ── 搜索子 Agent ──────────────────────────────────────────────────────────
@@ -205,83 +362,337 @@ class AgentService:
     def search_subagent(self) -> Any:
         """获取搜索子 Agent（懒加载）"""
         if self._search_subagent is None:
-            self._search_subagent = create_agent(
+            self._search_subagent = agents.create_agent(
                 model=self.llm,
-                tools=[dashscope_search],
-                middleware=[_search_subagent_prompt],
+                tools=[tool_search.dashscope_search],
+                middleware=[
+                    agent_middleware.dynamic_prompt(_search_subagent_prompt),
+                    agent_middleware.wrap_model_call(self._limit_model_call),
+                ],
             )
         return self._search_subagent
 
-    def _make_search_brief_tool(self) -> Any:
-        """创建 subagent_search_brief 工具"""
-        subagent = self.search_subagent  # 提前绑定，避免闭包延迟求值
-
-        @tool("subagent_search_brief", description=subagent_search.get_tool_description())
-        async def search_brief(query: str, runtime: ToolRuntime[ToolSchema]) -> str:
-            """调用搜索子 Agent，返回摘要后的搜索结果"""
-            result = await subagent.ainvoke(
-                {"messages": [{"role": "user", "content": query}]},
-                config={"configurable": {"thread_id": str(uuid.uuid4())}},
-                context=runtime.context,
+    @property
+    def search_cache(self) -> Optional[SearchCache]:
+        """获取搜索结果缓存（懒加载），未启用时为 None"""
+        if self._search_cache is None and self._config.search_cache.enabled:
+            self._search_cache = self._config.search_cache.build()
+        return self._search_cache
+
+    # ── 对话历史 ──────────────────────────────────────────────────────────────
+
+    @property
+    def conversations(self) -> Optional[ConversationStore]:
+        """获取对话历史摘要（懒加载），未启用时为 None"""
+        if self._conversations is None and self._config.history.enabled:
+            self._conversations = self._config.history.build(self._summarize_history)
+        return self._conversations
+
+    async def _summarize_history(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """把较早的消息并入已有摘要"""
+        prompt = conversation_summary.get_summary_prompt(summary, format_transcript(messages))
+        response = await self.llm.ainvoke(prompt)
+        return str(getattr(response, "content", response))
+
+    # ── 会话 ──────────────────────────────────────────────────────────────────
+
+    @property
+    def sessions(self) -> Optional[SqliteCheckpointSaver]:
+        """获取会话存储（懒加载），未启用时为 None"""
+        if self._sessions is None and self._config.sessions.enabled:
+            self._sessions = self._config.sessions.build()
+        return self._sessions
+
+    async def load_thread(self, thread_id: str) -> Optional[List[Any]]:
+        """
+        读取会话已保存的消息，会话不存在时返回空列表，未启用会话持久化时返回 None
+
+        只读取 SQLite，不需要等待 Agent 预热。
+        """
+        if not self._config.sessions.enabled:
+            return None
+        if self._sessions is None:
+            # 第一次使用时在线程中导入依赖并打开数据库
+            await asyncio.to_thread(preload, [checkpoint_store])
+        saved = await self.sessions.aget_tuple({"configurable": {"thread_id": thread_id}})
+        if saved is None:
+            return []
+        return list(saved.checkpoint["channel_values"].get("messages", []))
+
+    async def has_thread(self, thread_id: str) -> bool:
+        """会话是否已保存，只查询是否存在 checkpoint，不读取会话内容"""
+        if not self._config.sessions.enabled:
+            return False
+        if self._sessions is None:
+            await asyncio.to_thread(preload, [checkpoint_store])
+        return await self.sessions.ahas_thread(thread_id)
+
+    def _schedule_session_compaction(self) -> None:
+        """到了清理时间时，在后台删除过期的 checkpoint 并回收数据库空间"""
+        interval = self._config.sessions.compact_interval
+        if self._sessions is None or interval is None or time.monotonic() < self._compact_at:
+            return
+        if self._compaction is not None and not self._compaction.done():
+            return
+        self._compact_at = time.monotonic() + interval
+        self._compaction = asyncio.create_task(self._compact_sessions(self._sessions))
+
+    async def _compact_sessions(self, sessions: SqliteCheckpointSaver) -> None:
+        config = self._config.sessions
+        try:
+            stats = await asyncio.to_thread(
+                sessions.compact, keep_last=config.keep_last, max_age=config.max_age
+            )
+            await asyncio.to_thread(sessions.vacuum)
+        except sqlite3.Error as e:
+            print(f"会话存储清理失败: {e}")
+            return
+        if stats.checkpoints:
+            print(
+                f"会话存储清理完成：删除 {stats.checkpoints} 个 checkpoint"
+                f"（{stats.threads} 个会话），{stats.blobs} 个通道值，{stats.writes} 条写入"
             )
-            return result["messages"][-1].content
 
-        return search_brief
+    def close(self) -> None:
+        """提交尚未写入的会话状态"""
+        if self._sessions is not None:
+            self._sessions.close()
+            self._sessions = None
+
+    async def aclose(self) -> None:
+        """
+        关闭常驻的 MCP 会话并提交会话存储
+
+        stdio 服务在会话关闭时退出，warm 模式的代码执行服务随之关闭其常驻解释器池。
+        """
+        if self._mcp_sessions is not None:
+            try:
+                await self._mcp_sessions.aclose()
+            except Exception as e:
+                print(f"关闭 MCP 常驻会话失败: {e}")
+            self._mcp_sessions = None
+        self.close()
+
+    def _make_search_brief_tool(self) -> Any:
+        """创建 subagent_search_brief 工具"""
+        return tool_search.make_search_brief_tool(
+            self.search_subagent,
+            self.search_cache,
+            # 摘要由主模型生成，模型不同时不共用缓存
+            namespace=f"subagent_search_brief:{self._config.llm.model}",
+            description=subagent_search.get_tool_description(),
+        )
 
     def _get_local_tools(self) -> List[Any]:
         """获取与当前 provider 匹配的本地工具"""
         local_tools: List[Any] = [
-            calculator,
-            role_play,
+            tool_sci.calculator,
+            tool_sci.calculator_batch,
+            tool_role.role_play,
         ]
         if self._config.llm.provider == "dashscope":
+            # dashscope_search 是模块级工具，缓存在这里随服务配置一起设置
+            tool_search.set_search_cache(self.search_cache)
             local_tools.extend(
                 [
-                    dashscope_search,
+                    tool_search.dashscope_search,
                     self._make_search_brief_tool(),
                 ]
             )
         return local_tools
 
+    def _required_modules(self) -> List[LazyModule]:
+        """创建主 Agent 需要导入的模块，未启用的功能不在其中"""
+        modules = [agents, agent_middleware, langchain_openai, tool_sci, tool_role]
+        if self._config.llm.provider == "dashscope":
+            modules.append(tool_search)
+        mcp_config = self._config.mcp
+        mcp_dict = mcp_config.get_active_dict()
+        if mcp_dict:
+            modules.append(mcp_tool_loader)
+            if mcp_config.coalesce:
+                modules.append(mcp_batch)
+            if mcp_config.keep_alive and any(
+                v.get("transport") == "stdio" for v in mcp_dict.values()
+            ):
+                modules.append(mcp_session)
+        if self._config.sessions.enabled:
+            modules.append(checkpoint_store)
+        return modules
+
     # ── 主 Agent ──────────────────────────────────────────────────────────────
 
+    async def _load_mcp_tools(self) -> List[Any]:
+        """
+        获取 MCP 工具
+
+        有缓存的服务直接使用缓存的工具定义，连接在第一次调用工具时才建立。
+        没有缓存的服务并发连接，某个服务慢或不可用时不影响其他服务。
+        """
+        mcp_config = self._config.mcp
+        mcp_dict = mcp_config.get_active_dict()
+        if not mcp_dict:
+            return []
+
+        interceptors = []
+        if mcp_config.coalesce:
+            # 放在最外层，合并后的批量调用仍会经过常驻会话
+            self._coalescer = mcp_batch.ToolCallCoalescer(window=mcp_config.coalesce_window)
+            interceptors.append(self._coalescer)
+        if mcp_config.keep_alive:
+            stdio_servers = [k for k, v in mcp_dict.items() if v.get("transport") == "stdio"]
+            if stdio_servers:
+                self._mcp_sessions = mcp_session.PersistentSessionInterceptor(
+                    mcp_dict, stdio_servers
+                )
+                interceptors.append(self._mcp_sessions)
+
+        loader = mcp_tool_loader.MCPToolLoader(
+            mcp_dict,
+            mcp_config.build_tool_cache(),
+            tool_interceptors=interceptors,
+            timeout=mcp_config.connect_timeout,
+            server_timeouts=mcp_config.server_timeouts,
+            fetch_timeout=mcp_config.fetch_timeout,
+        )
+        tools = await loader.load()
+        self._mcp_loader = loader
+        self._report_mcp_servers(loader)
+        if loader.late_servers:
+            print(f"以下 MCP 服务仍在连接，连上后自动加入: {loader.late_servers}")
+            self._mcp_refresh_at = 0.0
+        elif not loader.cached_servers:
+            # 刚从服务取回，不需要马上核对
+            self._mcp_refresh_at = self._next_mcp_refresh(loader)
+        return self._register_mcp_tools(tools)
+
+    def _next_mcp_refresh(self, loader: MCPToolLoader) -> float:
+        """有服务失败或尚未核对时提前重试"""
+        mcp_config = self._config.mcp
+        interval = mcp_config.tool_refresh_interval
+        if loader.failed_servers or loader.cached_servers:
+            interval = min(interval, mcp_config.retry_interval)
+        return time.monotonic() + interval
+
+    @staticmethod
+    def _report_mcp_servers(loader: MCPToolLoader) -> None:
+        for name, exc in loader.failed_servers.items():
+            # MCP 客户端把连接错误包在 TaskGroup 的异常组里，取出最里层的原因
+            while isinstance(exc, BaseExceptionGroup) and exc.exceptions:
+                exc = exc.exceptions[0]
+            detail = str(exc) or type(exc).__name__
+            print(f"MCP 服务 {name} 连接失败，暂不可用: {detail}")
+
+    def _register_mcp_tools(self, tools: List[Any]) -> List[Any]:
+        if self._coalescer is not None:
+            self._coalescer.register(tools)
+        return tools
+
+    def _schedule_mcp_refresh(self) -> None:
+        """到了刷新时间时，在后台补充迟到的服务或核对 MCP 工具列表"""
+        if self._mcp_loader is None or time.monotonic() < self._mcp_refresh_at:
+            return
+        if self._mcp_refresh is not None and not self._mcp_refresh.done():
+            return
+        self._mcp_refresh_at = time.monotonic() + self._config.mcp.tool_refresh_interval
+        self._mcp_refresh = asyncio.create_task(self._refresh_mcp_tools(self._mcp_loader))
+
+    async def _refresh_mcp_tools(self, loader: MCPToolLoader) -> None:
+        """重新获取工具列表，有变化时换用新的主 Agent；进行中的对话继续使用旧的 Agent"""
+        try:
+            if loader.late_servers:
+                tools = await loader.attach_late()
+            else:
+                tools = await loader.refresh()
+        except asyncio.CancelledError:
+            # 事件循环结束时被取消（例如启动阶段的 asyncio.run），下次获取 Agent 时重试
+            self._mcp_refresh_at = 0.0
+            raise
+        self._report_mcp_servers(loader)
+        self._mcp_refresh_at = self._next_mcp_refresh(loader)
+        if loader.cached_servers:
+            print(f"以下 MCP 服务暂时无法连接，继续使用缓存的工具: {loader.cached_servers}")
+        if tools is not None and self._agent is not None:
+            # 正在进行的对话继续使用旧的 Agent，新的对话使用新的 Agent
+            self._agent = self._build_agent(self._register_mcp_tools(tools))
+            print(f"MCP 工具列表已更新，共 {len(tools)} 个")
+
+    async def _limit_model_call(self, request: Any, handler: Any) -> Any:
+        """模型调用期间占用一个并发名额"""
+        async with self._model_limiter.slot():
+            return await handler(request)
+
+    def _build_agent(self, mcp_tools: List[Any]) -> Any:
+        """创建主 Agent，所有会话共用"""
+        return agents.create_agent(
+            model=self.llm,
+            tools=mcp_tools + self._get_local_tools(),
+            middleware=[
+                agent_middleware.dynamic_prompt(_main_agent_prompt),
+                agent_middleware.SummarizationMiddleware(
+                    model=self.llm,
+                    trigger=("tokens", 2000),
+                    keep=("messages", 7),
+                ),
+                agent_middleware.TodoListMiddleware(
+                    system_prompt=middleware_todolist.get_system_prompt()
+                ),
+                agent_middleware.wrap_model_call(self._limit_model_call),
+            ],
+            # 对话状态都在会话存储中，编译好的 Agent 可以同时处理多个会话
+            checkpointer=self.sessions,
+        )
+
     async def get_agent(self) -> Any:
         """获取主 Agent（懒加载 + 双重检查，并发安全）"""
-        if self._agent is not None:
-            return self._agent
+        if self._agent is None:
+            async with self._lock:
+                if self._agent is None:  # 双重检查
+                    self._agent = self._build_agent(await self._load_mcp_tools())
 
-        async with self._lock:
-            if self._agent is not None:  # 双重检查
-                return self._agent
-
-            # 获取 MCP 工具
-            mcp_dict = self._config.mcp.get_active_dict()
-            mcp_tools: List[Any] = []
-            if mcp_dict:
-                client = MultiServerMCPClient(mcp_dict)
-                mcp_tools = await client.get_tools()
+        self._schedule_mcp_refresh()
+        self._schedule_session_compaction()
+        return self._agent
 
-            self._agent = create_agent(
-                model=self.llm,
-                tools=mcp_tools + self._get_local_tools(),
-                middleware=[
-                    _main_agent_prompt,
-                    SummarizationMiddleware(
-                        model=self.llm,
-                        trigger=("tokens", 2000),
-                        keep=("messages", 7),
-                    ),
-                    TodoListMiddleware(system_prompt=middleware_todolist.get_system_prompt()),
-                ],
-            )
+    @property
+    def ready(self) -> bool:
+        """主 Agent 是否已创建完成"""
+        return self._agent is not None
 
+    def peek_agent(self) -> Optional[Any]:
+        """不等待预热，直接获取主 Agent 用于只读场景，未创建时返回 None"""
         return self._agent
 
+    async def warmup(self) -> None:
+        """
+        在后台预热主 Agent（连接 MCP 服务、创建 Agent）
+
+        失败时记录在 warmup_error 中，第一次对话时会再次尝试。
+        """
+        start = time.perf_counter()
+        try:
+            # 在线程中导入依赖，不阻塞事件循环上的页面请求
+            await asyncio.to_thread(preload, self._required_modules())
+            await self.get_agent()
+        except Exception as exc:
+            self.warmup_error = exc
+            print(f"预热 Agent 时出错: {exc}")
+        else:
+            self.warmup_error = None
+            print(f"Agent 预热完成，用时 {time.perf_counter() - start:.2f}s")
+
+    def model_stats(self) -> LimiterStats:
+        """获取模型调用并发限制的运行指标"""
+        return self._model_limiter.stats()
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 应用层辅助函数
 # ─────────────────────────────────────────────────────────────────────────────
 
+# 需要跳过输出的子 Agent 名称（避免与主流输出重复）
+SKIP_SUBAGENTS = {"subagent:search-brief"}
+
 
 def _get_tools_info(agent: Any) -> str:
     """获取 Agent 工具列表的可读描述"""
@@ -297,10 +708,22 @@ def _get_tools_info(agent: Any) -> str:
     return f"\n```text\n{wrapped}\n```\n"
 
 
+GREETING_PLACEHOLDER = "你好！我是你的智能助手，正在准备工具，稍等片刻也可以直接提问。"
+
+
+def _is_settled(service: AgentService) -> bool:
+    """后台预热是否已结束（成功或失败），界面据此停止刷新欢迎消息"""
+    return service.ready or service.warmup_error is not None
+
+
 def _get_greeting(service: AgentService) -> str:
-    """获取初始欢迎消息"""
+    """获取初始欢迎消息，Agent 尚未预热完成时返回占位消息"""
+    agent = service.peek_agent()
+    if agent is None:
+        if service.warmup_error is None:
+            return GREETING_PLACEHOLDER
+        return "你好！我是你的智能助手。\n请问有什么可以帮你的吗？"
     try:
-        agent = asyncio.run(service.get_agent())
         tools_info = _get_tools_info(agent)
         return "\n".join(
             [
@@ -342,49 +765,91 @@ async def _stream_events(
     messages: List[Dict],
     history: List[Dict[str, str]],
     tool_context: ToolSchema,
+    stream: Optional[StreamConfig] = None,
+    thread_id: Optional[str] = None,
+    durability: str = "exit",
 ) -> AsyncIterator[Tuple[str, List[Dict[str, str]]]]:
-    """处理 Agent 事件流，更新 history 并逐步 yield"""
-    # 需要跳过输出的子 Agent 名称（避免与主流输出重复）
-    SKIP_SUBAGENTS = {"subagent:search-brief"}
+    """
+    处理 Agent 事件流，合并片段后更新 history 并 yield
 
-    def clear_typing_indicator() -> None:
+    传入 thread_id 时，Agent 从会话存储中读取此前的对话，messages 只需包含本轮新增的消息。
+    """
+    stream = stream or StreamConfig()
+    session_kwargs: Dict[str, Any] = {}
+    if thread_id is not None:
+        session_kwargs = {
+            "config": {"configurable": {"thread_id": thread_id}},
+            "durability": durability,
+        }
+    buffer = StreamBuffer(history[-1], interval=stream.interval, max_bytes=stream.max_bytes)
+
+    def flush() -> bool:
+        """把缓冲区写入 history，有新内容时返回 True"""
+        if not buffer.pending:
+            return False
         if history[-1]["content"] == TYPING_INDICATOR_HTML:
             history[-1]["content"] = ""
-
-    async for mode, payload in agent.astream(
-        {"messages": messages},
-        stream_mode=["messages", "values"],
-        context=tool_context,
-    ):
-        if mode == "messages":
-            token, metadata = payload
-            node = metadata.get("langgraph_node", "")
-
-            if node == "model" and token.content:
-                clear_typing_indicator()
-                history[-1]["content"] += token.content
-                yield "", history
-
-            elif node == "tools":
-                if token.name in SKIP_SUBAGENTS:
-                    continue
-                if token.content:
-                    clear_typing_indicator()
-                    history[-1]["content"] += format_tool_result(token.name, token.content)
+        buffer.flush()
+        return True
+
+    events = with_flush_ticks(
+        agent.astream(
+            {"messages": messages},
+            stream_mode=["messages", "values"],
+            context=tool_context,
+            **session_kwargs,
+        ),
+        buffer.remaining,
+    )
+    try:
+        async for event in events:
+            if event is None:
+                # 模型停顿：时间窗口已到，先展示已攒下的内容
+                if flush():
                     yield "", history
-
-        elif mode == "values":
-            state_msgs = payload.get("messages") if isinstance(payload, dict) else None
-            if not state_msgs:
                 continue
-            tool_calls = getattr(state_msgs[-1], "tool_calls", None)
-            if tool_calls:
-                clear_typing_indicator()
-                history[-1]["content"] += "".join(
-                    format_tool_call(tc.get("name") or "unknown", tc.get("args") or {})
-                    for tc in tool_calls
-                )
-                yield "", history
+
+            mode, payload = event
+            if mode == "messages":
+                token, metadata = payload
+                node = metadata.get("langgraph_node", "")
+
+                if node == "model" and token.content:
+                    buffer.append(token.content)
+                    # 首个 token 立即展示，之后按窗口合并
+                    first = history[-1]["content"] == TYPING_INDICATOR_HTML
+                    if (first or buffer.due()) and flush():
+                        yield "", history
+
+                elif node == "tools":
+                    if token.name in SKIP_SUBAGENTS:
+                        continue
+                    if token.content:
+                        buffer.append(format_tool_result(token.name, token.content))
+                        if flush():
+                            yield "", history
+
+            elif mode == "values":
+                state_msgs = payload.get("messages") if isinstance(payload, dict) else None
+                if not state_msgs:
+                    continue
+                tool_calls = getattr(state_msgs[-1], "tool_calls", None)
+                if tool_calls:
+                    buffer.append(
+                        "".join(
+                            format_tool_call(tc.get("name") or "unknown", tc.get("args") or {})
+                            for tc in tool_calls
+                        )
+                    )
+                    if flush():
+                        yield "", history
+
+        if flush():
+            yield "", history
+    finally:
+        await events.aclose()
+        # 出错或被取消时，保留已收到但尚未展示的内容
+        flush()
 
 
 def _message_content_for_llm(role: str, content: Any) -> Any:
@@ -398,7 +863,7 @@ def _message_content_for_llm(role: str, content: Any) -> Any:
             or "tool-result-details" in content
             or "think-result-details" in content
         ):
-            return get_cleaned_text(content)
+            return get_cleaned_text_cached(content)
         return content
 
     if isinstance(content, list):
@@ -429,6 +894,45 @@ def build_llm_messages(history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return messages
 
 
+def build_ui_history(messages: List[Any]) -> List[Dict[str, str]]:
+    """
+    把会话中保存的消息还原为界面上的对话历史
+
+    与流式输出时的展示一致：一轮中的模型回复、工具调用与工具结果合并为一条 assistant 消息。
+    SummarizationMiddleware 生成的摘要消息不展示。
+    """
+    history: List[Dict[str, str]] = []
+    for message in messages:
+        kind = getattr(message, "type", "")
+        if kind == "human":
+            if message.additional_kwargs.get("lc_source") == "summarization":
+                continue
+            history.append({"role": "user", "content": message.text})
+            continue
+        if kind == "ai":
+            content = message.text + "".join(
+                format_tool_call(tc.get("name") or "unknown", tc.get("args") or {})
+                for tc in message.tool_calls
+            )
+        elif kind == "tool" and message.name not in SKIP_SUBAGENTS and message.text:
+            content = format_tool_result(message.name, message.text)
+        else:
+            continue
+        if history and history[-1]["role"] == "assistant":
+            history[-1]["content"] += content
+        else:
+            history.append({"role": "assistant", "content": content})
+    return history
+
+
+def _drop_greeting(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """去掉第一条用户消息之前的开场消息，开场消息只用于界面展示"""
+    for i, message in enumerate(messages):
+        if message.get("role") == "user":
+            return messages[i:]
+    return messages
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 应用层：响应生成
 # ─────────────────────────────────────────────────────────────────────────────
@@ -437,12 +941,18 @@ def build_llm_messages(history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 def make_generate_response(service: AgentService, config: AppConfig):
     """
     工厂函数：返回绑定了 service 和 config 的 generate_response 协程生成器。
-    Gradio 的 llm_func 签名为 (message, history) -> AsyncIterator。
+    Gradio 的 llm_func 签名为 (message, history, thread_id) -> AsyncIterator。
+
+    启用会话持久化时，此前的对话从会话存储中读取，每轮只把新消息发给 Agent；
+    会话尚不存在时（新会话或会话存储被清空），用界面上的历史初始化会话。
+    没有传入 thread_id 时使用一次性的会话。
+    对话历史窗口（service.conversations）只压缩由界面历史构造的消息，已有会话的轮次不经过它。
     """
 
     async def generate_response(
         message: str,
         history: List[Dict[str, str]],
+        thread_id: Optional[str] = None,
     ) -> AsyncIterator[Tuple[str, List[Dict[str, str]]]]:
         if not message or not message.strip():
             yield "", history
@@ -453,19 +963,55 @@ def make_generate_response(service: AgentService, config: AppConfig):
         yield "", history
 
         try:
-            messages = build_llm_messages(history[:-1])
-            agent = await service.get_agent()
+            stored = False
+            if service.sessions is not None:
+                thread_id = thread_id or uuid.uuid4().hex
+                # 每轮只需知道会话是否存在，完整的会话状态由 Agent 运行时读取
+                stored = await service.has_thread(thread_id)
+            else:
+                thread_id = None
+
+            if stored:
+                messages = [{"role": "user", "content": message}]
+                conversations = None
+            else:
+                # 超长工具输出的清洗放到线程中，避免阻塞其他会话的流式输出
+                messages = await asyncio.to_thread(build_llm_messages, history[:-1])
+                if thread_id is not None:
+                    messages = _drop_greeting(messages)
+                conversations = service.conversations
+                if conversations is not None:
+                    # 较早的对话以摘要代替，请求体不再随对话长度增长
+                    messages = await conversations.prepare(messages)
             tool_context = ToolSchema(
                 base_url=config.llm.base_url or "",
                 api_key=config.llm.api_key or "",
                 model=config.llm.model,
             )
-            async for update in _stream_events(agent, messages, history, tool_context):
+            agent = await service.get_agent()
+            async for update in _stream_events(
+                agent,
+                messages,
+                history,
+                tool_context,
+                stream=config.stream,
+                thread_id=thread_id,
+                durability=config.sessions.durability,
+            ):
                 yield update
+            if conversations is not None and thread_id is None:
+                # 本轮完成后在后台为下一轮准备摘要，下一轮开始时通常不必等待
+                conversations.schedule(await asyncio.to_thread(build_llm_messages, history))
         except asyncio.CancelledError:
             if history[-1]["content"] == TYPING_INDICATOR_HTML:
                 history[-1]["content"] = ""
             raise
+        except ModelBusyError as err:
+            print(f"模型调用繁忙: {err}，当前指标: {service.model_stats()}")
+            if history[-1]["content"] == TYPING_INDICATOR_HTML:
+                history[-1]["content"] = ""
+            history[-1]["content"] += "\n ⚠️ 当前对话人数较多，请稍后再试"
+            yield "", history
         except Exception as err:
             print(f"发生错误: {err}")
             try:
@@ -487,6 +1033,31 @@ def make_generate_response(service: AgentService, config: AppConfig):
     return generate_response
 
 
+async def _load_ui_history(service: AgentService, thread_id: str) -> List[Dict[str, str]]:
+    """读取会话并还原为界面上的对话历史"""
+    return build_ui_history(await service.load_thread(thread_id) or [])
+
+
+def make_warmup_lifespan(service: AgentService):
+    """
+    返回 Gradio 服务的 lifespan：端口绑定后在服务的事件循环中预热 Agent，
+    退出时关闭常驻的 MCP 会话并提交会话存储
+
+    预热与对话在同一个事件循环中进行，第一次对话如果早于预热完成，会等待同一把锁而不是重复创建。
+    """
+
+    @asynccontextmanager
+    async def lifespan(_app: Any) -> AsyncIterator[None]:
+        task = asyncio.create_task(service.warmup())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await service.aclose()
+
+    return lifespan
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 主函数
 # ─────────────────────────────────────────────────────────────────────────────
@@ -502,11 +1073,26 @@ def main() -> None:
         choices=["dashscope", "ark", "ollama"],
         help="LLM 提供商",
     )
+    parser.add_argument(
+        "--max-model-calls",
+        type=int,
+        default=ModelLimitConfig.max_concurrency,
+        help="同时进行的模型调用数上限",
+    )
+    parser.add_argument("--search-cache", default=None, help="搜索结果缓存的 SQLite 文件路径")
+    parser.add_argument(
+        "--session-db", default=SessionConfig.path, help="会话存储的 SQLite 文件路径"
+    )
     args = parser.parse_args()
 
+    from utils.web_ui import create_ui, custom_css, theme
+
     config = AppConfig(
         llm=LLMConfig.from_env(args.provider),
         mcp=MCPConfig(),
+        model_limit=ModelLimitConfig(max_concurrency=args.max_model_calls),
+        search_cache=SearchCacheConfig(path=args.search_cache),
+        sessions=SessionConfig(path=args.session_db),
     )
     service = AgentService(config)
 
@@ -514,7 +1100,15 @@ def main() -> None:
         llm_func=make_generate_response(service, config),
         tab_name="Gradio APP - WebUI",
         main_title="Gradio Agent APP",
-        initial_message=[{"role": "assistant", "content": _get_greeting(service)}],
+        # 每次打开页面时生成；预热结束前先显示占位消息，结束后自动替换
+        initial_message=lambda: [{"role": "assistant", "content": _get_greeting(service)}],
+        is_ready=lambda: _is_settled(service),
+        # 界面只发送新消息与会话 ID，刷新页面或重启服务后按会话 ID 恢复对话
+        load_thread=(
+            (lambda thread_id: _load_ui_history(service, thread_id))
+            if config.sessions.enabled
+            else None
+        ),
     )
     app.launch(
         server_name=args.host,
@@ -522,6 +1116,7 @@ def main() -> None:
         share=False,
         theme=theme,
         css=custom_css,
+        app_kwargs={"lifespan": make_warmup_lifespan(service)},
     )
 
 
@@ -0,0 +1,83 @@
+"""
+对比 build_llm_messages 在长对话中有无清洗缓存的单轮耗时
+
+模拟一段不断增长的对话，每一轮都对完整历史调用一次 build_llm_messages。
+
+另外测量单条超大工具输出（如 execute_python 打印的大量数据）的清洗耗时。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_clean_history.py --turns 500 --output-mb 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from unittest.mock import patch
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import app  # noqa: E402
+from utils import remove_html  # noqa: E402
+from utils.think_view import format_think_result  # noqa: E402
+from utils.tool_view import format_tool_call, format_tool_result  # noqa: E402
+
+
+def _assistant_message(turn: int) -> str:
+    return (
+        format_think_result(f"第 {turn} 轮的思考过程\n" * 20)
+        + format_tool_call("execute_python", {"code": f"print({turn} ** 2)"})
+        + format_tool_result("execute_python", "\n".join(str(i) for i in range(200)))
+        + f"第 {turn} 轮的回答。" * 20
+    )
+
+
+def _run(turns: int) -> list[float]:
+    """返回每一轮预处理的耗时"""
+    history: list[dict] = []
+    samples = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"问题 {turn}"})
+        start = time.perf_counter()
+        app.build_llm_messages(history)
+        samples.append(time.perf_counter() - start)
+        # 模拟 Gradio：每轮都收到一份新的历史副本
+        history = [dict(m) for m in history]
+        history.append({"role": "assistant", "content": _assistant_message(turn)})
+    return samples
+
+
+def _report(name: str, samples: list[float]) -> None:
+    checkpoints = [n for n in (1, 10, 100, 250, 500, len(samples)) if n <= len(samples)]
+    parts = " ".join(f"turn{n}={samples[n - 1] * 1000:7.2f}ms" for n in sorted(set(checkpoints)))
+    print(f"{name:<9} total={sum(samples):7.3f}s {parts}")
+
+
+def _bench_large_output(size_mb: int) -> None:
+    line = "0123456789" * 7 + "\n"
+    output = line * (size_mb * 1024 * 1024 // len(line))
+    text = format_tool_result("execute_python", output) + "以上是运行结果。"
+    start = time.perf_counter()
+    remove_html.get_cleaned_text(text)
+    elapsed = time.perf_counter() - start
+    print(f"large     {len(text) / 1024 / 1024:.1f}MB message cleaned in {elapsed * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="清洗缓存耗时对比")
+    parser.add_argument("--turns", type=int, default=500, help="对话轮数")
+    parser.add_argument("--output-mb", type=int, default=8, help="超大工具输出的大小（MB）")
+    args = parser.parse_args()
+
+    with patch.object(app, "get_cleaned_text_cached", remove_html.get_cleaned_text):
+        _report("uncached", _run(args.turns))
+
+    remove_html._default_cache.clear()
+    _report("cached", _run(args.turns))
+
+    _bench_large_output(args.output_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+对比代码执行 MCP 的 cold / warm 两种模式的单次调用耗时
+
+用法（在 app 目录下）：
+    python benchmarks/bench_code_execution.py -n 30
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(APP_DIR, "mcp"))
+
+import code_execution  # noqa: E402
+
+
+SNIPPETS = {
+    "print": "print(1 + 1)",
+    "stdlib": "import json, math\nprint(json.dumps({'pi': math.pi}))",
+    "loop": "print(sum(i * i for i in range(100_000)))",
+}
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+    print(
+        f"  {name:<6} mean={statistics.mean(samples_ms):8.2f}ms "
+        f"p50={statistics.median(samples_ms):8.2f}ms p95={p95:8.2f}ms"
+    )
+
+
+async def _bench_warm(code: str, n: int) -> list[float]:
+    pool = code_execution.WorkerPool(size=2)
+    await pool.start()
+    try:
+        await pool.run(code)  # 预热 import 缓存
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            await pool.run(code)
+            samples.append(time.perf_counter() - start)
+        return samples
+    finally:
+        await pool.close()
+
+
+def _bench_cold(code: str, n: int) -> list[float]:
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        code_execution.run_cold(code)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="代码执行 MCP 耗时对比")
+    parser.add_argument("-n", type=int, default=20, help="每个用例的调用次数")
+    args = parser.parse_args()
+
+    for name, code in SNIPPETS.items():
+        print(f"[{name}]")
+        cold = _bench_cold(code, args.n)
+        warm = asyncio.run(_bench_warm(code, args.n))
+        _report("cold", cold)
+        _report("warm", warm)
+        print(f"  speedup x{statistics.mean(cold) / statistics.mean(warm):.1f}")
+
+
+if __name__ == "__main__":
+    main()
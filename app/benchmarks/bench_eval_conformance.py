@@ -0,0 +1,142 @@
+"""
+计算器的一致性与吞吐量测试
+
+两个入口共用 tools/eval_core.py：tools/tool_sci.py 的 calculator 与 mcp_server/math_mcp 的 math 工具。
+本脚本用同一张用例表检查两者的结果是否一致，再分别测量冷缓存（每次都重新解析）与热缓存下的吞吐量。
+一致性检查失败时以非零状态退出。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_eval_conformance.py -n 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(APP_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from mcp_server.math_mcp import server as math_server  # noqa: E402
+from tools.eval_core import compile_expression  # noqa: E402
+from tools.tool_sci import SafeEvaluator  # noqa: E402
+
+# 用例：(表达式, 期望结果)；期望结果为 None 表示应当报错
+CASES = [
+    ("1 + 2 * 3", 7),
+    ("(3 + 5) * 12", 96),
+    ("-3 // 2", -2),
+    ("7.5 // 2", 3.0),
+    ("10 % 3", 1),
+    ("5 % -3", -1),
+    ("2 ** -1", 0.5),
+    ("2 ** -2 ** -1", 2**-0.5),
+    ("0 ** 0", 1),
+    ("-(-(-5))", -5),
+    ("((((1))))", 1),
+    ("1 / 4 + 1 / 4", 0.5),
+    ("1e308 * 10", float("inf")),
+    ("2 ** 4095", 2**4095),
+    ("(sqrt(9) + 1) ** 2", 16.0),
+    ("log2(8) + log10(100)", 5.0),
+    ("abs(-2.5)", 2.5),
+    ("1 / 0", None),
+    ("1 % 0", None),
+    ("1 // 0", None),
+    ("0.0 / 0", None),
+    ("2.0 ** 10000", None),
+    ("9 ** 9 ** 9", None),
+    ("(10 ** 1000) * (10 ** 1000)", None),
+    ("(-8) ** (1 / 3)", None),
+    ("1 +", None),
+    ("()", None),
+    ("sqrt(-1)", None),
+    ("log(9, 3)", None),
+    ("x + 1", None),
+    ("a.b", None),
+    ("'a'", None),
+]
+
+# math_mcp 会从自然语言中提取算式，只比较不含字母与引号的用例
+MCP_CHARS = set("0123456789.+-*/() % ")
+
+
+def _entry_points():
+    math_tool = getattr(math_server.math, "fn", math_server.math)
+    return {
+        "tool_sci": SafeEvaluator().evaluate,
+        "math_mcp": math_tool,
+    }
+
+
+def _outcome(evaluate, expression):
+    try:
+        return evaluate(expression)
+    except ValueError:
+        return None
+
+
+def _check_conformance(entry_points) -> int:
+    mismatches = 0
+    for expression, expected in CASES:
+        for name, evaluate in entry_points.items():
+            if name == "math_mcp" and not set(expression) <= MCP_CHARS:
+                continue
+            actual = _outcome(evaluate, expression)
+            # math_mcp 把整数值的浮点结果转换为 int，按数值比较
+            if actual != expected:
+                mismatches += 1
+                print(f"  不一致: {name:<10} {expression!r}: 期望 {expected!r}，得到 {actual!r}")
+    print(f"一致性: {len(CASES)} 个用例，{mismatches} 处不一致")
+    return mismatches
+
+
+def _throughput(entry_points, n: int) -> None:
+    expressions = [f"({i} + 0.5) * 3 ** 2 - sqrt({i % 100}) / 7" for i in range(n)]
+    print(f"吞吐量: {n} 个不同的表达式")
+    for name, evaluate in entry_points.items():
+        batch = expressions
+        if name == "math_mcp":
+            # math_mcp 不支持函数
+            batch = [e.replace("sqrt", "") for e in expressions]
+        compile_expression.cache_clear()
+        start = time.perf_counter()
+        for expression in batch:
+            evaluate(expression)
+        cold = time.perf_counter() - start
+
+        # 缓存中保留的是最近编译的表达式
+        hot_batch = batch[-1000:]
+        start = time.perf_counter()
+        for expression in hot_batch:
+            evaluate(expression)
+        hot = time.perf_counter() - start
+        print(
+            f"  {name:<10} 冷缓存 {len(batch) / cold:>10.0f} 次/秒   "
+            f"热缓存 {len(hot_batch) / hot:>10.0f} 次/秒"
+        )
+
+    # 同一表达式、不同变量取值：只编译一次
+    program = compile_expression("x ** 2 + 3 * x - sqrt(16) / 2", ("x",))
+    start = time.perf_counter()
+    for i in range(n):
+        program.run({"x": i})
+    print(f"  {'变量求值':<8} {n / (time.perf_counter() - start):>17.0f} 次/秒")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="计算器一致性与吞吐量测试")
+    parser.add_argument("-n", type=int, default=20000, help="吞吐量测试的表达式数量")
+    args = parser.parse_args()
+
+    entry_points = _entry_points()
+    mismatches = _check_conformance(entry_points)
+    _throughput(entry_points, args.n)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
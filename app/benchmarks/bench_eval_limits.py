@@ -0,0 +1,106 @@
+"""
+用随机生成的病态表达式测试计算器的最坏耗时
+
+覆盖 tools/tool_sci.py 的 SafeEvaluator 与 mcp_server/math_mcp 的 math 工具，
+表达式中混合了幂塔、大整数乘法、深层嵌套与浮点溢出。任一表达式耗时超过 --max-ms 时以非零状态退出。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_eval_limits.py -n 2000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(APP_DIR))
+
+from mcp_server.math_mcp import server as math_server  # noqa: E402
+from tools.tool_sci import SafeEvaluator  # noqa: E402
+
+
+def _number(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.6:
+        return str(rng.choice([0, 1, 2, 3, 7, 9, 10, 99, 12345, 10**6]))
+    if kind < 0.9:
+        return f"{rng.uniform(-1000, 1000):.3f}"
+    return str(rng.randint(10**20, 10**40))
+
+
+def _expression(rng: random.Random, depth: int = 0) -> str:
+    """随机表达式，刻意偏向幂运算与大整数"""
+    if depth > 4 or rng.random() < 0.25:
+        return _number(rng)
+    kind = rng.random()
+    if kind < 0.35:
+        # 幂塔：a ** b ** c
+        return "**".join(_number(rng) for _ in range(rng.randint(2, 4)))
+    if kind < 0.75:
+        op = rng.choice(["+", "-", "*", "/", "%", "//", "**", "*"])
+        return f"({_expression(rng, depth + 1)}){op}({_expression(rng, depth + 1)})"
+    if kind < 0.85:
+        return "-" * rng.randint(1, 50) + _expression(rng, depth + 1)
+    return "*".join(f"({_expression(rng, depth + 1)})" for _ in range(rng.randint(2, 6)))
+
+
+# 已知的病态输入
+PATHOLOGICAL = [
+    "9**9**9",
+    "2**2**2**2**2",
+    "(10**1000)**(10**1000)",
+    "99999**99999",
+    "(12345678901234567890**50)*(12345678901234567890**50)",
+    "*".join(["(9**999)"] * 20),
+    "10.5**10**10",
+    "-" * 190 + "9**9**9",
+]
+
+
+def _run(name: str, evaluate, expressions: list[str]) -> float:
+    samples = []
+    errors = 0
+    for expression in expressions:
+        start = time.perf_counter()
+        try:
+            evaluate(expression)
+        except (ValueError, ArithmeticError):
+            errors += 1
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(
+        f"  {name:<10} n={len(samples)} rejected={errors} "
+        f"mean={statistics.mean(samples):.3f}ms p99={p99:.3f}ms max={samples[-1]:.3f}ms"
+    )
+    return samples[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="计算器最坏耗时测试")
+    parser.add_argument("-n", type=int, default=2000, help="随机表达式数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--max-ms", type=float, default=50.0, help="允许的单次最大耗时（毫秒）")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    expressions = PATHOLOGICAL + [_expression(rng) for _ in range(args.n)]
+    math_tool = getattr(math_server.math, "fn", math_server.math)
+
+    worst = max(
+        _run("tool_sci", SafeEvaluator().evaluate, expressions),
+        # math_mcp 会过滤掉不支持的字符，并限制表达式长度
+        _run("math_mcp", math_tool, [e for e in expressions if len(e) <= 200]),
+    )
+    if worst > args.max_ms:
+        print(f"最坏耗时 {worst:.3f}ms 超过上限 {args.max_ms}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+对话历史窗口的请求体与摘要调用次数
+
+模拟一段长对话，逐轮比较两种做法（token 数用 SummarizationMiddleware 默认的近似计数）：
+- 完整历史：每轮发送界面上的全部历史；超过 2000 token 后，Agent 内的 SummarizationMiddleware
+  每轮都要把超出部分重新摘要一次
+- ConversationStore：较早的对话并入服务端保存的滚动摘要，每轮只发送摘要与最近的消息；
+  未摘要部分超过 trigger_tokens 时才调用一次 LLM
+
+摘要由假的摘要函数生成（固定长度的文本），不调用模型。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_history_window.py --turns 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from utils.conversation_store import ConversationStore, _approximate_tokens  # noqa: E402
+
+# SummarizationMiddleware 的触发条件，与 app.py 中主 Agent 的配置一致
+MIDDLEWARE_TRIGGER = 2000
+
+
+def _tokens(messages) -> int:
+    return sum(_approximate_tokens(message) for message in messages)
+
+
+async def run(turns: int, user_chars: int, assistant_chars: int, report_every: int) -> None:
+    summary_inputs = []
+
+    async def summarize(summary, messages):
+        summary_inputs.append(_tokens(messages) + len(summary) // 4)
+        return "摘要" * 150
+
+    store = ConversationStore(summarize)
+    history = []
+    full_total = store_total = 0
+    full_calls = full_summary_input = 0
+
+    print(f"{'turn':>5} {'完整历史 tokens':>16} {'窗口 tokens':>12} {'摘要调用(完整/窗口)':>20}")
+    for turn in range(1, turns + 1):
+        history.append({"role": "user", "content": f"第 {turn} 个问题：" + "问" * user_chars})
+
+        full = _tokens(history)
+        sent = _tokens(await store.prepare(history))
+        full_total += full
+        store_total += sent
+        if full > MIDDLEWARE_TRIGGER:
+            # 中间件每轮都对超出保留窗口的部分重新摘要
+            full_calls += 1
+            full_summary_input += full
+
+        history.append({"role": "assistant", "content": "答" * assistant_chars})
+        if turn % report_every == 0 or turn == turns:
+            print(f"{turn:>5} {full:>16} {sent:>12} {full_calls:>10}/{store.summaries:<9}")
+
+    print()
+    print(f"请求体合计：完整历史 {full_total} tokens，窗口 {store_total} tokens，")
+    print(f"  减少 {1 - store_total / full_total:.0%}")
+    print(
+        f"摘要调用：完整历史 {full_calls} 次（输入约 {full_summary_input} tokens），"
+        f"窗口 {store.summaries} 次（输入约 {sum(summary_inputs)} tokens）"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对话历史窗口的请求体与摘要调用次数")
+    parser.add_argument("--turns", type=int, default=50, help="对话轮数")
+    parser.add_argument("--user-chars", type=int, default=60, help="每条用户消息的字数")
+    parser.add_argument("--assistant-chars", type=int, default=400, help="每条回复的字数")
+    parser.add_argument("--report-every", type=int, default=10, help="每隔多少轮输出一次")
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.user_chars, args.assistant_chars, args.report_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+MCP 服务多进程吞吐量测试
+
+对 mcp_server 中的 math_mcp 与 get_weather_mcp，分别以不同的 worker 数启动 streamable HTTP 服务，
+再用多个压测进程并发调用 math / get_weather 工具，统计每秒请求数与延迟，以及相对单 worker 的加速比。
+
+服务通过 `uvicorn --factory <包>.__main__:create_app --workers N` 启动，与 `WORKERS=N python -m mcp_server.math_mcp`
+使用同一个 ASGI app。压测进程与服务在同一台机器上争用 CPU，worker 数加上压测进程数不宜超过核数。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_mcp_rps.py --workers 1,2,4 --clients 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(APP_DIR)
+
+# 服务名 -> (包, 工具名, 参数)
+SERVERS = {
+    "math": ("mcp_server.math_mcp", "math", {"question": "what's (3 + 5) * 12 - 7 / 2?"}),
+    "weather": ("mcp_server.get_weather_mcp", "get_weather", {"city": "Hangzhou"}),
+}
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _call_body(tool: str, arguments: dict, request_id: int) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": tool, "arguments": arguments},
+    }
+
+
+def _start_server(package: str, workers: int, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "--factory",
+        f"{package}.__main__:create_app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    return subprocess.Popen(command, cwd=REPO_DIR)
+
+
+def _wait_ready(url: str, tool: str, arguments: dict, timeout: float = 30.0) -> None:
+    """等到服务能正常返回工具调用结果"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.post(url, json=_call_body(tool, arguments, 0), headers=HEADERS)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未能在 {timeout} 秒内就绪: {url}")
+
+
+async def _drive(url: str, tool: str, arguments: dict, concurrency: int, duration: float):
+    """在 duration 秒内保持 concurrency 个请求在途，返回 (成功数, 失败数, 延迟列表)"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: list[float] = []
+    errors = 0
+    async with httpx.AsyncClient(limits=limits, headers=HEADERS, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int) -> None:
+            nonlocal errors
+            request_id = index
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=_call_body(tool, arguments, request_id))
+                    ok = response.status_code == 200 and '"isError":false' in response.text
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+                request_id += concurrency
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return len(latencies), errors, latencies
+
+
+def _client_process(args) -> tuple:
+    return asyncio.run(_drive(*args))
+
+
+def _measure(name: str, workers: int, clients: int, concurrency: int, duration: float) -> dict:
+    package, tool, arguments = SERVERS[name]
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/mcp"
+    process = _start_server(package, workers, port)
+    try:
+        _wait_ready(url, tool, arguments)
+        # 预热：建立连接，触发各 worker 的首次导入
+        asyncio.run(_drive(url, tool, arguments, concurrency, 0.5))
+
+        jobs = [(url, tool, arguments, concurrency, duration)] * clients
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            results = pool.map(_client_process, jobs)
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+    latencies = sorted(lat for _, _, lats in results for lat in lats)
+    completed = sum(count for count, _, _ in results)
+    return {
+        "rps": completed / max(elapsed, duration),
+        "errors": sum(errors for _, errors, _ in results),
+        "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+        if latencies
+        else float("nan"),
+    }
+
+
+def main() -> None:
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, max(1, cpus // 2)})
+    parser = argparse.ArgumentParser(description="MCP 服务多进程吞吐量测试")
+    parser.add_argument("--server", choices=[*SERVERS, "all"], default="all", help="测试的服务")
+    parser.add_argument(
+        "--workers",
+        default=",".join(map(str, default_workers)),
+        help="逗号分隔的 worker 数列表",
+    )
+    parser.add_argument("--clients", type=int, default=max(1, cpus // 2), help="压测进程数")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个压测进程的并发请求数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每轮压测的时长（秒）")
+    args = parser.parse_args()
+
+    names = list(SERVERS) if args.server == "all" else [args.server]
+    worker_counts = [int(n) for n in args.workers.split(",")]
+    print(
+        f"CPU {cpus} 核，压测进程 {args.clients} 个 × 并发 {args.concurrency}，"
+        f"每轮 {args.duration:g} 秒"
+    )
+    for name in names:
+        print(f"{name}:")
+        baseline = None
+        for workers in worker_counts:
+            result = _measure(name, workers, args.clients, args.concurrency, args.duration)
+            baseline = baseline or result["rps"] / workers
+            speedup = result["rps"] / baseline
+            print(
+                f"  workers={workers:<3} {result['rps']:>9.0f} 请求/秒  "
+                f"p50={result['p50']:.1f}ms p99={result['p99']:.1f}ms  "
+                f"errors={result['errors']}  加速比 {speedup:.2f}（效率 {speedup / workers:.0%}）"
+            )
+
+
+if __name__ == "__main__":
+    main()
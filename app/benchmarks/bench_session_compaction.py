@@ -0,0 +1,119 @@
+"""
+会话存储的体积控制：增量保存、清理与空间回收
+
+多个会话各进行多轮对话（每轮使用默认的 durability，即每一步都写 checkpoint），比较：
+- 每个版本都保存完整的消息列表（snapshot_every=1）与只保存新增消息（默认每 20 个版本一次快照）
+  的数据库大小、列出全部历史与从最早的 checkpoint 分叉（update_state）的耗时
+- compact(keep_last) 之后与 vacuum() 之后的数据库大小与上述耗时
+
+对话由一个只追加回复的 LangGraph 图模拟，不调用模型；回复随机截取自 docs/query.md，压缩率接近真实文本。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_session_compaction.py --threads 10 --turns 100 --keep-last 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Annotated, TypedDict
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langgraph.graph import END, START, StateGraph  # noqa: E402
+from langgraph.graph.message import add_messages  # noqa: E402
+
+from utils.checkpoint_store import SqliteCheckpointSaver  # noqa: E402
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _graph(saver: SqliteCheckpointSaver, chars: int):
+    with open(os.path.join(APP_DIR, "docs", "query.md"), encoding="utf-8") as f:
+        text = f.read() * 2
+
+    def model(state):
+        offset = random.randrange(len(text) // 2)
+        return {"messages": [AIMessage(content=text[offset : offset + chars])]}
+
+    graph = StateGraph(State)
+    graph.add_node("model", model)
+    graph.add_edge(START, "model")
+    graph.add_edge("model", END)
+    return graph.compile(checkpointer=saver)
+
+
+def _size(path: str) -> float:
+    """数据库与 WAL 文件的合计大小（KB）"""
+    wal = path + "-wal"
+    return (os.path.getsize(path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)) / 1024
+
+
+def _measure(graph, saver: SqliteCheckpointSaver, path: str, threads: int) -> str:
+    saver.flush()
+    start = time.perf_counter()
+    count = 0
+    for i in range(threads):
+        count += sum(1 for _ in graph.get_state_history({"configurable": {"thread_id": f"t{i}"}}))
+    listed = (time.perf_counter() - start) / threads
+    oldest = list(saver.list({"configurable": {"thread_id": "t0"}}))[-1]
+    start = time.perf_counter()
+    graph.update_state(oldest.config, {"messages": [AIMessage(content="fork")]})
+    forked = time.perf_counter() - start
+    return (
+        f"{_size(path):9.1f}KB  checkpoint {count:>6}  "
+        f"列出历史 {listed * 1000:7.1f}ms/会话  分叉 {forked * 1000:5.1f}ms"
+    )
+
+
+def run(threads: int, turns: int, chars: int, keep_last: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = {"完整快照": dict(snapshot_every=1), "增量": dict()}
+        for name, kwargs in cases.items():
+            random.seed(0)
+            path = os.path.join(tmp, f"{len(os.listdir(tmp))}.sqlite")
+            saver = SqliteCheckpointSaver(path, **kwargs)
+            graph = _graph(saver, chars)
+            start = time.perf_counter()
+            for turn in range(turns):
+                for i in range(threads):
+                    message = {"role": "user", "content": f"第 {turn} 个问题"}
+                    graph.invoke({"messages": [message]}, {"configurable": {"thread_id": f"t{i}"}})
+            saver.flush()
+            elapsed = time.perf_counter() - start
+            print(f"{name}（{threads} 个会话 × {turns} 轮，写入 {elapsed * 1000:.0f}ms）:")
+            print(f"  {'写入后':<10} {_measure(graph, saver, path, threads)}")
+
+            start = time.perf_counter()
+            stats = saver.compact(keep_last=keep_last)
+            compacted = time.perf_counter() - start
+            print(f"  {'compact':<10} {_measure(graph, saver, path, threads)}")
+            start = time.perf_counter()
+            saver.vacuum()
+            vacuumed = time.perf_counter() - start
+            print(f"  {'vacuum':<10} {_measure(graph, saver, path, threads)}")
+            print(
+                f"  compact {compacted * 1000:.0f}ms（删除 {stats.checkpoints} 个 checkpoint、"
+                f"{stats.blobs} 个通道值），vacuum {vacuumed * 1000:.0f}ms"
+            )
+            saver.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="会话存储的体积控制：增量保存、清理与空间回收")
+    parser.add_argument("--threads", type=int, default=10, help="会话数")
+    parser.add_argument("--turns", type=int, default=100, help="每个会话的对话轮数")
+    parser.add_argument("--assistant-chars", type=int, default=400, help="每条回复的字数")
+    parser.add_argument("--keep-last", type=int, default=50, help="每个会话保留的 checkpoint 数")
+    args = parser.parse_args()
+    run(args.threads, args.turns, args.assistant_chars, args.keep_last)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+会话持久化：请求体、写入与恢复
+
+- 请求体：逐轮比较界面每次请求上传的数据量。无会话时上传「新消息 + 完整对话历史」，
+  会话模式下只上传「新消息 + 会话 ID」
+- 写入：多个会话并发进行多轮对话，比较每次写入都提交（batch_size=1）与组提交（默认配置）的耗时与事务数；
+  同时比较不压缩与 zlib 压缩后的数据库大小
+- 恢复：重新打开数据库（相当于服务重启）后读取每个会话最新状态的耗时
+
+对话由一个只追加回复的 LangGraph 图模拟，不调用模型；回复随机截取自 docs/query.md，压缩率接近真实文本。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_sessions.py --threads 20 --turns 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Annotated, TypedDict
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langgraph.graph import END, START, StateGraph  # noqa: E402
+from langgraph.graph.message import add_messages  # noqa: E402
+
+from utils.checkpoint_store import SqliteCheckpointSaver  # noqa: E402
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _graph(saver: SqliteCheckpointSaver, chars: int):
+    with open(os.path.join(APP_DIR, "docs", "query.md"), encoding="utf-8") as f:
+        text = f.read() * 2
+
+    def model(state):
+        offset = random.randrange(len(text) // 2)
+        return {"messages": [AIMessage(content=text[offset : offset + chars])]}
+
+    graph = StateGraph(State)
+    graph.add_node("model", model)
+    graph.add_edge(START, "model")
+    graph.add_edge("model", END)
+    return graph.compile(checkpointer=saver)
+
+
+def _payloads(turns: int, user_chars: int, assistant_chars: int) -> None:
+    history = [{"role": "assistant", "content": "你好！我是你的智能助手。"}]
+    thread_id = uuid.uuid4().hex
+    full_total = session_total = 0
+    for turn in range(1, turns + 1):
+        message = f"第 {turn} 个问题：" + "问" * user_chars
+        full = len(json.dumps([message, history], ensure_ascii=False).encode())
+        session = len(json.dumps([message, thread_id], ensure_ascii=False).encode())
+        full_total += full
+        session_total += session
+        history += [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": "答" * assistant_chars},
+        ]
+    print(
+        f"请求体（{turns} 轮）：完整历史 {full_total / 1024:.1f}KB，会话 {session_total / 1024:.1f}KB，"
+    )
+    print(
+        f"  最后一轮 {full / 1024:.1f}KB -> {session}B，合计减少 {1 - session_total / full_total:.1%}"
+    )
+
+
+async def _write(path: str, threads: int, turns: int, chars: int, **kwargs) -> tuple:
+    saver = SqliteCheckpointSaver(path, **kwargs)
+    graph = _graph(saver, chars)
+
+    async def converse(thread_id: str) -> None:
+        config = {"configurable": {"thread_id": thread_id}}
+        for turn in range(turns):
+            message = {"role": "user", "content": f"第 {turn} 个问题"}
+            await graph.ainvoke({"messages": [message]}, config, durability="exit")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(converse(f"thread-{i}") for i in range(threads)))
+    saver.close()
+    return time.perf_counter() - start, saver.commits, os.path.getsize(path)
+
+
+def _restore(path: str, threads: int) -> list:
+    start = time.perf_counter()
+    saver = SqliteCheckpointSaver(path)
+    opened = time.perf_counter() - start
+    samples = []
+    for i in range(threads):
+        start = time.perf_counter()
+        saver.get_tuple({"configurable": {"thread_id": f"thread-{i}"}})
+        samples.append(time.perf_counter() - start)
+    saver.close()
+    return [opened, *samples]
+
+
+async def run(threads: int, turns: int, user_chars: int, assistant_chars: int) -> None:
+    random.seed(0)
+    _payloads(turns, user_chars, assistant_chars)
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = {
+            "逐条提交": dict(batch_size=1),
+            "组提交": dict(),
+            "组提交，不压缩": dict(compress_min=1 << 30),
+        }
+        print()
+        print(f"写入（{threads} 个会话 × {turns} 轮，每轮一个 checkpoint）:")
+        for name, kwargs in cases.items():
+            path = os.path.join(tmp, f"{len(os.listdir(tmp))}.sqlite")
+            elapsed, commits, size = await _write(path, threads, turns, assistant_chars, **kwargs)
+            print(
+                f"  {name:<12} {elapsed * 1000:8.0f}ms  事务 {commits:>5}  "
+                f"数据库 {size / 1024:8.1f}KB"
+            )
+
+        opened, *samples = _restore(path, threads)
+        samples_ms = [s * 1000 for s in samples]
+        print()
+        print(
+            f"恢复：打开数据库 {opened * 1000:.1f}ms，读取最新状态 "
+            f"mean={statistics.mean(samples_ms):.2f}ms max={max(samples_ms):.2f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="会话持久化：请求体、写入与恢复")
+    parser.add_argument("--threads", type=int, default=20, help="并发的会话数")
+    parser.add_argument("--turns", type=int, default=20, help="每个会话的对话轮数")
+    parser.add_argument("--user-chars", type=int, default=60, help="每条用户消息的字数")
+    parser.add_argument("--assistant-chars", type=int, default=400, help="每条回复的字数")
+    args = parser.parse_args()
+    asyncio.run(run(args.threads, args.turns, args.user_chars, args.assistant_chars))
+
+
+if __name__ == "__main__":
+    main()
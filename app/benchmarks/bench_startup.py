@@ -0,0 +1,204 @@
+"""
+应用启动耗时测试
+
+分阶段统计，每轮都在新进程中进行：
+- import app：导入 app 模块本身，创建 Agent 用到的依赖按需导入，不在其中
+- import ui：导入 gradio 界面，绑定端口前必须完成
+- import agent：导入创建 Agent 所需的依赖（langchain、langchain_openai、mcp 等），预热时在后台线程中进行
+- build：创建 AgentService 并预热主 Agent，包括连接已启用的 MCP 服务；
+  分别测试没有工具缓存（cold）和已有工具缓存（cached）两种情况
+- first byte：从启动 `python app.py` 到首页返回第一个字节，以及到后台预热完成（日志出现“Agent 预热完成”）
+
+Agent 在端口绑定后才在后台预热，first byte 不再包含 import agent 与 build 的时间。
+测试不会调用模型，默认使用无需 API Key 的 ollama 配置创建 Agent。
+
+--importtime 用 `python -X importtime` 导入上述模块，按顶层包汇总导入耗时，找出拖慢启动的依赖。
+
+用法（在 app 目录下）：
+    python benchmarks/bench_startup.py -n 5
+    python benchmarks/bench_startup.py --importtime --top 15
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _child(provider: str, cache_path: str) -> None:
+    """子进程：依次导入各部分并预热主 Agent，输出各阶段耗时"""
+    import asyncio
+
+    sys.path.insert(0, APP_DIR)
+    times = [time.perf_counter()]
+    import app
+
+    times.append(time.perf_counter())
+    import utils.web_ui  # noqa: F401
+
+    times.append(time.perf_counter())
+    service = app.AgentService(
+        app.AppConfig(
+            llm=app.LLMConfig.from_env(provider),
+            mcp=app.MCPConfig(base_path=APP_DIR, tool_cache=cache_path),
+        )
+    )
+    app.preload(service._required_modules())
+    times.append(time.perf_counter())
+    asyncio.run(service.get_agent())
+    times.append(time.perf_counter())
+    phases = ["import app", "import ui", "import agent", "build"]
+    print(json.dumps({name: end - start for name, start, end in zip(phases, times, times[1:])}))
+
+
+def _run_child(provider: str, cache_path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--provider", provider, "--cache", cache_path],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # MCP 服务可能也会输出日志，只取最后一行
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _first_byte(provider: str, timeout: float = 120.0) -> tuple:
+    """启动应用，返回 (首字节耗时, 预热完成耗时)，未观察到时为 nan"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-u", "app.py", "--provider", provider, "--port", str(port)],
+        cwd=APP_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    ready = threading.Event()
+    ready_at = [float("nan")]
+
+    def watch() -> None:
+        for line in process.stdout:
+            if "Agent 预热完成" in line or "预热 Agent 时出错" in line:
+                ready_at[0] = time.perf_counter() - start
+                ready.set()
+        ready.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    first_byte = float("nan")
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    response.read(1)
+                first_byte = time.perf_counter() - start
+                break
+            except OSError:
+                time.sleep(0.05)
+        ready.wait(max(0.0, deadline - time.perf_counter()))
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+    return first_byte, ready_at[0]
+
+
+def _importtime(provider: str, top: int) -> None:
+    """用 -X importtime 导入 app、界面与 Agent 依赖，按顶层包汇总自身耗时"""
+    code = (
+        "import app, utils.web_ui; "
+        f"s = app.AgentService(app.AppConfig(llm=app.LLMConfig.from_env({provider!r}))); "
+        "app.preload(s._required_modules())"
+    )
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    # 每行格式：import time: 自身耗时(us) | 累计耗时(us) | 缩进 + 模块名
+    totals: dict = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+
+    total = sum(totals.values())
+    print(f"-X importtime 汇总（自身耗时，合计 {total / 1000:.0f}ms）:")
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    for package, us in ranked[:top]:
+        print(f"  {package:<28} {us / 1000:8.1f}ms  {us / total:6.1%}")
+    rest = sum(us for _, us in ranked[top:])
+    label = f"（其余 {max(0, len(ranked) - top)} 个包）"
+    print(f"  {label:<24} {rest / 1000:8.1f}ms  {rest / total:6.1%}")
+
+
+def _report(name: str, samples: list) -> None:
+    samples_ms = [s * 1000 for s in samples]
+    print(
+        f"  {name:<16} mean={statistics.mean(samples_ms):8.0f}ms "
+        f"min={min(samples_ms):8.0f}ms max={max(samples_ms):8.0f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="应用启动耗时测试")
+    parser.add_argument("-n", type=int, default=5, help="每个阶段重复的次数")
+    parser.add_argument("--provider", default="ollama", help="LLM 提供商")
+    parser.add_argument(
+        "--importtime", action="store_true", help="输出 -X importtime 按包汇总的结果"
+    )
+    parser.add_argument("--top", type=int, default=20, help="--importtime 展示的包数量")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--cache", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.provider, args.cache)
+        return
+    if args.importtime:
+        _importtime(args.provider, args.top)
+        return
+
+    samples = {name: [] for name in ("import app", "import ui", "import agent")}
+    samples.update({"build (cold)": [], "build (cached)": []})
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.n):
+            cache_path = os.path.join(tmp, f"tools-{i}.json")
+            cold = _run_child(args.provider, cache_path)
+            cached = _run_child(args.provider, cache_path)
+            for name in ("import app", "import ui", "import agent"):
+                samples[name] += [cold[name], cached[name]]
+            samples["build (cold)"].append(cold["build"])
+            samples["build (cached)"].append(cached["build"])
+
+    first_bytes, readies = zip(*(_first_byte(args.provider) for _ in range(args.n)))
+    samples["first byte"] = list(first_bytes)
+    samples["agent ready"] = list(readies)
+
+    print(f"启动耗时（{args.n} 轮）:")
+    for name, values in samples.items():
+        _report(name, values)
+
+
+if __name__ == "__main__":
+    main()
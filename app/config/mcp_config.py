@@ -3,6 +3,7 @@ MCP 配置
 """
 
 import os
+import sys
 
 
 def gen_abspath(base_path: str, rel_path: str) -> str:
@@ -17,8 +18,10 @@ def get_mcp_dict(base_path: str = "./") -> dict:
         # =============== 代码执行 MCP ===============
         # 🌟 stdio
         "code-execution:stdio": {
-            "command": "python",
-            "args": [gen_abspath(base_path, "mcp/code_execution.py")],
+            # 与主程序使用同一个解释器，不依赖 PATH 中的 python
+            "command": sys.executable,
+            # warm 模式复用常驻解释器，需配合 MCPConfig.keep_alive 使用
+            "args": [gen_abspath(base_path, "mcp/code_execution.py"), "--mode", "warm"],
             "transport": "stdio",
         },
         # streamable http
@@ -26,6 +29,17 @@ def get_mcp_dict(base_path: str = "./") -> dict:
             "url": "http://localhost:8001/mcp",
             "transport": "streamable_http",
         },
+        # =============== 数学 / 天气 MCP ===============
+        # streamable http，两个服务都提供批量工具（math_batch、get_weather_batch）
+        # 必须先启动服务，参考 ../mcp_server/README.md；math_mcp 与 code-execution:http 默认端口相同
+        "math:http": {
+            "url": "http://localhost:8001/mcp",
+            "transport": "streamable_http",
+        },
+        "weather:http": {
+            "url": "http://localhost:8000/mcp",
+            "transport": "streamable_http",
+        },
         # =============== 高德地图 MCP ===============
         # 🌟 streamable http
         # 必须先申请高德地图 API_KEY，详见 .env.example
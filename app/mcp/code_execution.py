@@ -1,5 +1,10 @@
 """
 代码执行 MCP Server
+
+支持两种执行模式：
+- cold：每次调用启动一个全新的 Python 解释器（默认）
+- warm：预先启动一组常驻解释器，每次调用从常驻解释器 fork 一个全新的子进程执行，
+  执行之间不共享任何状态；每次执行的子进程内存不超过 max_memory_mb
 """
 
 import sys
@@ -7,56 +12,62 @@ import subprocess
 import tempfile
 import textwrap
 import os
+import asyncio
+import json
+import signal
 
 from fastmcp import FastMCP
+from fastmcp.server.lifespan import lifespan
 
 
-# 代码执行工具
-mcp = FastMCP("code-execution")
+EXECUTION_TIMEOUT = 20  # hard stop（秒）
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+STREAM_LIMIT = 1 << 28  # 单次输出上限 256 MiB，与冷启动的 capture_output 对齐
 
 
-@mcp.tool
-def execute_python(code: str) -> str:
-    """
-    执行 Python 代码并返回结果
-    用于数学计算、数据分析和逻辑处理
+def _scrubbed_env() -> dict:
+    """子进程只继承必要的环境变量"""
+    return {
+        "PATH": os.environ.get("PATH", ""),
+        "HOME": os.environ.get("HOME", ""),
+        "LANG": "C.UTF-8",
+    }
 
-    Args:
-        code (str): 要执行的 Python 代码
 
-    Returns:
-        str: 代码执行的标准输出或标准错误输出
-    """
+def _write_code(code: str) -> str:
+    """将代码写入临时文件，返回文件路径"""
     # Normalize indentation (LLMs love extra spaces)
     code = textwrap.dedent(code)
 
     with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
         f.write(code)
-        file_path = f.name
+        return f.name
 
-    env = {
-        "PATH": os.environ.get("PATH", ""),
-        "HOME": os.environ.get("HOME", ""),
-        "LANG": "C.UTF-8",
-    }
+
+def _format_output(stdout: str, stderr: str) -> str:
+    stdout = stdout.strip()
+    stderr = stderr.strip()
+
+    if stderr:
+        return f"Error:\n{stderr}"
+
+    return stdout if stdout else "Execution finished (no output)"
+
+
+def run_cold(code: str) -> str:
+    """冷启动：为本次调用单独启动一个解释器"""
+    file_path = _write_code(code)
 
     try:
         result = subprocess.run(
             [sys.executable, file_path],
             capture_output=True,
             text=True,
-            timeout=20,  # hard stop
+            timeout=EXECUTION_TIMEOUT,
             check=False,  # don't raise
-            env=env,
+            env=_scrubbed_env(),
         )
-
-        stdout = result.stdout.strip()
-        stderr = result.stderr.strip()
-
-        if stderr:
-            return f"Error:\n{stderr}"
-
-        return stdout if stdout else "Execution finished (no output)"
+        return _format_output(result.stdout, result.stderr)
 
     except subprocess.TimeoutExpired:
         return "Error: Execution timed out"
@@ -68,9 +79,191 @@ def execute_python(code: str) -> str:
         os.remove(file_path)
 
 
+class _Worker:
+    """单个常驻解释器"""
+
+    # 常驻解释器自身负责超时，这里只防止它本身卡住
+    GRACE = 5.0
+
+    def __init__(self, proc: asyncio.subprocess.Process) -> None:
+        self.proc = proc
+
+    @classmethod
+    async def spawn(cls) -> "_Worker":
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            WORKER_PATH,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=_scrubbed_env(),
+            limit=STREAM_LIMIT,
+            # 独立的进程组，回收时连同正在执行的子进程一起结束
+            start_new_session=True,
+        )
+        # 等待就绪信号，确保解释器启动的开销发生在调用之前
+        if not await proc.stdout.readline():
+            raise RuntimeError("工作进程启动失败")
+        return cls(proc)
+
+    async def run(self, file_path: str, timeout: float, max_memory_mb: int) -> dict:
+        request = {"path": file_path, "timeout": timeout, "max_memory_mb": max_memory_mb}
+        self.proc.stdin.write((json.dumps(request) + "\n").encode())
+        await self.proc.stdin.drain()
+        line = await asyncio.wait_for(self.proc.stdout.readline(), timeout + self.GRACE)
+        if not line:
+            raise RuntimeError("工作进程意外退出")
+        return json.loads(line)
+
+    async def kill(self) -> None:
+        if self.proc.returncode is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError):  # Windows，或进程组已退出
+                self.proc.kill()
+        await self.proc.wait()
+
+
+class WorkerPool:
+    """
+    常驻解释器池
+
+    用户代码在每次 fork 出的子进程中运行，常驻解释器本身不执行用户代码，不需要按次数或内存回收；
+    内存上限作用于每次执行的子进程（RLIMIT_AS），超出时用户代码得到 MemoryError。
+
+    :param size: 常驻解释器数量
+    :param max_memory_mb: 单次执行的地址空间上限（MB）
+    :param timeout: 单次执行的超时时间（秒）
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_memory_mb: int = 512,
+        timeout: float = EXECUTION_TIMEOUT,
+    ) -> None:
+        self.size = size
+        self.max_memory_mb = max_memory_mb
+        self.timeout = timeout
+        # None 表示某个解释器重建失败，取到的调用方退回冷启动
+        self._idle: asyncio.Queue[_Worker | None] = asyncio.Queue()
+        self._spawning: set[asyncio.Task] = set()
+        self._workers: set[_Worker] = set()
+
+    async def start(self) -> None:
+        """预先启动全部解释器"""
+        workers = await asyncio.gather(*(_Worker.spawn() for _ in range(self.size)))
+        for worker in workers:
+            self._workers.add(worker)
+            self._idle.put_nowait(worker)
+
+    async def close(self) -> None:
+        for task in self._spawning:
+            task.cancel()
+        await asyncio.gather(*self._spawning, return_exceptions=True)
+        await asyncio.gather(*(worker.kill() for worker in self._workers))
+        self._workers.clear()
+
+    def _replace(self, worker: _Worker) -> None:
+        """回收解释器，并在后台补充一个新的"""
+        self._workers.discard(worker)
+        task = asyncio.create_task(self._respawn(worker))
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def _respawn(self, old: _Worker) -> None:
+        await old.kill()
+        try:
+            worker = await _Worker.spawn()
+        except Exception as e:
+            print(f"工作进程重建失败，退回冷启动: {e}", file=sys.stderr)
+            self._spawning.discard(asyncio.current_task())
+            # 叫醒一位正在等待解释器的调用方
+            self._idle.put_nowait(None)
+            return
+        self._workers.add(worker)
+        self._idle.put_nowait(worker)
+
+    async def run(self, code: str) -> str:
+        if not self._workers and not self._spawning:
+            # 解释器全部重建失败时，退回冷启动
+            return await asyncio.to_thread(run_cold, code)
+
+        worker = await self._idle.get()
+        if worker is None:
+            if not self._workers and not self._spawning:
+                # 已没有可用的解释器，依次叫醒其余等待者
+                self._idle.put_nowait(None)
+            return await asyncio.to_thread(run_cold, code)
+
+        file_path = _write_code(code)
+        try:
+            result = await worker.run(file_path, self.timeout, self.max_memory_mb)
+        except asyncio.TimeoutError:
+            self._replace(worker)
+            return "Error: Execution timed out"
+        except BaseException as e:
+            # 被取消或进程异常时，解释器状态未知，直接回收
+            self._replace(worker)
+            if not isinstance(e, Exception):
+                raise
+            return f"Error: {e}"
+        finally:
+            os.remove(file_path)
+
+        if result["recycle"]:
+            self._replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+
+        if result["timed_out"]:
+            return "Error: Execution timed out"
+        return _format_output(result["stdout"], result["stderr"])
+
+
+# warm 模式下的解释器池，由 lifespan 管理
+pool_options: dict | None = None
+_pool: WorkerPool | None = None
+
+
+@lifespan
+async def worker_pool_lifespan(server):
+    global _pool
+    if pool_options is not None:
+        _pool = WorkerPool(**pool_options)
+        await _pool.start()
+    try:
+        yield {}
+    finally:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+
+
+# 代码执行工具
+mcp = FastMCP("code-execution", lifespan=worker_pool_lifespan)
+
+
+@mcp.tool
+async def execute_python(code: str) -> str:
+    """
+    执行 Python 代码并返回结果
+    用于数学计算、数据分析和逻辑处理
+
+    Args:
+        code (str): 要执行的 Python 代码
+
+    Returns:
+        str: 代码执行的标准输出或标准错误输出
+    """
+    if _pool is not None:
+        return await _pool.run(code)
+    return await asyncio.to_thread(run_cold, code)
+
+
 if __name__ == "__main__":
     # # 测试
-    # print(execute_python("""
+    # print(run_cold("""
     # import math
     # print(sum([i for i in range(10)]))
     # print(math.pi)
@@ -78,7 +271,6 @@ if __name__ == "__main__":
 
     # 启动 MCP Server
     import argparse
-    import asyncio
 
     # 配置网络参数
     host = os.getenv("HOST", "127.0.0.1")
@@ -88,8 +280,23 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--transport", type=str, default="stdio", help="通信方式，可选 stdio 或 http"
     )
+    parser.add_argument(
+        "-m", "--mode", type=str, default="cold", help="执行模式，可选 cold 或 warm"
+    )
+    parser.add_argument("--workers", type=int, default=2, help="warm 模式下的常驻解释器数量")
+    parser.add_argument(
+        "--max-memory-mb", type=int, default=512, help="warm 模式下单次执行的内存上限（MB）"
+    )
     args = parser.parse_args()
 
+    if args.mode == "warm":
+        pool_options = {
+            "size": args.workers,
+            "max_memory_mb": args.max_memory_mb,
+        }
+    elif args.mode != "cold":
+        raise ValueError(f"Unknown mode: {args.mode}")
+
     if args.transport == "stdio":
         mcp.run(transport="stdio")
     elif args.transport == "http":
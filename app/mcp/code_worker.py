@@ -0,0 +1,175 @@
+"""
+代码执行 MCP 的常驻工作进程
+
+由 code_execution.py 的 warm 模式启动，省去每次调用启动解释器的开销：
+- 从 stdin 逐行读取请求 {"path": "...", "timeout": 秒, "max_memory_mb": MB}，以 __main__ 身份运行该文件
+- 每次执行都从常驻进程 fork 一个子进程，用户代码对全局变量、已导入模块、
+  工作目录等的修改随子进程一起销毁，不会影响下一次执行
+- 子进程的地址空间限制为 max_memory_mb，超出时用户代码的内存分配失败（MemoryError）
+- 子进程超时后被强制结束，常驻进程本身不受影响
+- 执行结果以一行 JSON 写回 stdout，maxrss_kb 是本次执行的子进程的峰值内存：
+  {"stdout": ..., "stderr": ..., "maxrss_kb": ..., "timed_out": ..., "recycle": ...}
+- 执行期间 fd 0/1/2 被重定向，用户代码的输出不会污染通信通道
+
+不支持 fork 的平台（Windows）上直接在常驻进程中执行，并返回 recycle=true，
+由调用方在每次执行后回收重建。
+"""
+
+import json
+import os
+import runpy
+import select
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_INTERNAL_FILES = {os.path.abspath(__file__), runpy.__file__, "<frozen runpy>"}
+
+# 在常驻进程中预先导入的常用模块，fork 出的子进程直接复用
+PRELOAD = ("collections", "datetime", "itertools", "json", "math", "random", "re", "statistics")
+
+
+def _maxrss_kb(usage) -> int:
+    """rusage 中的峰值常驻内存（KB）"""
+    if usage is None:
+        return 0
+    rss = usage.ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _limit_memory(max_memory_mb) -> None:
+    """限制当前进程的地址空间，超出后内存分配失败"""
+    if resource is None or not max_memory_mb:
+        return
+    limit = int(max_memory_mb) * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):  # 部分平台（如 macOS）不支持限制地址空间
+        pass
+
+
+def _print_exception(exc: BaseException) -> None:
+    """打印异常，去掉工作进程自身的调用栈，与直接运行脚本的输出保持一致"""
+    te = traceback.TracebackException.from_exception(exc)
+    te.stack = traceback.StackSummary.from_list(
+        [frame for frame in te.stack if frame.filename not in _INTERNAL_FILES]
+    )
+    sys.stderr.write("".join(te.format()))
+
+
+def _exec_file(path: str) -> None:
+    """运行脚本，输出写入当前的 fd 1/2"""
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as exc:
+        # 与解释器行为一致：非整数的退出码会被打印到 stderr
+        if exc.code is not None and not isinstance(exc.code, int):
+            print(exc.code, file=sys.stderr)
+    except BaseException as exc:
+        _print_exception(exc)
+    finally:
+        # 用户代码可能替换了 sys.stdout / sys.stderr
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _wait_child(pid: int, timeout: float):
+    """等待子进程结束，返回 (是否按时结束, 子进程的 rusage)；超时后强制结束"""
+    deadline = time.monotonic() + timeout
+    pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+    try:
+        while True:
+            done, _, usage = os.wait4(pid, os.WNOHANG)
+            if done:
+                return True, usage
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                os.kill(pid, signal.SIGKILL)
+                return False, os.wait4(pid, 0)[2]
+            if pidfd is not None:
+                select.select([pidfd], [], [], remaining)
+            else:
+                time.sleep(min(0.005, remaining))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def _run_file(path: str, timeout: float, max_memory_mb, devnull: int, protocol_fds: tuple) -> dict:
+    """在独立的子进程中运行单个脚本，返回其标准输出与标准错误"""
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        timed_out, usage = False, None
+        try:
+            if hasattr(os, "fork"):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        # 用户代码不应接触通信通道
+                        for fd in protocol_fds:
+                            os.close(fd)
+                        _limit_memory(max_memory_mb)
+                        _exec_file(path)
+                    finally:
+                        os._exit(0)
+                finished, usage = _wait_child(pid, timeout)
+                timed_out = not finished
+            else:
+                _exec_file(path)
+        finally:
+            os.dup2(devnull, 1)
+            os.dup2(devnull, 2)
+
+        out.seek(0)
+        err.seek(0)
+        return {
+            "stdout": out.read().decode("utf-8", errors="replace"),
+            "stderr": err.read().decode("utf-8", errors="replace"),
+            "maxrss_kb": _maxrss_kb(usage),
+            "timed_out": timed_out,
+            "recycle": not hasattr(os, "fork"),
+        }
+
+
+def main() -> None:
+    # 通信通道使用 fd 0/1 的副本，原始 fd 0/1/2 留给用户代码
+    proto_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    proto_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+
+    # 与冷启动一致：sys.path[0] 指向脚本所在的临时目录，而不是本文件所在目录
+    sys.path[0] = tempfile.gettempdir()
+    for name in PRELOAD:
+        __import__(name)
+
+    proto_out.write(json.dumps({"ready": True}) + "\n")
+    proto_out.flush()
+
+    for line in proto_in:
+        request = json.loads(line)
+        result = _run_file(
+            request["path"],
+            request["timeout"],
+            request.get("max_memory_mb"),
+            devnull,
+            (proto_in.fileno(), proto_out.fileno()),
+        )
+        proto_out.write(json.dumps(result) + "\n")
+        proto_out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+对话历史摘要提示词
+"""
+
+summary_prompt = """
+你负责维护一段对话的摘要，摘要会代替较早的对话内容发送给智能体。
+
+请把“已有摘要”和“新增对话”合并为一份新的摘要：
+- 保留用户的目标、偏好、已确认的事实与结论、尚未完成的事项
+- 保留工具调用得到的关键数据，省略过程细节
+- 使用第三人称、按时间顺序书写，控制在三百字以内
+- 只输出摘要本身，不要添加解释
+
+已有摘要：
+{summary}
+
+新增对话：
+{messages}
+""".strip()
+
+
+summary_message = "以下是此前对话的摘要：\n\n{summary}"
+
+
+def get_summary_prompt(summary: str, messages: str) -> str:
+    """获取合并摘要的提示词"""
+    return summary_prompt.format(summary=summary or "（无）", messages=messages)
+
+
+def get_summary_message(summary: str) -> str:
+    """获取代替早期对话发送给智能体的摘要消息"""
+    return summary_message.format(summary=summary)
@@ -2,21 +2,29 @@
 增强版系统提示词
 """
 
+import datetime
+from functools import lru_cache
+
+# 时间粒度（秒）：同一粒度内渲染出的提示词完全一致，便于模型服务命中前缀缓存
+TIME_GRANULARITY = 60
+
+# 不变的内容在前，当前时间放在最后，尽量延长可复用的前缀
 agent_system_prompt = """
 你是一个智能助手
 
 思考标准：
 1. 根据用户问题的复杂程度调整思考深度
 2. 以下是系统环境信息：
-  - 当前时间：{current_time}
   - 当前时区：{current_timezone}
   - 用户名：{username}
   - 操作系统：{user_os}
+  - 当前时间：{current_time}
 """.strip()
 
 
-def get_system_prompt() -> str:
-    """获取系统提示词"""
+@lru_cache(maxsize=1)
+def _static_fields() -> dict:
+    """设备信息在进程内不会变化，只计算一次"""
     # 延迟导入
     from utils.device_info import get_info
 
@@ -24,12 +32,34 @@ def get_system_prompt() -> str:
     raw_os = get_info("操作系统 (platform)") or "Unknown"
     user_os = "macOS" if raw_os == "Darwin" else raw_os
 
-    return agent_system_prompt.format(
-        current_time=get_info("当前时间 (now)"),
-        current_timezone=get_info("时区 (timezone)"),
-        username=get_info("用户名 (username)"),
-        user_os=user_os,
-    )
+    return {
+        "current_timezone": get_info("时区 (timezone)"),
+        "username": get_info("用户名 (username)"),
+        "user_os": user_os,
+    }
+
+
+@lru_cache(maxsize=4)
+def _render(current_time: str) -> str:
+    return agent_system_prompt.format(current_time=current_time, **_static_fields())
+
+
+def _current_time(granularity: int) -> str:
+    """按粒度向下取整的当前时间"""
+    now = datetime.datetime.now()
+    if granularity > 1:
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        seconds -= seconds % granularity
+        now = now.replace(hour=seconds // 3600, minute=seconds // 60 % 60, second=seconds % 60)
+    return now.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def get_system_prompt(granularity: int = TIME_GRANULARITY) -> str:
+    """获取系统提示词
+
+    :param granularity: 当前时间的粒度（秒），不超过一天
+    """
+    return _render(_current_time(granularity))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,22 @@
 import unittest
 
-from app import AgentService, AppConfig, LLMConfig, MCPConfig
+import asyncio
+import sqlite3
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app import (
+    GREETING_PLACEHOLDER,
+    AgentService,
+    AppConfig,
+    LLMConfig,
+    MCPConfig,
+    ModelLimitConfig,
+    SessionConfig,
+    _get_greeting,
+    make_warmup_lifespan,
+)
 
 
 class NamedTool:
@@ -40,5 +56,107 @@ class AgentServiceToolTests(unittest.TestCase):
                 self.assertNotIn("subagent_search_brief", tool_names)
 
 
+class AgentServiceWarmupTests(unittest.TestCase):
+    def _service(self):
+        return AgentService(
+            AppConfig(llm=LLMConfig.from_env("ollama"), mcp=MCPConfig(enabled=frozenset()))
+        )
+
+    def test_greeting_is_placeholder_until_warm(self):
+        service = self._service()
+        service._build_agent = lambda tools: object()
+
+        self.assertFalse(service.ready)
+        self.assertEqual(_get_greeting(service), GREETING_PLACEHOLDER)
+
+        asyncio.run(service.warmup())
+
+        self.assertTrue(service.ready)
+        self.assertIsNone(service.warmup_error)
+
+    def test_failed_warmup_falls_back_to_plain_greeting(self):
+        service = self._service()
+
+        def fail(tools):
+            raise RuntimeError("no model")
+
+        service._build_agent = fail
+        asyncio.run(service.warmup())
+
+        self.assertFalse(service.ready)
+        self.assertIsInstance(service.warmup_error, RuntimeError)
+        self.assertNotEqual(_get_greeting(service), GREETING_PLACEHOLDER)
+
+
+class SlowChatModel(GenericFakeChatModel):
+    """每次调用前等待一会儿，便于观察同时进行的调用数"""
+
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(0.02)
+        return await super()._agenerate(*args, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class AgentServiceConcurrencyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_sessions_share_one_agent_and_only_model_calls_are_limited(self):
+        service = AgentService(
+            AppConfig(
+                llm=LLMConfig.from_env("ollama"),
+                mcp=MCPConfig(enabled=frozenset()),
+                model_limit=ModelLimitConfig(max_concurrency=2),
+                sessions=SessionConfig(enabled=False),
+            )
+        )
+        service._llm = SlowChatModel(messages=iter([AIMessage(content="ok")] * 8))
+        built = []
+        build_agent = service._build_agent
+        service._build_agent = lambda tools: built.append(1) or build_agent(tools)
+
+        async def turn():
+            agent = await service.get_agent()
+            await agent.ainvoke({"messages": [{"role": "user", "content": "hi"}]})
+            return agent
+
+        agents = await asyncio.gather(*(turn() for _ in range(6)))
+
+        stats = service.model_stats()
+        self.assertEqual(len(built), 1)
+        self.assertEqual(len({id(agent) for agent in agents}), 1)
+        self.assertEqual(stats.acquired, 6)
+        self.assertEqual(stats.in_flight, 0)
+        self.assertGreater(stats.peak_waiting, 0)
+
+
+class AgentServiceShutdownTests(unittest.IsolatedAsyncioTestCase):
+    async def test_lifespan_closes_persistent_mcp_sessions(self):
+        class FakeInterceptor:
+            closed = False
+
+            async def aclose(self):
+                self.closed = True
+
+        service = AgentService(
+            AppConfig(
+                llm=LLMConfig.from_env("ollama"),
+                mcp=MCPConfig(enabled=frozenset()),
+                sessions=SessionConfig(path=":memory:"),
+            )
+        )
+        service._build_agent = lambda tools: object()
+        interceptor = service._mcp_sessions = FakeInterceptor()
+        sessions = service.sessions
+
+        async with make_warmup_lifespan(service)(None):
+            await asyncio.sleep(0)
+
+        self.assertTrue(interceptor.closed)
+        self.assertIsNone(service._mcp_sessions)
+        self.assertIsNone(service._sessions)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            sessions._db.execute("SELECT 1")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,22 +1,41 @@
 import asyncio
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
 import app as app_module
-from app import AppConfig, LLMConfig, make_generate_response
+from app import (
+    AgentService,
+    AppConfig,
+    HistoryConfig,
+    LLMConfig,
+    MCPConfig,
+    SessionConfig,
+    StreamConfig,
+    make_generate_response,
+)
+from utils.conversation_store import ConversationStore
+from utils.model_limiter import ModelBusyError
 from utils.tool_view import format_tool_call, format_tool_result
 
 
-class ServiceThatShouldNotStart:
+class FakeService:
     llm = None
+    conversations = None
+    sessions = None
+
+    def model_stats(self):
+        return None
 
+
+class ServiceThatShouldNotStart(FakeService):
     async def get_agent(self):
         raise AssertionError("agent should not start before the first UI update")
 
 
-class ServiceThatRecordsStartup:
-    llm = None
-
+class ServiceThatRecordsStartup(FakeService):
     def __init__(self):
         self.started = False
 
@@ -25,20 +44,41 @@ class ServiceThatRecordsStartup:
         raise AssertionError("agent should not start before the first UI update")
 
 
-class StaticAgentService:
-    llm = None
-
+class StaticAgentService(FakeService):
     async def get_agent(self):
         return object()
 
 
-class FailingAgentService:
-    llm = None
-
+class FailingAgentService(FakeService):
     async def get_agent(self):
         raise RuntimeError("agent init failed")
 
 
+class BusyAgentService(FakeService):
+    async def get_agent(self):
+        raise ModelBusyError("queue full")
+
+
+class SessionAgentService(StaticAgentService):
+    def __init__(self, stored):
+        self.sessions = object()
+        self.stored = stored
+        self.loaded = []
+
+    async def has_thread(self, thread_id):
+        self.loaded.append(thread_id)
+        return bool(self.stored)
+
+
+class TokenStreamingAgent:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def astream(self, *args, **kwargs):
+        for token in self.tokens:
+            yield "messages", (SimpleNamespace(content=token), {"langgraph_node": "model"})
+
+
 class AsyncSummaryLLM:
     def invoke(self, prompt):
         raise AssertionError("sync invoke should not be called from async response path")
@@ -82,6 +122,64 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(messages, [{"role": "user", "content": user_content}])
         self.assertIsNot(messages, history)
 
+    async def test_stream_events_coalesces_model_tokens(self):
+        tokens = [f"t{i} " for i in range(100)]
+        history = [{"role": "assistant", "content": app_module.TYPING_INDICATOR_HTML}]
+
+        updates = [
+            update
+            async for update in app_module._stream_events(
+                TokenStreamingAgent(tokens),
+                [],
+                history,
+                None,
+                stream=StreamConfig(interval=60, max_bytes=64),
+            )
+        ]
+
+        self.assertEqual(history[0]["content"], "".join(tokens))
+        self.assertLess(len(updates), len(tokens) // 4)
+        self.assertGreater(len(updates), 1)
+
+    async def test_stream_events_flushes_pending_tokens_during_model_stall(self):
+        class StallingAgent:
+            async def astream(self, *args, **kwargs):
+                for token in ("a", "b"):
+                    yield "messages", (SimpleNamespace(content=token), {"langgraph_node": "model"})
+                await asyncio.sleep(0.5)
+                yield "messages", (SimpleNamespace(content="c"), {"langgraph_node": "model"})
+
+        history = [{"role": "assistant", "content": app_module.TYPING_INDICATOR_HTML}]
+        seen = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async for _, updated in app_module._stream_events(
+            StallingAgent(), [], history, None, stream=StreamConfig(interval=0.02)
+        ):
+            seen.append((updated[0]["content"], loop.time() - start))
+
+        self.assertEqual([content for content, _ in seen], ["a", "ab", "abc"])
+        # "b" 在停顿结束前就已展示
+        self.assertLess(seen[1][1], 0.3)
+
+    async def test_stream_events_keeps_pending_tokens_on_error(self):
+        class FailingAgent:
+            async def astream(self, *args, **kwargs):
+                for token in ("a", "b", "c"):
+                    yield "messages", (SimpleNamespace(content=token), {"langgraph_node": "model"})
+                raise RuntimeError("stream broke")
+
+        history = [{"role": "assistant", "content": app_module.TYPING_INDICATOR_HTML}]
+
+        with self.assertRaises(RuntimeError):
+            async for _ in app_module._stream_events(
+                FailingAgent(), [], history, None, stream=StreamConfig(interval=60)
+            ):
+                pass
+
+        self.assertEqual(history[0]["content"], "abc")
+
     async def test_whitespace_only_message_is_ignored(self):
         history = []
         generate_response = make_generate_response(
@@ -124,7 +222,7 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
     async def test_tool_context_uses_configured_model(self):
         captured = {}
 
-        async def stream_events(agent, messages, history, tool_context):
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
             captured["tool_context"] = tool_context
             yield "", history
 
@@ -145,6 +243,180 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(captured["tool_context"].model, "deepseek-v3-2-251201")
 
+    async def test_long_history_is_sent_as_summary_and_recent_window(self):
+        captured = {}
+
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            captured["messages"] = messages
+            yield "", history
+
+        async def summarize(summary, messages):
+            return f"summary of {len(messages)}"
+
+        service = StaticAgentService()
+        service.conversations = ConversationStore(
+            summarize, trigger_tokens=40, keep_tokens=20, count_tokens=lambda m: len(m["content"])
+        )
+        history = []
+        for i in range(4):
+            history += [
+                {"role": "user", "content": f"question {i}"},
+                {"role": "assistant", "content": f"answer {i}"},
+            ]
+        generate_response = make_generate_response(service, AppConfig())
+
+        with patch("app._stream_events", stream_events):
+            async for _ in generate_response("hello", history):
+                pass
+
+        sent = captured["messages"]
+        self.assertIn("summary of 7", sent[0]["content"])
+        self.assertEqual([m["content"] for m in sent[1:]], ["answer 3", "hello"])
+        self.assertEqual(len(history), 10)
+
+    async def test_history_window_applies_every_turn_when_sessions_are_disabled(self):
+        sent = []
+
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            sent.append(messages)
+            history[-1]["content"] = "answer " + "y" * 40
+            yield "", history
+
+        summarized = []
+
+        async def summarize(summary, messages):
+            summarized.append(len(messages))
+            return f"summary {len(summarized)}"
+
+        config = AppConfig(
+            llm=LLMConfig.from_env("ollama"),
+            mcp=MCPConfig(enabled=frozenset()),
+            sessions=SessionConfig(enabled=False),
+            history=HistoryConfig(trigger_tokens=60, keep_tokens=30),
+        )
+        service = AgentService(config)
+        service._summarize_history = summarize
+        service._agent = object()
+        generate_response = make_generate_response(service, config)
+        history = []
+
+        with patch("app._stream_events", stream_events):
+            for turn in range(4):
+                async for _ in generate_response(f"question {turn} " + "x" * 40, history):
+                    pass
+                # 等待本轮结束后在后台准备的摘要
+                await asyncio.gather(*service.conversations._tasks)
+
+        self.assertIsNotNone(service.conversations)
+        self.assertGreater(service.conversations.summaries, 0)
+        self.assertGreater(service.conversations.reused, 0)
+        self.assertIn("summary", sent[-1][0]["content"])
+        self.assertLess(len(sent[-1]), len(history) - 1)
+
+    async def test_stored_thread_sends_only_new_message(self):
+        captured = {}
+
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            captured.update(kwargs, messages=messages)
+            yield "", history
+
+        service = SessionAgentService([HumanMessage("first"), AIMessage("answer")])
+        history = [
+            {"role": "assistant", "content": "greeting"},
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "answer"},
+        ]
+        generate_response = make_generate_response(service, AppConfig())
+
+        with patch("app._stream_events", stream_events):
+            async for _ in generate_response("next", history, "t1"):
+                pass
+
+        self.assertEqual(service.loaded, ["t1"])
+        self.assertEqual(captured["messages"], [{"role": "user", "content": "next"}])
+        self.assertEqual(captured["thread_id"], "t1")
+        self.assertEqual(captured["durability"], "exit")
+        self.assertEqual(len(history), 5)
+
+    async def test_conversation_store_is_bypassed_for_stored_thread(self):
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            yield "", history
+
+        async def summarize(summary, messages):
+            raise AssertionError("stored threads are summarized inside the agent")
+
+        service = SessionAgentService([HumanMessage("first"), AIMessage("answer")])
+        service.conversations = ConversationStore(summarize, trigger_tokens=0, keep_tokens=0)
+        history = [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "answer"},
+        ]
+        generate_response = make_generate_response(service, AppConfig())
+
+        with patch("app._stream_events", stream_events):
+            async for _ in generate_response("next", history, "t1"):
+                pass
+            await asyncio.sleep(0)
+
+        self.assertEqual((service.conversations.summaries, service.conversations.reused), (0, 0))
+        self.assertFalse(service.conversations._tasks)
+
+    async def test_new_thread_is_seeded_from_ui_history_without_greeting(self):
+        captured = {}
+
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            captured.update(kwargs, messages=messages)
+            yield "", history
+
+        history = [
+            {"role": "assistant", "content": "greeting"},
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "answer"},
+        ]
+        generate_response = make_generate_response(SessionAgentService([]), AppConfig())
+
+        with patch("app._stream_events", stream_events):
+            async for _ in generate_response("next", history, "t1"):
+                pass
+
+        self.assertEqual([m["content"] for m in captured["messages"]], ["first", "answer", "next"])
+        self.assertEqual(captured["thread_id"], "t1")
+
+    async def test_missing_thread_id_uses_one_off_thread(self):
+        captured = {}
+
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
+            captured.update(kwargs)
+            yield "", history
+
+        generate_response = make_generate_response(SessionAgentService([]), AppConfig())
+
+        with patch("app._stream_events", stream_events):
+            async for _ in generate_response("hello", []):
+                pass
+
+        self.assertTrue(captured["thread_id"])
+
+    def test_build_ui_history_merges_turn_and_skips_summary(self):
+        messages = [
+            HumanMessage("summary", additional_kwargs={"lc_source": "summarization"}),
+            HumanMessage("1+1?"),
+            AIMessage("", tool_calls=[{"name": "calculator", "args": {"x": "1+1"}, "id": "c1"}]),
+            ToolMessage("2", name="calculator", tool_call_id="c1"),
+            AIMessage("It is 2."),
+        ]
+
+        history = app_module.build_ui_history(messages)
+
+        self.assertEqual(history[0], {"role": "user", "content": "1+1?"})
+        self.assertEqual(len(history), 2)
+        self.assertEqual(
+            history[1]["content"],
+            format_tool_call("calculator", {"x": "1+1"})
+            + format_tool_result("calculator", "2")
+            + "It is 2.",
+        )
+
     async def test_agent_startup_error_is_rendered_in_history(self):
         history = []
         generate_response = make_generate_response(
@@ -171,6 +443,20 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
         self.assertNotIn("typing-indicator", history[1]["content"])
         self.assertIn("agent init failed", history[1]["content"])
 
+    async def test_busy_model_is_rendered_without_llm_summary(self):
+        history = []
+        generate_response = make_generate_response(BusyAgentService(), AppConfig())
+
+        with (
+            patch("builtins.print"),
+            patch("app._summarize_error", side_effect=AssertionError("should not summarize")),
+        ):
+            async for _ in generate_response("hello", history):
+                pass
+
+        self.assertNotIn("typing-indicator", history[1]["content"])
+        self.assertIn("请稍后再试", history[1]["content"])
+
     async def test_generation_cancellation_clears_typing_indicator_and_reraises(self):
         history = []
         generate_response = make_generate_response(
@@ -178,7 +464,7 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
             AppConfig(),
         )
 
-        async def stream_events(agent, messages, history, tool_context):
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
             raise asyncio.CancelledError()
             yield "", history
 
@@ -205,7 +491,7 @@ class GenerateResponseTests(unittest.IsolatedAsyncioTestCase):
             {"role": "assistant", "content": tool_html},
         ]
 
-        async def stream_events(agent, messages, history, tool_context):
+        async def stream_events(agent, messages, history, tool_context, **kwargs):
             captured["messages"] = messages
             captured["ui_history"] = history
             yield "", history
@@ -0,0 +1,350 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from typing import Annotated, TypedDict
+
+from langchain_core.messages import AIMessage, RemoveMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from utils.checkpoint_store import SqliteCheckpointSaver
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _reply(state):
+    return {"messages": [AIMessage(content=f"reply {len(state['messages'])} " + "x" * 600)]}
+
+
+def _graph(saver):
+    graph = StateGraph(State)
+    graph.add_node("model", _reply)
+    graph.add_edge(START, "model")
+    graph.add_edge("model", END)
+    return graph.compile(checkpointer=saver)
+
+
+def _config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _converse(graph, thread_id, turns):
+    for turn in range(turns):
+        graph.invoke(
+            {"messages": [{"role": "user", "content": f"q{turn}", "id": f"{thread_id}-{turn}"}]},
+            _config(thread_id),
+        )
+
+
+def _history(graph, thread_id):
+    return [
+        [m.content for m in state.values.get("messages", [])]
+        for state in graph.get_state_history(_config(thread_id))
+    ]
+
+
+class SqliteCheckpointSaverTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "sessions", "sessions.sqlite")
+
+    def _saver(self, **kwargs):
+        saver = SqliteCheckpointSaver(self.path, **kwargs)
+        self.addCleanup(saver.close)
+        return saver
+
+    def test_uses_wal_journal(self):
+        saver = self._saver()
+
+        mode = saver._db.execute("PRAGMA journal_mode").fetchone()[0]
+
+        self.assertEqual(mode, "wal")
+
+    def test_thread_survives_reopen(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        for question in ("q1", "q2"):
+            graph.invoke({"messages": [{"role": "user", "content": question}]}, _config("t1"))
+        saver.close()
+
+        reopened = _graph(self._saver())
+        reopened.invoke({"messages": [{"role": "user", "content": "q3"}]}, _config("t1"))
+        messages = reopened.get_state(_config("t1")).values["messages"]
+
+        self.assertEqual([m.content for m in messages[::2]], ["q1", "q2", "q3"])
+        self.assertTrue(messages[-1].content.startswith("reply 5"))
+
+    def test_writes_are_committed_in_batches(self):
+        saver = self._saver(batch_size=1000, flush_interval=60)
+        graph = _graph(saver)
+        for thread_id in ("a", "b", "c"):
+            graph.invoke(
+                {"messages": [{"role": "user", "content": "hi"}]},
+                _config(thread_id),
+                durability="exit",
+            )
+        other = sqlite3.connect(self.path)
+        self.addCleanup(other.close)
+        # 每次运行开始时读取会话会先提交缓冲区，最后一次运行的写入仍在缓冲区中
+        committed = other.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        self.assertEqual(committed, 2)
+
+        saver.flush()
+
+        self.assertEqual(other.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0], 3)
+        self.assertLessEqual(saver.commits, 3)
+
+    def test_interval_flushes_pending_writes(self):
+        saver = self._saver(batch_size=1000, flush_interval=0.05)
+        _graph(saver).invoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t"))
+        other = sqlite3.connect(self.path)
+        self.addCleanup(other.close)
+
+        for _ in range(100):
+            if other.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]:
+                break
+            time.sleep(0.02)
+
+        self.assertGreater(other.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0], 0)
+
+    def test_large_values_are_compressed(self):
+        saver = self._saver()
+        _graph(saver).invoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t"))
+        saver.flush()
+
+        types = {row[0] for row in saver._db.execute("SELECT type FROM blobs")}
+
+        self.assertIn("msgpack+zlib", types)
+
+    def test_list_filters_and_limits(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        for question in ("q1", "q2"):
+            graph.invoke({"messages": [{"role": "user", "content": question}]}, _config("t1"))
+
+        history = list(saver.list(_config("t1")))
+        latest = list(saver.list(_config("t1"), limit=1))
+        before = list(saver.list(_config("t1"), before=history[0].config))
+        inputs = list(saver.list(_config("t1"), filter={"source": "input"}))
+
+        self.assertEqual(len(history), 6)
+        self.assertEqual(latest[0].config, history[0].config)
+        self.assertEqual(len(before), 5)
+        self.assertEqual(len(inputs), 2)
+
+    def test_delete_thread(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        graph.invoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t1"))
+        graph.invoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t2"))
+
+        saver.delete_thread("t1")
+
+        self.assertIsNone(saver.get_tuple(_config("t1")))
+        self.assertIsNotNone(saver.get_tuple(_config("t2")))
+
+    def test_async_graph_run(self):
+        saver = self._saver()
+        graph = _graph(saver)
+
+        async def run():
+            await graph.ainvoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t"))
+            return await graph.aget_state(_config("t"))
+
+        state = asyncio.run(run())
+
+        self.assertEqual(len(state.values["messages"]), 2)
+
+    def test_async_writes_commit_off_the_event_loop(self):
+        saver = self._saver(batch_size=1)
+        graph = _graph(saver)
+        committed_on = []
+        flush = saver._flush_locked
+
+        def record():
+            if saver._pending:
+                committed_on.append(threading.current_thread())
+            flush()
+
+        saver._flush_locked = record
+
+        async def run():
+            await graph.ainvoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t"))
+
+        asyncio.run(run())
+
+        self.assertTrue(committed_on)
+        self.assertNotIn(threading.main_thread(), committed_on)
+        self.assertIsNotNone(saver.get_tuple(_config("t")))
+
+    def test_async_writes_do_not_block_loop_while_lock_is_held(self):
+        saver = self._saver()
+        held = threading.Event()
+
+        def hold_lock():
+            # 模拟 compact() / vacuum() 在线程中长时间持有锁
+            with saver._lock:
+                held.set()
+                time.sleep(0.3)
+
+        async def run():
+            threading.Thread(target=hold_lock).start()
+            held.wait()
+            put = asyncio.ensure_future(saver.aput(_config("t"), empty_checkpoint(), {}, {}))
+            start = time.monotonic()
+            await asyncio.sleep(0.05)
+            lag = time.monotonic() - start
+            await put
+            return lag
+
+        self.assertLess(asyncio.run(run()), 0.2)
+
+    def test_has_thread_checks_existence_without_loading_state(self):
+        saver = self._saver()
+        _graph(saver).invoke({"messages": [{"role": "user", "content": "hi"}]}, _config("t1"))
+        saver._loads = None  # 读取会话内容时会出错
+
+        self.assertTrue(saver.has_thread("t1"))
+        self.assertFalse(saver.has_thread("t2"))
+
+
+class CompactionTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "sessions.sqlite")
+        self.now = 1000.0
+
+    def _saver(self, **kwargs):
+        saver = SqliteCheckpointSaver(self.path, clock=lambda: self.now, **kwargs)
+        self.addCleanup(saver.close)
+        return saver
+
+    def _count(self, saver, table, where=""):
+        saver.flush()
+        return saver._db.execute(f"SELECT COUNT(*) FROM {table} {where}").fetchone()[0]
+
+    def test_deltas_reconstruct_same_history(self):
+        saver = self._saver(snapshot_every=4)
+        graph, reference = _graph(saver), _graph(InMemorySaver())
+        _converse(graph, "t", 6)
+        _converse(reference, "t", 6)
+
+        self.assertEqual(_history(graph, "t"), _history(reference, "t"))
+        snapshots = self._count(
+            saver, "blobs", "WHERE channel = 'messages' AND base_version IS NULL"
+        )
+        deltas = self._count(saver, "blobs", "WHERE base_version IS NOT NULL")
+        self.assertGreater(deltas, snapshots)
+
+    def test_deltas_survive_reopen(self):
+        graph = _graph(self._saver())
+        _converse(graph, "t", 3)
+        expected = _history(graph, "t")
+
+        self.assertEqual(_history(_graph(self._saver()), "t"), expected)
+
+    def test_removed_message_stores_snapshot(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        _converse(graph, "t", 2)
+
+        graph.update_state(_config("t"), {"messages": [RemoveMessage(id="t-0")]})
+        saver.flush()
+        latest = saver.get_tuple(_config("t")).checkpoint
+        version = str(latest["channel_versions"]["messages"])
+        base = saver._db.execute(
+            "SELECT base_version FROM blobs WHERE channel = 'messages' AND version = ?", (version,)
+        ).fetchone()[0]
+
+        self.assertIsNone(base)
+        self.assertEqual(len(graph.get_state(_config("t")).values["messages"]), 3)
+
+    def test_compact_keeps_last_checkpoints_and_replays(self):
+        saver = self._saver(snapshot_every=3)
+        graph = _graph(saver)
+        _converse(graph, "t", 5)
+        _converse(graph, "other", 1)
+        expected = _history(graph, "t")[:4]
+
+        stats = saver.compact(keep_last=4, thread_ids=["t"])
+
+        self.assertEqual(stats.checkpoints, 11)
+        self.assertGreater(stats.blobs, 0)
+        self.assertEqual(_history(graph, "t"), expected)
+        self.assertEqual(len(_history(graph, "other")), 3)
+        oldest = list(saver.list(_config("t")))[-1]
+        self.assertIsNone(oldest.parent_config)
+        # 从保留的最早 checkpoint 分叉，依赖的快照仍然可读
+        fork = graph.update_state(oldest.config, {"messages": [AIMessage(content="fork")]})
+        self.assertEqual(graph.get_state(fork).values["messages"][-1].content, "fork")
+
+    def test_compact_expires_old_threads(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        _converse(graph, "old", 2)
+        self.now += 100
+        _converse(graph, "new", 1)
+
+        stats = saver.compact(max_age=50)
+
+        self.assertEqual(stats.threads, 1)
+        self.assertIsNone(saver.get_tuple(_config("old")))
+        self.assertIsNotNone(saver.get_tuple(_config("new")))
+        self.assertEqual(self._count(saver, "blobs", "WHERE thread_id = 'old'"), 0)
+        self.assertEqual(self._count(saver, "writes", "WHERE thread_id = 'old'"), 0)
+
+    def test_prune_keep_latest(self):
+        saver = self._saver()
+        graph = _graph(saver)
+        _converse(graph, "t", 3)
+        expected = graph.get_state(_config("t")).values
+
+        saver.prune(["t"])
+
+        self.assertEqual(self._count(saver, "checkpoints"), 1)
+        self.assertEqual(graph.get_state(_config("t")).values, expected)
+        graph.invoke({"messages": [{"role": "user", "content": "q3"}]}, _config("t"))
+        self.assertEqual(len(graph.get_state(_config("t")).values["messages"]), 8)
+
+    def test_vacuum_shrinks_file(self):
+        saver = self._saver()
+        _converse(_graph(saver), "t", 30)
+        saver.vacuum()
+        before = os.path.getsize(self.path)
+
+        saver.compact(keep_last=1)
+        saver.vacuum()
+
+        self.assertLess(os.path.getsize(self.path), before)
+        self.assertEqual(saver._db.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertEqual(saver._db.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+
+    def test_migrates_old_schema(self):
+        db = sqlite3.connect(self.path)
+        db.executescript(
+            "CREATE TABLE checkpoints (thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, "
+            "parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, "
+            "metadata BLOB, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+            "CREATE TABLE blobs (thread_id TEXT, checkpoint_ns TEXT, channel TEXT, version TEXT, "
+            "type TEXT, blob BLOB, PRIMARY KEY (thread_id, checkpoint_ns, channel, version));"
+        )
+        db.close()
+
+        graph = _graph(self._saver())
+        _converse(graph, "t", 2)
+
+        self.assertEqual(len(graph.get_state(_config("t")).values["messages"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mcp"))
+
+import code_execution  # noqa: E402
+
+
+@unittest.skipUnless(hasattr(os, "fork") and sys.platform == "linux", "需要 fork 与 RLIMIT_AS")
+class WorkerPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = code_execution.WorkerPool(size=1, max_memory_mb=256, timeout=10)
+        await self.pool.start()
+        self.addAsyncCleanup(self.pool.close)
+
+    async def test_runs_code_in_fresh_child(self):
+        self.assertEqual(await self.pool.run("x = 1\nprint(x)"), "1")
+        self.assertIn("NameError", await self.pool.run("print(x)"))
+
+    async def test_allocation_over_memory_ceiling_is_stopped(self):
+        output = await self.pool.run("data = bytearray(512 * 1024 * 1024)\nprint('allocated')")
+
+        self.assertIn("MemoryError", output)
+        self.assertNotIn("allocated", output)
+        # 常驻解释器不受影响，下一次执行正常
+        self.assertEqual(await self.pool.run("print(sum(range(10)))"), "45")
+
+
+if __name__ == "__main__":
+    unittest.main()
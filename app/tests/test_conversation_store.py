@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+
+from utils.conversation_store import ConversationStore, prefix_digests
+
+
+def _turns(n, size=10):
+    """n 轮对话，每条消息 size 个字符"""
+    messages = []
+    for i in range(n):
+        messages.append({"role": "user", "content": f"q{i}".ljust(size, ".")})
+        messages.append({"role": "assistant", "content": f"a{i}".ljust(size, ".")})
+    return messages
+
+
+class RecordingSummarizer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, summary, messages):
+        self.calls.append((summary, [m["content"][:3] for m in messages]))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("llm down")
+        return f"{summary}+{len(messages)}"
+
+
+def _store(summarizer, **kwargs):
+    options = {"trigger_tokens": 50, "keep_tokens": 30, "count_tokens": lambda m: len(m["content"])}
+    options.update(kwargs)
+    return ConversationStore(summarizer, **options)
+
+
+class PrefixDigestTests(unittest.TestCase):
+    def test_shared_prefix_shares_digests(self):
+        a = prefix_digests(_turns(2))
+        b = prefix_digests(_turns(2)[:3] + [{"role": "assistant", "content": "other"}])
+
+        self.assertEqual(a[:4], b[:4])
+        self.assertNotEqual(a[4], b[4])
+
+
+class ConversationStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def test_short_history_is_sent_unchanged(self):
+        summarizer = RecordingSummarizer()
+        messages = _turns(2)
+
+        self.assertEqual(await _store(summarizer).prepare(messages), messages)
+        self.assertEqual(summarizer.calls, [])
+
+    async def test_long_history_becomes_summary_and_recent_window(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+        messages = _turns(3) + [{"role": "user", "content": "new"}]
+
+        sent = await store.prepare(messages)
+
+        # 保留不超过 30 个字符的最近消息：q2、a2 与本轮输入
+        self.assertEqual([m["content"][:3] for m in sent[1:]], ["q2.", "a2.", "new"])
+        self.assertIn("+4", sent[0]["content"])
+        self.assertEqual(summarizer.calls, [("", ["q0.", "a0.", "q1.", "a1."])])
+
+    async def test_next_turn_reuses_summary_without_new_call(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+        history = _turns(3)
+        await store.prepare(history + [{"role": "user", "content": "new"}])
+
+        sent = await store.prepare(
+            history
+            + [{"role": "user", "content": "new"}, {"role": "assistant", "content": "ok"}]
+            + [{"role": "user", "content": "next"}]
+        )
+
+        self.assertEqual(len(summarizer.calls), 1)
+        self.assertEqual(store.reused, 1)
+        self.assertEqual(
+            [m["content"][:4] for m in sent[1:]], ["q2..", "a2..", "new", "ok", "next"]
+        )
+
+    async def test_summary_grows_incrementally(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+        messages = _turns(3) + [{"role": "user", "content": "new"}]
+        await store.prepare(messages)
+
+        longer = messages + _turns(3)[1:] + [{"role": "user", "content": "last"}]
+        await store.prepare(longer)
+
+        self.assertEqual(len(summarizer.calls), 2)
+        previous, folded = summarizer.calls[1]
+        self.assertEqual(previous, "+4")
+        self.assertEqual(folded[0], "q2.")
+
+    async def test_edited_history_does_not_reuse_summary(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+        messages = _turns(3) + [{"role": "user", "content": "new"}]
+        await store.prepare(messages)
+
+        edited = [{"role": "user", "content": "changed..."}] + messages[1:]
+        await store.prepare(edited)
+
+        self.assertEqual(len(summarizer.calls), 2)
+        self.assertEqual(summarizer.calls[1][0], "")
+
+    async def test_failed_summary_falls_back_to_full_history(self):
+        store = _store(RecordingSummarizer(fail=True))
+        messages = _turns(3) + [{"role": "user", "content": "new"}]
+
+        self.assertEqual(await store.prepare(messages), messages)
+        self.assertEqual(len(store), 0)
+
+    async def test_concurrent_turns_share_one_summary_call(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+        messages = _turns(3) + [{"role": "user", "content": "new"}]
+
+        first, second = await asyncio.gather(store.prepare(messages), store.prepare(messages))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(summarizer.calls), 1)
+
+    async def test_schedule_prepares_in_background(self):
+        summarizer = RecordingSummarizer()
+        store = _store(summarizer)
+
+        store.schedule(_turns(4))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(summarizer.calls), 1)
+        self.assertEqual(len(store), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
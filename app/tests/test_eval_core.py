@@ -0,0 +1,86 @@
+import filecmp
+import os
+import unittest
+
+from tools.eval_core import (
+    _CONST,
+    EvalError,
+    EvalLimits,
+    Program,
+    compile_expression,
+    evaluate,
+)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CORE = os.path.join(REPO_DIR, "app", "tools", "eval_core.py")
+SKILL_COPY = os.path.join(
+    REPO_DIR, "skills", "dive-into-langgraph", "scripts", "tools", "eval_core.py"
+)
+
+
+class CompileTests(unittest.TestCase):
+    def test_constant_subexpressions_are_folded(self):
+        program = compile_expression("x * 2 ** 10 + sqrt(16)", ("x",))
+
+        constants = [arg for op, arg in program.code if op == _CONST]
+        self.assertEqual(constants, [1024, 4.0])
+        self.assertEqual(program.run({"x": 2}), 2052.0)
+
+    def test_fully_constant_expression_becomes_a_constant(self):
+        program = compile_expression("(sqrt(9) + 1) ** 2")
+
+        self.assertIsInstance(program, Program)
+        self.assertTrue(program.is_constant)
+        self.assertEqual(program.run(), 16.0)
+
+    def test_failed_folds_raise_at_run_time(self):
+        program = compile_expression("1 / 0 + x", ("x",))
+
+        with self.assertRaises(EvalError) as ctx:
+            program.run({"x": 1})
+        self.assertEqual(ctx.exception.kind, "zero_division")
+
+    def test_deep_nesting_does_not_recurse(self):
+        limits = EvalLimits(max_nodes=100_000)
+
+        self.assertEqual(evaluate("-" * 5000 + "1", limits=limits), 1)
+        self.assertEqual(evaluate("1+" * 3000 + "1", limits=limits), 3001)
+
+    def test_function_tables(self):
+        self.assertEqual(evaluate("abs(-2)"), 2)
+        with self.assertRaisesRegex(EvalError, "不支持的函数: abs"):
+            evaluate("abs(-2)", functions="none")
+
+
+class ErrorKindTests(unittest.TestCase):
+    def test_errors_carry_a_kind(self):
+        cases = {
+            " ": "empty",
+            "1 +": "syntax",
+            "a.b": "unsupported",
+            "1 % 0": "zero_division",
+            "sqrt(-1)": "math",
+            "exp(1000)": "math",
+            "9**9**9": "too_large",
+            "1" * 10_001: "too_long",
+            "+".join(["1"] * 600): "too_complex",
+        }
+        for expression, kind in cases.items():
+            with self.subTest(expression=expression[:20]):
+                with self.assertRaises(EvalError) as ctx:
+                    evaluate(expression)
+                self.assertEqual(ctx.exception.kind, kind)
+                self.assertIsInstance(ctx.exception, ValueError)
+
+
+class SkillCopyTests(unittest.TestCase):
+    def test_skill_copy_is_identical(self):
+        """skill 单独安装，不能从 app 导入，带一份 eval_core.py，必须与 app 中的保持一致"""
+        self.assertTrue(
+            filecmp.cmp(CORE, SKILL_COPY, shallow=False),
+            "skills 中的 eval_core.py 与 app/tools/eval_core.py 不一致，请重新复制",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
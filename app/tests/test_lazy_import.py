@@ -0,0 +1,41 @@
+import sys
+import unittest
+
+from utils.lazy_import import LazyModule, preload
+
+
+class LazyModuleTests(unittest.TestCase):
+    def setUp(self):
+        # 选一个测试进程中不会提前导入的标准库模块
+        self.name = "xml.dom.minidom"
+        sys.modules.pop(self.name, None)
+        self.addCleanup(sys.modules.pop, self.name, None)
+
+    def test_imports_on_first_attribute_access(self):
+        module = LazyModule(self.name)
+
+        self.assertFalse(module.loaded)
+        self.assertIn(self.name, repr(module))
+
+        document = module.parseString("<a/>")
+
+        self.assertTrue(module.loaded)
+        self.assertEqual(document.documentElement.tagName, "a")
+
+    def test_preload_imports_all_modules(self):
+        module = LazyModule(self.name)
+
+        preload([module])
+
+        self.assertIn(self.name, sys.modules)
+        self.assertIs(module.load(), sys.modules[self.name])
+
+    def test_missing_module_raises_on_access(self):
+        module = LazyModule("no_such_module_for_lazy_import")
+
+        with self.assertRaises(ImportError):
+            module.anything
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import CallToolResult, TextContent, Tool
+
+from utils.mcp_batch import ToolCallCoalescer, find_batch_tools
+
+MATH = Tool(
+    name="math",
+    inputSchema={
+        "type": "object",
+        "properties": {"question": {"type": "string"}},
+        "required": ["question"],
+    },
+)
+MATH_BATCH = Tool(
+    name="math_batch",
+    inputSchema={
+        "type": "object",
+        "properties": {"questions": {"type": "array", "items": {"type": "string"}}},
+        "required": ["questions"],
+    },
+)
+
+
+def _solve(question):
+    return eval(question, {"__builtins__": {}})  # 测试输入固定
+
+
+def _text(value):
+    return [TextContent(type="text", text=str(value))]
+
+
+class FakeSession:
+    """按 math_mcp 的约定应答 math 与 math_batch"""
+
+    def __init__(self, batch_fails=False):
+        self.batch_fails = batch_fails
+        self.calls = []
+
+    async def call_tool(self, name, args, progress_callback=None):
+        self.calls.append((name, args))
+        await asyncio.sleep(0)
+        if name == "math":
+            try:
+                value = _solve(args["question"])
+            except ZeroDivisionError:
+                return CallToolResult(content=_text("division by zero"), isError=True)
+            return CallToolResult(content=_text(value), structuredContent={"result": value})
+        if self.batch_fails:
+            raise RuntimeError("batch unavailable")
+        items = []
+        for question in args["questions"]:
+            try:
+                items.append({"result": _solve(question)})
+            except ZeroDivisionError:
+                items.append({"error": "division by zero"})
+        return CallToolResult(content=_text(items), structuredContent={"result": items})
+
+
+async def _ask(tool, question):
+    """调用工具并取出文本结果"""
+    output = await tool.ainvoke({"question": question})
+    return output[0]["text"] if isinstance(output, list) else str(output)
+
+
+def _tools(session, coalescer):
+    tools = [
+        convert_mcp_tool_to_langchain_tool(
+            session, tool, tool_interceptors=[coalescer], server_name="math:http"
+        )
+        for tool in (MATH, MATH_BATCH)
+    ]
+    coalescer.register(tools)
+    return tools[0]
+
+
+class FindBatchToolsTests(unittest.TestCase):
+    def test_pairs_tools_with_their_batch_version(self):
+        session = FakeSession()
+        tools = [convert_mcp_tool_to_langchain_tool(session, tool) for tool in (MATH, MATH_BATCH)]
+
+        specs = find_batch_tools(tools)
+
+        self.assertEqual(list(specs), ["math"])
+        self.assertEqual(
+            (specs["math"].batch_name, specs["math"].arg, specs["math"].batch_arg),
+            ("math_batch", "question", "questions"),
+        )
+
+
+class ToolCallCoalescerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_become_one_batch(self):
+        session = FakeSession()
+        coalescer = ToolCallCoalescer()
+        math = _tools(session, coalescer)
+
+        results = await asyncio.gather(*(_ask(math, q) for q in ["1 + 1", "2 * 3", "10 - 4"]))
+
+        self.assertEqual(results, ["2", "6", "6"])
+        self.assertEqual(
+            session.calls, [("math_batch", {"questions": ["1 + 1", "2 * 3", "10 - 4"]})]
+        )
+        self.assertEqual((coalescer.batches, coalescer.batched_calls), (1, 3))
+
+    async def test_item_errors_stay_with_their_call(self):
+        session = FakeSession()
+        math = _tools(session, ToolCallCoalescer())
+
+        results = await asyncio.gather(
+            *(_ask(math, q) for q in ["1 / 0", "3 + 4"]),
+        )
+
+        self.assertIn("division by zero", str(results[0]))
+        self.assertEqual(results[1], "7")
+
+    async def test_single_call_is_not_batched(self):
+        session = FakeSession()
+        math = _tools(session, ToolCallCoalescer())
+
+        self.assertEqual(await _ask(math, "5 * 5"), "25")
+        self.assertEqual(session.calls, [("math", {"question": "5 * 5"})])
+
+    async def test_idle_call_does_not_wait_for_window(self):
+        session = FakeSession()
+        math = _tools(session, ToolCallCoalescer(window=1.0))
+
+        start = time.perf_counter()
+        self.assertEqual(await _ask(math, "5 * 5"), "25")
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    async def test_calls_from_different_sessions_are_not_merged(self):
+        coalescer = ToolCallCoalescer()
+        _tools(FakeSession(), coalescer)
+        seen = []
+
+        async def handler(request):
+            seen.append(request)
+            await asyncio.sleep(0)
+            questions = request.args.get("questions") or [request.args["question"]]
+            items = [{"result": q} for q in questions]
+            if request.name == "math":
+                return CallToolResult(content=_text(questions[0]), isError=False)
+            return CallToolResult(content=_text(items), structuredContent={"result": items})
+
+        def request(question, thread_id):
+            runtime = SimpleNamespace(config={"configurable": {"thread_id": thread_id}})
+            return MCPToolCallRequest(
+                name="math", args={"question": question}, server_name="s", runtime=runtime
+            )
+
+        await asyncio.gather(
+            *(
+                coalescer(request(q, thread), handler)
+                for q, thread in [("1", "a"), ("2", "b"), ("3", "a")]
+            )
+        )
+
+        batches = sorted((r.name, r.runtime.config["configurable"]["thread_id"]) for r in seen)
+        self.assertEqual(batches, [("math", "b"), ("math_batch", "a")])
+
+    async def test_falls_back_to_single_calls_when_batch_fails(self):
+        session = FakeSession(batch_fails=True)
+        math = _tools(session, ToolCallCoalescer())
+
+        results = await asyncio.gather(*(_ask(math, q) for q in ["1", "2"]))
+
+        self.assertEqual(results, ["1", "2"])
+        self.assertEqual([name for name, _ in session.calls], ["math_batch", "math", "math"])
+
+    async def test_unregistered_tools_and_custom_headers_pass_through(self):
+        coalescer = ToolCallCoalescer()
+        _tools(FakeSession(), coalescer)
+        seen = []
+
+        async def handler(request):
+            seen.append(request)
+            return "direct"
+
+        requests = [
+            MCPToolCallRequest(name="other", args={"question": "1"}, server_name="s"),
+            MCPToolCallRequest(name="math", args={"question": "1"}, server_name="s", headers={}),
+        ]
+        results = await asyncio.gather(*(coalescer(request, handler) for request in requests))
+
+        self.assertEqual(results, ["direct", "direct"])
+        self.assertEqual(seen, requests)
+
+    async def test_large_groups_are_split(self):
+        session = FakeSession()
+        coalescer = ToolCallCoalescer(max_batch_size=2)
+        math = _tools(session, coalescer)
+
+        results = await asyncio.gather(*(_ask(math, str(i)) for i in range(5)))
+
+        self.assertEqual(results, ["0", "1", "2", "3", "4"])
+        self.assertEqual([len(args.get("questions", [1])) for _, args in session.calls], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+
+import anyio
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+
+from utils.mcp_session import PersistentSessionInterceptor
+
+
+class FakeSession:
+    def __init__(self, number):
+        self.number = number
+        self.calls = []
+
+    async def call_tool(self, name, args):
+        self.calls.append((name, args))
+        if args.get("wait"):
+            await args["wait"].wait()
+        if args.get("fail"):
+            raise anyio.ClosedResourceError()
+        if args.get("error"):
+            raise RuntimeError("tool failed")
+        return f"session-{self.number}:{name}"
+
+
+class FakeClient:
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+
+    @asynccontextmanager
+    async def session(self, server_name):
+        self.opened += 1
+        try:
+            yield FakeSession(self.opened)
+        finally:
+            self.closed += 1
+
+
+async def _default_handler(request):
+    return "fresh-session"
+
+
+def _request(server_name, **args):
+    return MCPToolCallRequest(name="execute_python", args=args, server_name=server_name)
+
+
+class PersistentSessionInterceptorTests(unittest.IsolatedAsyncioTestCase):
+    def _interceptor(self):
+        interceptor = PersistentSessionInterceptor({}, ["code-execution:stdio"])
+        interceptor._client = FakeClient()
+        return interceptor
+
+    async def test_calls_reuse_one_session(self):
+        interceptor = self._interceptor()
+
+        results = await asyncio.gather(
+            *(interceptor(_request("code-execution:stdio"), _default_handler) for _ in range(5))
+        )
+        await interceptor.aclose()
+
+        self.assertEqual(set(results), {"session-1:execute_python"})
+        self.assertEqual(interceptor._client.opened, 1)
+        self.assertEqual(interceptor._client.closed, 1)
+
+    async def test_other_servers_use_default_handler(self):
+        interceptor = self._interceptor()
+
+        result = await interceptor(_request("amap-maps:http"), _default_handler)
+
+        self.assertEqual(result, "fresh-session")
+        self.assertEqual(interceptor._client.opened, 0)
+
+    async def test_failed_session_is_rebuilt_on_next_call(self):
+        interceptor = self._interceptor()
+
+        with self.assertRaises(anyio.ClosedResourceError):
+            await interceptor(_request("code-execution:stdio", fail=True), _default_handler)
+        result = await interceptor(_request("code-execution:stdio"), _default_handler)
+        await interceptor.aclose()
+
+        self.assertEqual(result, "session-2:execute_python")
+        self.assertEqual(interceptor._client.closed, 2)
+
+    async def test_tool_error_keeps_session(self):
+        interceptor = self._interceptor()
+
+        with self.assertRaises(RuntimeError):
+            await interceptor(_request("code-execution:stdio", error=True), _default_handler)
+        result = await interceptor(_request("code-execution:stdio"), _default_handler)
+        await interceptor.aclose()
+
+        self.assertEqual(result, "session-1:execute_python")
+        self.assertEqual(interceptor._client.opened, 1)
+
+    async def test_broken_session_is_closed_after_other_calls_finish(self):
+        interceptor = self._interceptor()
+        release = asyncio.Event()
+        pending = asyncio.create_task(
+            interceptor(_request("code-execution:stdio", wait=release), _default_handler)
+        )
+        await asyncio.sleep(0)
+
+        with self.assertRaises(anyio.ClosedResourceError):
+            await interceptor(_request("code-execution:stdio", fail=True), _default_handler)
+        self.assertEqual(interceptor._client.closed, 0)
+
+        release.set()
+        self.assertEqual(await pending, "session-1:execute_python")
+        self.assertEqual(interceptor._client.closed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
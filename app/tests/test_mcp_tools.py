@@ -0,0 +1,170 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from mcp.types import ListToolsResult, Tool
+
+from utils.mcp_tools import MCPToolCache, MCPToolLoader
+
+CONNECTION = {"transport": "streamable_http", "url": "http://localhost:8001/mcp"}
+WEATHER = {"transport": "streamable_http", "url": "http://localhost:8000/mcp"}
+
+
+def _tool(name, description=""):
+    return Tool(name=name, description=description, inputSchema={"type": "object"})
+
+
+class FakeClient:
+    """按服务名返回预设的工具列表，并记录连接次数"""
+
+    def __init__(self, tools, delays=None):
+        self.tools = tools
+        self.delays = delays or {}
+        self.sessions = 0
+
+    @asynccontextmanager
+    async def session(self, server_name):
+        self.sessions += 1
+        await asyncio.sleep(self.delays.get(server_name, 0))
+        tools = self.tools[server_name]
+        if isinstance(tools, Exception):
+            raise tools
+
+        async def list_tools(cursor=None):
+            # 每页一个工具，验证翻页
+            index = int(cursor or 0)
+            next_cursor = str(index + 1) if index + 1 < len(tools) else None
+            return ListToolsResult(tools=tools[index : index + 1], nextCursor=next_cursor)
+
+        yield SimpleNamespace(list_tools=list_tools)
+
+
+def _loader(cache, tools, delays=None, **kwargs):
+    connections = {"math": CONNECTION, "weather": WEATHER}
+    loader = MCPToolLoader({name: connections[name] for name in tools}, cache, **kwargs)
+    loader._client = FakeClient(tools, delays)
+    return loader
+
+
+class MCPToolCacheTests(unittest.TestCase):
+    def test_round_trip_through_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "tools.json")
+            MCPToolCache(path).put("math", CONNECTION, [_tool("math", "calc")])
+
+            tools = MCPToolCache(path).get("math", CONNECTION)
+
+        self.assertEqual([(t.name, t.description) for t in tools], [("math", "calc")])
+
+    def test_changed_connection_misses(self):
+        cache = MCPToolCache()
+        cache.put("math", CONNECTION, [_tool("math")])
+
+        self.assertIsNone(cache.get("math", {**CONNECTION, "url": "http://other/mcp"}))
+
+    def test_corrupt_file_is_ignored(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            f.write("{not json")
+        try:
+            self.assertIsNone(MCPToolCache(f.name).get("math", CONNECTION))
+        finally:
+            os.remove(f.name)
+
+
+class MCPToolLoaderTests(unittest.IsolatedAsyncioTestCase):
+    async def test_load_fetches_once_then_uses_cache(self):
+        cache = MCPToolCache()
+        first = _loader(cache, {"math": [_tool("math"), _tool("math_batch")]})
+        tools = await first.load()
+
+        second = _loader(cache, {"math": RuntimeError("offline")})
+        cached = await second.load()
+
+        self.assertEqual([t.name for t in tools], ["math", "math_batch"])
+        self.assertEqual([t.name for t in cached], ["math", "math_batch"])
+        self.assertEqual(second._client.sessions, 0)
+        self.assertEqual(second.cached_servers, ["math"])
+
+    async def test_refresh_reports_changes_only(self):
+        cache = MCPToolCache()
+        cache.put("math", CONNECTION, [_tool("math")])
+        loader = _loader(cache, {"math": [_tool("math")]})
+        await loader.load()
+
+        self.assertIsNone(await loader.refresh())
+        self.assertEqual(loader.cached_servers, [])
+
+        loader._client.tools["math"] = [_tool("math"), _tool("math_batch")]
+        tools = await loader.refresh()
+
+        self.assertEqual([t.name for t in tools], ["math", "math_batch"])
+        self.assertEqual(len(cache.get("math", CONNECTION)), 2)
+
+    async def test_refresh_keeps_definitions_when_server_fails(self):
+        cache = MCPToolCache()
+        cache.put("math", CONNECTION, [_tool("math")])
+        loader = _loader(cache, {"math": RuntimeError("offline")})
+        await loader.load()
+
+        self.assertIsNone(await loader.refresh())
+        self.assertEqual(loader.cached_servers, ["math"])
+        self.assertEqual([t.name for t in loader.build()], ["math"])
+
+    async def test_failed_server_does_not_block_others(self):
+        loader = _loader(
+            MCPToolCache(), {"math": [_tool("math")], "weather": RuntimeError("offline")}
+        )
+
+        tools = await loader.load()
+
+        self.assertEqual([t.name for t in tools], ["math"])
+        self.assertEqual(list(loader.failed_servers), ["weather"])
+
+    async def test_slow_server_is_attached_later(self):
+        loader = _loader(
+            MCPToolCache(),
+            {"math": [_tool("math")], "weather": [_tool("get_weather")]},
+            delays={"weather": 0.5},
+            timeout=0.05,
+        )
+
+        start = asyncio.get_running_loop().time()
+        tools = await loader.load()
+        elapsed = asyncio.get_running_loop().time() - start
+
+        self.assertEqual([t.name for t in tools], ["math"])
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(loader.late_servers, ["weather"])
+
+        tools = await loader.attach_late()
+
+        self.assertEqual([t.name for t in tools], ["math", "get_weather"])
+        self.assertEqual(loader.late_servers, [])
+
+    async def test_server_timeouts_override_default(self):
+        loader = _loader(
+            MCPToolCache(),
+            {"math": [_tool("math")], "weather": [_tool("get_weather")]},
+            delays={"weather": 0.1},
+            timeout=0.01,
+            server_timeouts={"weather": 1.0},
+        )
+
+        tools = await loader.load()
+
+        self.assertEqual([t.name for t in tools], ["math", "get_weather"])
+
+    async def test_fetch_timeout_marks_server_failed(self):
+        loader = _loader(
+            MCPToolCache(), {"math": [_tool("math")]}, delays={"math": 1.0}, fetch_timeout=0.05
+        )
+
+        self.assertEqual(await loader.load(), [])
+        self.assertIsInstance(loader.failed_servers["math"], TimeoutError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from utils.model_limiter import ModelBusyError, ModelCallLimiter
+
+
+class ModelCallLimiterTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_is_bounded_by_limit(self):
+        limiter = ModelCallLimiter(limit=2)
+        active = 0
+        peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with limiter.slot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(10)))
+
+        stats = limiter.stats()
+        self.assertEqual(peak, 2)
+        self.assertEqual(stats.acquired, 10)
+        self.assertEqual(stats.in_flight, 0)
+        self.assertGreater(stats.peak_waiting, 0)
+        self.assertGreater(stats.max_wait, 0)
+
+    async def test_waiters_are_served_in_arrival_order(self):
+        limiter = ModelCallLimiter(limit=1)
+        order = []
+
+        async def call(name):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(call(i) for i in range(5)))
+
+        self.assertEqual(order, list(range(5)))
+
+    async def test_full_queue_is_rejected_immediately(self):
+        limiter = ModelCallLimiter(limit=1, max_waiting=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                await release.wait()
+
+        holding = asyncio.create_task(holder())
+        waiting = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(ModelBusyError):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(holding, waiting)
+        self.assertEqual(limiter.stats().rejected, 1)
+
+    async def test_acquire_timeout_raises_model_busy(self):
+        limiter = ModelCallLimiter(limit=1, acquire_timeout=0.01)
+
+        async with limiter.slot():
+            with self.assertRaises(ModelBusyError):
+                async with limiter.slot():
+                    pass
+
+        self.assertEqual(limiter.stats().waiting, 0)
+        self.assertEqual(limiter.stats().in_flight, 0)
+
+    async def test_slot_is_released_when_call_raises(self):
+        limiter = ModelCallLimiter(limit=1)
+
+        with self.assertRaises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("boom")
+
+        self.assertEqual(limiter.stats().in_flight, 0)
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        limiter = ModelCallLimiter(limit=1)
+
+        async with limiter.slot():
+            waiter = asyncio.create_task(limiter.slot().__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+        self.assertEqual(limiter.stats().in_flight, 0)
+        self.assertEqual(limiter.stats().waiting, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
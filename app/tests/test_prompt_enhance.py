@@ -0,0 +1,49 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from prompts import prompt_enhance
+
+REAL_DATETIME = datetime.datetime
+
+
+class SystemPromptTests(unittest.TestCase):
+    def setUp(self):
+        prompt_enhance._static_fields.cache_clear()
+        prompt_enhance._render.cache_clear()
+
+    def _prompt_at(self, *moments, granularity=60):
+        with patch("prompts.prompt_enhance.datetime.datetime") as fake_datetime:
+            fake_datetime.now.side_effect = [REAL_DATETIME(*m) for m in moments]
+            return [prompt_enhance.get_system_prompt(granularity) for _ in moments]
+
+    def test_prompt_is_identical_within_granularity(self):
+        first, second = self._prompt_at((2026, 1, 1, 8, 30, 5), (2026, 1, 1, 8, 30, 59))
+
+        self.assertIs(first, second)
+        self.assertIn("当前时间：2026-01-01 08:30:00", first)
+
+    def test_prompt_changes_across_granularity_boundary(self):
+        first, second = self._prompt_at(
+            (2026, 1, 1, 8, 59, 59), (2026, 1, 1, 9, 0, 0), granularity=3600
+        )
+
+        self.assertIn("当前时间：2026-01-01 08:00:00", first)
+        self.assertIn("当前时间：2026-01-01 09:00:00", second)
+
+    def test_device_info_is_computed_once(self):
+        with patch("utils.device_info.get_info", return_value="Linux") as get_info:
+            self._prompt_at((2026, 1, 1, 0, 0, 0), (2026, 1, 1, 0, 5, 0))
+
+        self.assertEqual(get_info.call_count, 3)
+
+    def test_time_is_last_line_so_prefix_is_stable(self):
+        first, second = self._prompt_at((2026, 1, 1, 0, 0, 0), (2026, 1, 2, 0, 0, 0))
+
+        prefix = first.rsplit("\n", 1)[0]
+        self.assertTrue(second.startswith(prefix))
+        self.assertNotEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import re
+import unittest
+
+from utils.remove_html import (
+    CleanedTextCache,
+    get_cleaned_text,
+    iter_cleaned_segments,
+    iter_cleaned_texts,
+)
+from utils.think_view import format_think_result
+from utils.tool_view import format_tool_call, format_tool_result
+
+
+def _assistant_message(index):
+    return (
+        format_think_result(f"thinking {index}")
+        + f"step {index}\n"
+        + format_tool_call("calculator", {"expression": f"{index}+1"})
+        + format_tool_result("calculator", str(index + 1))
+        + "done"
+    )
+
+
+class GetCleanedTextTests(unittest.TestCase):
+    def test_blocks_are_replaced_in_document_order(self):
+        cleaned = get_cleaned_text(_assistant_message(7))
+
+        self.assertNotIn("thinking 7", cleaned)
+        self.assertEqual(
+            cleaned,
+            "step 7\n\n"
+            '```tool_call name="calculator"\n{\n  "expression": "7+1"\n}\n```\n\n'
+            '```tool_return name="calculator"\n8\n```\n\n'
+            "done",
+        )
+
+    def test_fence_is_longer_than_backticks_in_output(self):
+        cleaned = get_cleaned_text(format_tool_result("execute_python", "````\nx\n````"))
+
+        self.assertTrue(cleaned.startswith('`````tool_return name="execute_python"'))
+        self.assertTrue(cleaned.endswith("`````"))
+
+    def test_unknown_and_unclosed_details_are_kept(self):
+        text = '<details class="other">keep</details> <details class="tool-result-details">'
+
+        self.assertEqual(get_cleaned_text(text), text)
+
+    def test_nested_details_match_per_class_replacement(self):
+        # 逐类替换先删思维链块，外层工具块随后匹配到自己的闭合标签
+        text = (
+            '<details class="tool-result-details"><code>t</code>'
+            '<details class="think-result-details">x</details>'
+            "<pre>out</pre></details>after"
+        )
+
+        self.assertEqual(get_cleaned_text(text), '```tool_return name="t"\nout\n```\n\nafter')
+
+    def test_unclosed_block_before_complete_block(self):
+        text = (
+            '<details class="tool-call-details"><code>a</code>'
+            '<details class="tool-result-details"><pre>1</pre></details>'
+        )
+
+        self.assertEqual(
+            get_cleaned_text(text),
+            '<details class="tool-call-details"><code>a</code>\n\n```tool_return\n1\n```',
+        )
+
+    def test_escaped_details_in_tool_output_are_cleaned_again(self):
+        text = format_tool_result(
+            "read", '<details class="tool-call-details"><pre>inner</pre></details>'
+        )
+
+        self.assertEqual(
+            get_cleaned_text(text),
+            '```tool_return name="read"\n\n```tool_call\ninner\n```\n\n```',
+        )
+
+    def test_segments_join_to_cleaned_text(self):
+        text = "intro\n" + _assistant_message(3)
+
+        joined = re.sub(r"\n{3,}", "\n\n", "".join(iter_cleaned_segments(text)))
+
+        self.assertEqual(joined.strip(), get_cleaned_text(text))
+
+    def test_iter_cleaned_texts_is_lazy(self):
+        texts = iter([_assistant_message(1), _assistant_message(2)])
+
+        cleaned = iter_cleaned_texts(texts)
+
+        self.assertEqual(next(cleaned), get_cleaned_text(_assistant_message(1)))
+        self.assertEqual(next(texts), _assistant_message(2))
+
+
+class CleanedTextCacheTests(unittest.TestCase):
+    def test_cached_result_matches_uncached(self):
+        cache = CleanedTextCache()
+        text = _assistant_message(1)
+
+        self.assertEqual(cache.get(text), get_cleaned_text(text))
+        self.assertEqual(cache.get(text), get_cleaned_text(text))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lookup_is_by_content_not_identity(self):
+        cache = CleanedTextCache()
+        text = _assistant_message(2)
+
+        cache.get(text)
+        cache.get("".join(list(text)))
+
+        self.assertEqual(cache.hits, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = CleanedTextCache(maxsize=2)
+        first, second, third = (_assistant_message(i) for i in range(3))
+
+        cache.get(first)
+        cache.get(second)
+        cache.get(first)
+        cache.get(third)
+        cache.get(first)
+        cache.get(second)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_total_size_is_bounded(self):
+        texts = [f"{i}" + "x" * 99 for i in range(5)]
+        cache = CleanedTextCache(max_chars=250)
+
+        for text in texts:
+            cache.get(text)
+
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.chars, 250)
+        cache.get(texts[-1])
+        self.assertEqual(cache.hits, 1)
+
+    def test_oversized_text_is_not_cached(self):
+        cache = CleanedTextCache(max_item_chars=100)
+        text = "x" * 101
+
+        self.assertEqual(cache.get(text), get_cleaned_text(text))
+        self.assertEqual(cache.get(text), get_cleaned_text(text))
+        self.assertEqual((len(cache), cache.chars, cache.misses), (0, 0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
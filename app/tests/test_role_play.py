@@ -1,8 +1,10 @@
+import asyncio
+import time
 from types import SimpleNamespace
 import unittest
 from unittest.mock import Mock, patch
 
-from tools import tool_role
+from tools import tool_clients, tool_role
 from tools.tool_role import BestResponse, Response, _select_best_response_record
 
 
@@ -22,11 +24,24 @@ class _FakeStructuredOutput:
 
         raise AssertionError(f"unexpected schema: {self.schema}")
 
+    async def ainvoke(self, prompt):
+        if self.schema is Response:
+            self.llm.active += 1
+            self.llm.peak_active = max(self.llm.peak_active, self.llm.active)
+            try:
+                await asyncio.sleep(self.llm.delay)
+            finally:
+                self.llm.active -= 1
+        return self.invoke(prompt)
+
 
 class _FakeLLM:
-    def __init__(self):
+    def __init__(self, delay=0.0):
         self.best_response_prompt = ""
         self.structured_output_methods = []
+        self.delay = delay
+        self.active = 0
+        self.peak_active = 0
 
     def with_structured_output(self, schema, **kwargs):
         self.structured_output_methods.append(kwargs.get("method"))
@@ -34,6 +49,11 @@ class _FakeLLM:
 
 
 class RolePlayTests(unittest.TestCase):
+    def setUp(self):
+        registry_patch = patch.object(tool_role, "client_registry", tool_clients.ClientRegistry())
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+
     def test_select_best_response_rejects_negative_id(self):
         responses = [{"role": "A", "content": "alpha"}]
 
@@ -73,16 +93,20 @@ class RolePlayTests(unittest.TestCase):
         )
 
         with (
-            patch.object(tool_role, "init_chat_model", return_value=Mock()) as init_chat_model,
+            patch.object(tool_clients, "init_chat_model", return_value=Mock()) as init_chat_model,
             patch.object(tool_role, "create_doge_graph", return_value=graph),
         ):
             result = tool_role.role_play.func(runtime=runtime, situation="测试", roles=["A"])
 
-        init_chat_model.assert_called_once_with(
-            model="deepseek-v3-2-251201",
-            model_provider="openai",
-            base_url="https://example.test/v1",
-            api_key="test-key",
+        init_chat_model.assert_called_once()
+        self.assertEqual(
+            {k: v for k, v in init_chat_model.call_args.kwargs.items() if "http" not in k},
+            {
+                "model": "deepseek-v3-2-251201",
+                "model_provider": "openai",
+                "base_url": "https://example.test/v1",
+                "api_key": "test-key",
+            },
         )
         self.assertIn("deepseek-v3-2-251201", result)
 
@@ -114,7 +138,7 @@ class RolePlayTests(unittest.TestCase):
         )
 
         with (
-            patch.object(tool_role, "init_chat_model", return_value=Mock()),
+            patch.object(tool_clients, "init_chat_model", return_value=Mock()),
             patch.object(tool_role, "create_doge_graph", return_value=graph),
             self.assertRaisesRegex(ValueError, "roles 最多支持 10 个"),
         ):
@@ -139,7 +163,60 @@ class RolePlayTests(unittest.TestCase):
 
         graph.invoke({"roles": ["A", "B"], "situation": "测试"})
 
-        self.assertEqual(llm.structured_output_methods, ["json_mode", "json_mode", "json_mode"])
+        self.assertEqual(llm.structured_output_methods, ["json_mode", "json_mode"])
+
+    def test_role_play_reuses_graph_for_same_connection(self):
+        runtime = SimpleNamespace(
+            context=SimpleNamespace(
+                base_url="https://example.test/v1",
+                api_key="test-key",
+                model="deepseek-v3-2-251201",
+            )
+        )
+
+        with patch.object(
+            tool_clients, "init_chat_model", return_value=_FakeLLM()
+        ) as init_chat_model:
+            tool_role.role_play.func(runtime=runtime, situation="测试", roles=["A", "B"])
+            tool_role.role_play.func(runtime=runtime, situation="另一个情境", roles=["B", "A"])
+
+        init_chat_model.assert_called_once()
+
+    def test_async_role_play_runs_roles_concurrently(self):
+        llm = _FakeLLM(delay=0.05)
+        runtime = SimpleNamespace(
+            context=SimpleNamespace(
+                base_url="https://example.test/v1",
+                api_key="test-key",
+                model="deepseek-v3-2-251201",
+            )
+        )
+        roles = [f"R{i}" for i in range(tool_role.MAX_ROLES)]
+
+        with patch.object(tool_clients, "init_chat_model", return_value=llm):
+            start = time.perf_counter()
+            result = asyncio.run(
+                tool_role.role_play.coroutine(runtime=runtime, situation="测试", roles=roles)
+            )
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(llm.peak_active, len(roles))
+        # 全部角色在一批中完成：角色回复一轮加最佳回复一轮
+        self.assertLess(elapsed, llm.delay * 3)
+        self.assertIn("【R1】\nR1-reply", result)
+
+    def test_async_role_play_respects_concurrency_cap(self):
+        llm = _FakeLLM(delay=0.01)
+        graph = tool_role.create_doge_graph(llm)
+
+        asyncio.run(
+            graph.ainvoke(
+                {"roles": [f"R{i}" for i in range(8)], "situation": "测试"},
+                config={"max_concurrency": 3},
+            )
+        )
+
+        self.assertEqual(llm.peak_active, 3)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from utils.search_cache import SearchCache, normalize_query
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Fetcher:
+    def __init__(self, *values, delay=0.0):
+        self.values = list(values)
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.values.pop(0)
+
+    async def afetch(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.values.pop(0)
+
+
+class NormalizeQueryTests(unittest.TestCase):
+    def test_ignores_case_width_whitespace_and_trailing_punctuation(self):
+        self.assertEqual(normalize_query("  Ｐython   3.13 新特性？ "), "python 3.13 新特性")
+        self.assertEqual(normalize_query("LangGraph!"), normalize_query("langgraph"))
+
+    def test_keeps_inner_punctuation(self):
+        self.assertEqual(normalize_query("c++ vs c#"), "c++ vs c#")
+
+
+class SearchCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.cache = SearchCache(maxsize=2, ttl=10, stale_ttl=20, clock=self.clock)
+
+    def test_sync_hit_within_ttl(self):
+        fetch = _Fetcher("a", "b")
+
+        self.assertEqual(self.cache.get("ns", "Query", fetch), "a")
+        self.assertEqual(self.cache.get("ns", "query?", fetch), "a")
+
+        self.assertEqual(fetch.calls, 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+    def test_namespace_separates_entries(self):
+        fetch = _Fetcher("a", "b")
+
+        self.assertEqual(self.cache.get("qwen-max", "q", fetch), "a")
+        self.assertEqual(self.cache.get("qwen-plus", "q", fetch), "b")
+
+    def test_sync_refetches_after_ttl(self):
+        fetch = _Fetcher("a", "b")
+        self.cache.get("ns", "q", fetch)
+
+        self.clock.now += 11
+
+        self.assertEqual(self.cache.get("ns", "q", fetch), "b")
+
+    def test_errors_are_not_cached(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get("ns", "q", fail)
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats().errors, 1)
+
+    def test_lru_eviction(self):
+        fetch = _Fetcher("a", "b", "c", "a2")
+        self.cache.get("ns", "a", fetch)
+        self.cache.get("ns", "b", fetch)
+        self.cache.get("ns", "c", fetch)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get("ns", "a", fetch), "a2")
+
+    def test_async_stale_while_revalidate(self):
+        fetch = _Fetcher("old", "new")
+
+        async def run():
+            await self.cache.aget("ns", "q", fetch.afetch)
+            self.clock.now += 15  # 已过期，但仍在宽限期内
+            stale = await self.cache.aget("ns", "q", fetch.afetch)
+            await asyncio.sleep(0)  # 让后台刷新完成
+            await asyncio.sleep(0)
+            fresh = await self.cache.aget("ns", "q", fetch.afetch)
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+
+        self.assertEqual((stale, fresh), ("old", "new"))
+        stats = self.cache.stats()
+        self.assertEqual((stats.stale_hits, stats.refreshes, stats.hits), (1, 1, 1))
+
+    def test_async_entry_expires_after_grace_period(self):
+        fetch = _Fetcher("old", "new")
+
+        async def run():
+            await self.cache.aget("ns", "q", fetch.afetch)
+            self.clock.now += 31
+            return await self.cache.aget("ns", "q", fetch.afetch)
+
+        self.assertEqual(asyncio.run(run()), "new")
+        self.assertEqual(self.cache.stats().stale_hits, 0)
+
+    def test_async_concurrent_misses_fetch_once(self):
+        fetch = _Fetcher("a", delay=0.02)
+
+        async def run():
+            return await asyncio.gather(
+                *(self.cache.aget("ns", "q", fetch.afetch) for _ in range(5))
+            )
+
+        self.assertEqual(asyncio.run(run()), ["a"] * 5)
+        self.assertEqual(fetch.calls, 1)
+
+    def test_async_joiners_are_not_counted_as_hits(self):
+        fetch = _Fetcher("a", delay=0.02)
+
+        async def run():
+            await asyncio.gather(*(self.cache.aget("ns", "q", fetch.afetch) for _ in range(3)))
+
+        asyncio.run(run())
+
+        stats = self.cache.stats()
+        self.assertEqual((stats.misses, stats.coalesced, stats.hits), (1, 2, 0))
+
+    def test_async_cancelled_first_caller_does_not_cancel_joiners(self):
+        fetch = _Fetcher("a", delay=0.05)
+
+        async def run():
+            first = asyncio.create_task(self.cache.aget("ns", "q", fetch.afetch))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(self.cache.aget("ns", "q", fetch.afetch))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            return await second
+
+        self.assertEqual(asyncio.run(run()), "a")
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(self.cache.stats().errors, 0)
+
+    def test_async_fetch_is_cancelled_when_all_callers_cancel(self):
+        async def fetch():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                seen.append("cancelled")
+                raise
+            return "a"
+
+        seen = []
+
+        async def run():
+            callers = [asyncio.create_task(self.cache.aget("ns", "q", fetch)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+
+        self.assertEqual(seen, ["cancelled"])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_async_fetch_is_written_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.db")
+            first = SearchCache(ttl=10, path=path, clock=self.clock)
+            asyncio.run(first.aget("ns", "q", _Fetcher("a").afetch))
+            first.close()
+
+            second = SearchCache(ttl=10, path=path, clock=self.clock)
+            value = second.get("ns", "q", _Fetcher("b"))
+            second.close()
+
+        self.assertEqual(value, "a")
+
+    def test_disk_store_survives_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.db")
+            first = SearchCache(ttl=10, path=path, clock=self.clock)
+            first.get("ns", "q", _Fetcher("a"))
+            first.close()
+
+            second = SearchCache(ttl=10, path=path, clock=self.clock)
+            fetch = _Fetcher("b")
+            value = second.get("ns", "q", fetch)
+            stats = second.stats()
+            second.close()
+
+        self.assertEqual(value, "a")
+        self.assertEqual(fetch.calls, 0)
+        self.assertEqual((stats.hits, stats.disk_hits), (1, 1))
+
+    def test_async_disk_read_runs_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.db")
+            first = SearchCache(ttl=10, path=path, clock=self.clock)
+            first.get("ns", "q", _Fetcher("a"))
+            first.close()
+
+            second = SearchCache(ttl=10, path=path, clock=self.clock)
+            load = second._load
+            readers = []
+
+            def record(key):
+                readers.append(threading.current_thread())
+                return load(key)
+
+            second._load = record
+
+            async def run():
+                loop_thread = threading.current_thread()
+                value = await second.aget("ns", "q", _Fetcher("b").afetch)
+                # 第二次命中进程内缓存，不再读磁盘
+                await second.aget("ns", "q", _Fetcher("c").afetch)
+                return value, loop_thread
+
+            value, loop_thread = asyncio.run(run())
+            stats = second.stats()
+            second.close()
+
+        self.assertEqual(value, "a")
+        self.assertEqual(len(readers), 1)
+        self.assertIsNot(readers[0], loop_thread)
+        self.assertEqual((stats.hits, stats.disk_hits), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
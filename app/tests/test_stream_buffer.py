@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from utils.stream_buffer import StreamBuffer, with_flush_ticks
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StreamBufferTests(unittest.TestCase):
+    def test_flush_appends_pending_text_as_one_delta(self):
+        message = {"role": "assistant", "content": "a"}
+        buffer = StreamBuffer(message)
+
+        buffer.append("b")
+        buffer.append("c")
+
+        self.assertEqual(message["content"], "a")
+        self.assertEqual(buffer.flush(), "bc")
+        self.assertEqual(message["content"], "abc")
+        self.assertEqual(buffer.flush(), "")
+
+    def test_due_after_time_window(self):
+        clock = FakeClock()
+        buffer = StreamBuffer({"content": ""}, interval=0.03, max_bytes=1000, clock=clock)
+
+        self.assertFalse(buffer.due())
+        buffer.append("x")
+        clock.now = 0.02
+        self.assertFalse(buffer.due())
+        clock.now = 0.03
+        self.assertTrue(buffer.due())
+
+    def test_due_after_byte_limit(self):
+        buffer = StreamBuffer({"content": ""}, interval=60, max_bytes=6, clock=FakeClock())
+
+        buffer.append("你")
+        self.assertFalse(buffer.due())
+        buffer.append("好")
+        self.assertTrue(buffer.due())
+
+    def test_remaining_counts_down_from_first_pending_text(self):
+        clock = FakeClock()
+        buffer = StreamBuffer({"content": ""}, interval=0.03, clock=clock)
+
+        self.assertIsNone(buffer.remaining())
+        buffer.append("x")
+        clock.now = 0.01
+        self.assertAlmostEqual(buffer.remaining(), 0.02)
+        clock.now = 0.05
+        self.assertEqual(buffer.remaining(), 0.0)
+        buffer.flush()
+        self.assertIsNone(buffer.remaining())
+
+    def test_empty_text_does_not_start_window(self):
+        buffer = StreamBuffer({"content": ""})
+
+        buffer.append("")
+
+        self.assertFalse(buffer.pending)
+
+
+class FlushTicksTests(unittest.IsolatedAsyncioTestCase):
+    async def test_tick_is_yielded_while_next_event_is_late(self):
+        async def events():
+            yield "a"
+            await asyncio.sleep(0.2)
+            yield "b"
+
+        pending = {"value": True}
+        received = []
+        async for event in with_flush_ticks(events(), lambda: 0.01 if pending["value"] else None):
+            received.append(event)
+            if event is None:
+                pending["value"] = False
+
+        self.assertEqual(received, ["a", None, "b"])
+
+    async def test_no_tick_without_deadline(self):
+        async def events():
+            yield "a"
+            await asyncio.sleep(0.05)
+            yield "b"
+
+        received = [event async for event in with_flush_ticks(events(), lambda: None)]
+
+        self.assertEqual(received, ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
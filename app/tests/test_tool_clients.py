@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from tools import tool_clients
+from tools.tool_clients import ClientRegistry
+from tools.tool_runtime import ToolSchema
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClientRegistryTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+        self.addCleanup(self.registry.close)
+        self.context = ToolSchema(base_url=self.url, api_key="key-a", model="model-a")
+
+    def test_sync_client_is_shared_and_reuses_connection(self):
+        client = self.registry.http_client(self.context)
+        self.assertIs(client, self.registry.http_client(self.context.model_copy()))
+
+        for _ in range(3):
+            client.get(self.url)
+
+        stats = self.registry.stats(self.context)
+        self.assertEqual(stats.requests, 3)
+        self.assertEqual(stats.connections, 1)
+        self.assertEqual(stats.reused, 2)
+        self.assertGreater(stats.handshake_time, 0)
+        self.assertAlmostEqual(stats.handshake_saved, 2 * stats.avg_handshake)
+
+    def test_async_client_reuses_connection_within_loop(self):
+        async def run():
+            client = self.registry.async_http_client(self.context)
+            for _ in range(3):
+                await client.get(self.url)
+            await self.registry.aclose()
+
+        asyncio.run(run())
+
+        stats = self.registry.stats(self.context)
+        self.assertEqual((stats.requests, stats.connections), (3, 1))
+
+    def test_clients_are_separated_by_api_key(self):
+        other = self.context.model_copy(update={"api_key": "key-b"})
+
+        self.assertIsNot(self.registry.http_client(self.context), self.registry.http_client(other))
+
+    def test_chat_model_is_cached_per_context(self):
+        with patch.object(tool_clients, "init_chat_model", side_effect=lambda **kw: object()):
+            model = self.registry.chat_model(self.context)
+            same = self.registry.chat_model(self.context.model_copy())
+            other = self.registry.chat_model(self.context.model_copy(update={"model": "model-b"}))
+            derived = self.registry.derived(self.context, "graph", lambda llm: (llm,))
+
+        self.assertIs(model, same)
+        self.assertIsNot(model, other)
+        self.assertIs(derived[0], model)
+        self.assertIs(derived, self.registry.derived(self.context, "graph", lambda llm: None))
+
+    def test_least_recently_used_keys_are_evicted(self):
+        registry = ClientRegistry(max_entries=2)
+        self.addCleanup(registry.close)
+        contexts = [self.context.model_copy(update={"api_key": f"key-{i}"}) for i in range(3)]
+
+        first = registry.http_client(contexts[0])
+        registry.http_client(contexts[1])
+        registry.http_client(contexts[0])
+        registry.http_client(contexts[2])
+
+        self.assertIs(registry.http_client(contexts[0]), first)
+        self.assertEqual(len(registry._sync_clients), 2)
+        self.assertNotIn((self.url, "key-1"), registry._sync_clients)
+
+    def test_async_limit_caps_concurrency_per_key(self):
+        registry = ClientRegistry(max_concurrency=2)
+        active = peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with registry.alimit(self.context):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        async def run():
+            await asyncio.gather(*(call() for _ in range(5)))
+
+        asyncio.run(run())
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(registry.stats(self.context).limited, 3)
+
+    def test_sync_limit_caps_concurrency_per_key(self):
+        registry = ClientRegistry(max_concurrency=1)
+        order = []
+
+        def call(name):
+            with registry.limit(self.context):
+                order.append(f"{name}-start")
+                time.sleep(0.02)
+                order.append(f"{name}-end")
+
+        threads = [threading.Thread(target=call, args=(name,)) for name in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order[0][0], order[1][0])
+        self.assertEqual(registry.stats(self.context).limited, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import math
+import time
+import unittest
+
+import numpy as np
+
+from tools import tool_sci
+from tools.tool_sci import (
+    EvalLimits,
+    SafeEvaluator,
+    compile_expression,
+    evaluate_array,
+    evaluate_many,
+)
+
+
+class SafeEvaluatorTests(unittest.TestCase):
+    def test_evaluates_whitelisted_expressions(self):
+        evaluator = SafeEvaluator()
+
+        self.assertEqual(evaluator.evaluate("(sqrt(9) + 1) ** 2"), 16.0)
+        self.assertEqual(evaluator.evaluate("-3 // 2"), -2)
+        self.assertEqual(evaluator.evaluate("2 ** -1"), 0.5)
+
+    def test_rejects_names_and_unsupported_syntax(self):
+        evaluator = SafeEvaluator()
+        cases = {
+            "x + 1": "不支持变量: x",
+            "__import__('os')": "不支持的函数: __import__",
+            "a.b": "不支持的语法: Attribute",
+            "1 < 2": "不支持的语法: Compare",
+            "log(9, 3)": "log 函数需要且仅需要一个参数",
+            "'a'": "只支持整数或浮点数",
+            " ": "表达式不能为空",
+            "1 +": "无效的数学表达式",
+        }
+        for expression, message in cases.items():
+            with self.subTest(expression=expression):
+                with self.assertRaisesRegex(ValueError, message):
+                    evaluator.evaluate(expression)
+
+    def test_runtime_errors_are_value_errors(self):
+        evaluator = SafeEvaluator()
+
+        with self.assertRaisesRegex(ValueError, "除零错误"):
+            evaluator.evaluate("1 / 0")
+        with self.assertRaisesRegex(ValueError, "无效的数学表达式"):
+            evaluator.evaluate("exp(1000)")
+
+    def test_compiled_expressions_are_cached(self):
+        compile_expression.cache_clear()
+
+        for _ in range(3):
+            SafeEvaluator().evaluate("1 + 2 * 3")
+
+        info = compile_expression.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+    def test_invalid_expressions_are_not_cached(self):
+        compile_expression.cache_clear()
+
+        with self.assertRaises(ValueError):
+            SafeEvaluator().evaluate("x")
+
+        self.assertEqual(compile_expression.cache_info().currsize, 0)
+
+
+class EvalLimitTests(unittest.TestCase):
+    def assertRejectedQuickly(self, evaluator, expression, message):
+        start = time.perf_counter()
+        with self.assertRaisesRegex(ValueError, message):
+            evaluator.evaluate(expression)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+    def test_rejects_huge_integer_powers_before_computing(self):
+        evaluator = SafeEvaluator()
+
+        for expression in ("9**9**9", "2**4096", "(10**1000)**(10**1000)", "99999**99999"):
+            with self.subTest(expression=expression):
+                self.assertRejectedQuickly(evaluator, expression, "结果过大")
+
+    def test_rejects_huge_integer_products(self):
+        self.assertRejectedQuickly(SafeEvaluator(), "(10**1000)*(10**1000)", "结果过大")
+
+    def test_allows_results_within_limit(self):
+        evaluator = SafeEvaluator()
+
+        self.assertEqual(evaluator.evaluate("2**4095").bit_length(), 4096)
+        self.assertEqual(evaluator.evaluate("(-1)**(10**100)"), 1)
+        self.assertEqual(evaluator.evaluate("2**-100000"), 0.0)
+
+    def test_limits_are_configurable(self):
+        evaluator = SafeEvaluator(limits=EvalLimits(max_bits=64, max_nodes=5, max_length=20))
+
+        self.assertRejectedQuickly(evaluator, "2**64", "结果过大: 超过 64 位")
+        self.assertRejectedQuickly(evaluator, "1+2+3+4", "表达式过于复杂")
+        self.assertRejectedQuickly(evaluator, "1" * 21, "表达式过长")
+
+    def test_timeout_is_checked_before_each_power(self):
+        evaluator = SafeEvaluator(limits=EvalLimits(timeout=-1))
+
+        with self.assertRaisesRegex(ValueError, "计算超时"):
+            evaluator.evaluate("2**10")
+
+
+class BatchTests(unittest.TestCase):
+    def test_evaluate_many_keeps_errors_in_place(self):
+        results = evaluate_many(["1 + 1", "1 / 0", "sqrt(16)"])
+
+        self.assertEqual(results[0], 2)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 4.0)
+
+    def test_calculator_batch_formats_each_line(self):
+        output = tool_sci.calculator_batch.invoke({"expressions": ["2 ** 10", "x"]})
+
+        self.assertEqual(output, "2 ** 10 = 1024\nx = 错误: 不支持变量: x")
+
+    def test_evaluate_array_matches_scalar_evaluation(self):
+        x = np.array([0.5, 1.0, 2.0])
+        y = np.array([3.0, 4.0, 5.0])
+
+        result = evaluate_array("sqrt(x ** 2 + y ** 2) * sin(x) - log(y) % 2", x=x, y=y)
+
+        expected = [
+            SafeEvaluator().evaluate(f"sqrt({a} ** 2 + {b} ** 2) * sin({a}) - log({b}) % 2")
+            for a, b in zip(x, y)
+        ]
+        np.testing.assert_allclose(result, expected)
+
+    def test_evaluate_array_broadcasts_inputs_and_constants(self):
+        np.testing.assert_allclose(evaluate_array("x + y", x=[1, 2], y=10), [11, 12])
+        np.testing.assert_allclose(evaluate_array("pi", pi=[1, 2]), [1, 2])
+        np.testing.assert_allclose(evaluate_array("2 * 3", x=[1, 2]), [6, 6])
+
+    def test_evaluate_array_keeps_whitelist_and_errors(self):
+        with self.assertRaisesRegex(ValueError, "不支持变量: z"):
+            evaluate_array("x + z", x=[1])
+        with self.assertRaisesRegex(ValueError, "不支持的语法: Attribute"):
+            evaluate_array("x.sum", x=[1])
+        with self.assertRaisesRegex(ValueError, "除零错误"):
+            evaluate_array("1 / x", x=[1, 0])
+        with self.assertRaisesRegex(ValueError, "无效的数学表达式"):
+            evaluate_array("sqrt(x)", x=[-1])
+        with self.assertRaisesRegex(ValueError, "无效的数学表达式"):
+            evaluate_array("exp(x)", x=[1000])
+
+    def test_vectorized_and_scalar_compilations_are_separate(self):
+        np.testing.assert_allclose(evaluate_array("abs(x)", x=[-1.5]), [1.5])
+
+        result = SafeEvaluator().evaluate("abs(-1.5) + sqrt(4)")
+        self.assertIs(type(result), float)
+        self.assertTrue(math.isclose(result, 3.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import dashscope
+import requests
+
+from tools import tool_clients, tool_search
+from utils.search_cache import SearchCache
+
+
+def _ok_response(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(
+        status_code=200,
+        output=SimpleNamespace(choices=[SimpleNamespace(message=message)]),
+    )
+
+
+class _SlowSearch:
+    """模拟耗时的异步搜索接口"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+        self.cancelled = 0
+
+    async def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return _ok_response(f"result: {kwargs['prompt']}")
+
+
+class DashscopeSearchTests(unittest.TestCase):
+    def setUp(self):
+        registry_patch = patch.object(tool_search, "client_registry", tool_clients.ClientRegistry())
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+        self.cache = SearchCache()
+        cache_patch = patch.object(tool_search, "_search_cache", self.cache)
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+        self.runtime = SimpleNamespace(
+            context=SimpleNamespace(
+                base_url="https://example.test/v1",
+                api_key="test-key",
+                model="qwen-plus",
+            )
+        )
+
+    def test_sync_search_passes_api_key_per_call(self):
+        with (
+            patch.object(dashscope, "api_key", None),
+            patch.object(tool_search.Generation, "call", return_value=_ok_response("ok")) as call,
+        ):
+            result = tool_search.dashscope_search.func(query="天气", runtime=self.runtime)
+
+            self.assertIsNone(dashscope.api_key)
+        self.assertEqual(result, "ok")
+        self.assertEqual(call.call_args.kwargs["api_key"], "test-key")
+
+    def test_failed_status_is_reported(self):
+        response = SimpleNamespace(status_code=500, message="boom")
+
+        with patch.object(tool_search.Generation, "call", return_value=response):
+            result = tool_search.dashscope_search.func(query="天气", runtime=self.runtime)
+
+        self.assertIn("500", result)
+        self.assertIn("boom", result)
+
+    def test_async_searches_do_not_block_other_sessions(self):
+        search = _SlowSearch(delay=0.2)
+
+        async def stream_tokens(ticks):
+            # 模拟另一个会话的流式输出
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            ticks = []
+            streamer = asyncio.create_task(stream_tokens(ticks))
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    tool_search.dashscope_search.coroutine(query=f"q{i}", runtime=self.runtime)
+                    for i in range(3)
+                )
+            )
+            elapsed = time.perf_counter() - start
+            streamer.cancel()
+            return results, elapsed, ticks
+
+        with patch.object(tool_search.AioGeneration, "call", search):
+            results, elapsed, ticks = asyncio.run(run())
+
+        self.assertEqual(results, ["result: q0", "result: q1", "result: q2"])
+        self.assertLess(elapsed, 3 * search.delay)
+        # 搜索进行期间，另一个会话仍在持续输出
+        self.assertGreaterEqual(len(ticks), 10)
+        self.assertLess(max(b - a for a, b in zip(ticks, ticks[1:])), 0.1)
+
+    def test_async_search_times_out(self):
+        search = _SlowSearch(delay=1)
+
+        with (
+            patch.object(tool_search, "SEARCH_TIMEOUT", 0.05),
+            patch.object(tool_search.AioGeneration, "call", search),
+        ):
+            result = asyncio.run(
+                tool_search.dashscope_search.coroutine(query="慢查询", runtime=self.runtime)
+            )
+
+        self.assertEqual(result, "Search timed out after 0.05 seconds")
+        self.assertEqual(search.cancelled, 1)
+
+    def test_sync_search_times_out(self):
+        with (
+            patch.object(tool_search, "SEARCH_TIMEOUT", 5),
+            patch.object(
+                tool_search.Generation, "call", side_effect=requests.exceptions.ReadTimeout()
+            ) as call,
+        ):
+            result = tool_search.dashscope_search.func(query="慢查询", runtime=self.runtime)
+
+        self.assertEqual(result, "Search timed out after 5 seconds")
+        self.assertEqual(call.call_args.kwargs["request_timeout"], 5)
+
+    def test_async_search_propagates_cancellation(self):
+        search = _SlowSearch(delay=1)
+
+        async def run():
+            task = asyncio.create_task(
+                tool_search.dashscope_search.coroutine(query="停止", runtime=self.runtime)
+            )
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with patch.object(tool_search.AioGeneration, "call", search):
+            asyncio.run(run())
+
+        self.assertEqual(search.cancelled, 1)
+
+    def test_repeated_queries_are_served_from_cache(self):
+        search = _SlowSearch(delay=0)
+
+        async def run():
+            first = await tool_search.dashscope_search.coroutine(
+                query="今天 天气", runtime=self.runtime
+            )
+            second = await tool_search.dashscope_search.coroutine(
+                query="  今天 天气？", runtime=self.runtime
+            )
+            return first, second
+
+        with patch.object(tool_search.AioGeneration, "call", search):
+            first, second = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(search.calls), 1)
+        self.assertEqual(self.cache.stats().hits, 1)
+
+    def test_failed_searches_are_not_cached(self):
+        response = SimpleNamespace(status_code=500, message="boom")
+
+        with patch.object(tool_search.Generation, "call", return_value=response) as call:
+            tool_search.dashscope_search.func(query="天气", runtime=self.runtime)
+            tool_search.dashscope_search.func(query="天气", runtime=self.runtime)
+
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import asyncio
 import gc
 import unittest
+import os
+import unittest.mock
 
 from utils import web_ui
 
@@ -13,7 +15,7 @@ def _blocks_by_type(ui, type_name):
     return [block for block in ui.blocks.values() if type(block).__name__ == type_name]
 
 
-def _create_test_ui(test_case):
+def _create_test_ui(test_case, **kwargs):
     loops = []
     original_new_event_loop = asyncio.new_event_loop
 
@@ -24,7 +26,7 @@ def _create_test_ui(test_case):
 
     asyncio.new_event_loop = track_new_event_loop
     try:
-        ui = web_ui.create_ui(_streaming_dummy, "Test Tab", "Test App")
+        ui = web_ui.create_ui(_streaming_dummy, "Test Tab", "Test App", **kwargs)
     finally:
         asyncio.new_event_loop = original_new_event_loop
 
@@ -84,6 +86,26 @@ class ButtonStateTests(unittest.TestCase):
         )
 
 
+class InitialMessageRefreshTests(unittest.TestCase):
+    def test_waits_until_ready(self):
+        refresh = web_ui._refresh_initial_message(lambda: [], lambda: False)
+
+        history, timer = refresh([{"role": "assistant", "content": "loading"}])
+
+        self.assertIsInstance(history, dict)  # gr.skip()
+        self.assertIsInstance(timer, dict)
+
+    def test_replaces_greeting_and_keeps_conversation(self):
+        greeting = {"role": "assistant", "content": "ready"}
+        refresh = web_ui._refresh_initial_message(lambda: [greeting], lambda: True)
+        user = {"role": "user", "content": "hi"}
+
+        history, timer = refresh([{"role": "assistant", "content": "loading"}, user])
+
+        self.assertEqual(history, [greeting, user])
+        self.assertFalse(timer.active)
+
+
 class CreateUiTests(unittest.TestCase):
     def test_create_ui_adds_hidden_stop_button(self):
         ui = _create_test_ui(self)
@@ -139,5 +161,76 @@ class CreateUiTests(unittest.TestCase):
         self.assertEqual(len(stop_cancel_events), 1)
 
 
+class ThreadModeTests(unittest.TestCase):
+    def test_generation_sends_message_and_thread_id_only(self):
+        async def load_thread(thread_id):
+            return []
+
+        ui = _create_test_ui(self, load_thread=load_thread)
+        chatbot = _blocks_by_type(ui, "Chatbot")[0]
+        textbox = _blocks_by_type(ui, "Textbox")[0]
+        state = _blocks_by_type(ui, "State")[0]
+        thread = _blocks_by_type(ui, "BrowserState")[0]
+
+        generation_fns = [
+            fn
+            for fn in ui.fns.values()
+            if getattr(fn, "targets", None) == [(None, "then")]
+            and [c._id for c in fn.inputs] == [textbox._id, state._id, thread._id]
+            and [c._id for c in fn.outputs] == [textbox._id, chatbot._id, state._id]
+        ]
+        self.assertEqual(len(generation_fns), 2)
+        self.assertNotIn(chatbot._id, {c._id for fn in generation_fns for c in fn.inputs})
+
+    def test_restore_loads_saved_thread_after_greeting(self):
+        greeting = {"role": "assistant", "content": "hello"}
+        saved = [{"role": "user", "content": "q"}, {"role": "assistant", "content": "a"}]
+
+        async def load_thread(thread_id):
+            return saved if thread_id == "t1" else []
+
+        restore = web_ui._restore_thread(load_thread, lambda: [greeting])
+        chat, history, thread_id = asyncio.run(restore("t1"))
+
+        self.assertEqual(chat, [greeting, *saved])
+        self.assertIs(history, chat)
+        self.assertEqual(thread_id, "t1")
+
+    def test_restore_creates_thread_id_when_missing_or_unreadable(self):
+        async def load_thread(thread_id):
+            raise RuntimeError("db locked")
+
+        restore = web_ui._restore_thread(load_thread, None)
+
+        _, history, new_id = asyncio.run(restore(""))
+        with unittest.mock.patch("builtins.print"):
+            _, _, fallback_id = asyncio.run(restore("t1"))
+
+        self.assertEqual(history, [])
+        self.assertTrue(new_id)
+        self.assertNotIn(fallback_id, ("", "t1"))
+
+
+class ThreadSecretTests(unittest.TestCase):
+    def setUp(self):
+        web_ui.thread_secret.cache_clear()
+        self.addCleanup(web_ui.thread_secret.cache_clear)
+
+    def test_secret_is_read_from_environment(self):
+        with unittest.mock.patch.dict(os.environ, {"GRADIO_THREAD_SECRET": "s3cret"}):
+            self.assertEqual(web_ui.thread_secret(), "s3cret")
+
+    def test_missing_secret_is_random_and_stable_within_process(self):
+        env = {k: v for k, v in os.environ.items() if k != "GRADIO_THREAD_SECRET"}
+        with unittest.mock.patch.dict(os.environ, env, clear=True):
+            with self.assertLogs(web_ui.logger, "WARNING"):
+                secret = web_ui.thread_secret()
+
+            self.assertEqual(web_ui.thread_secret(), secret)
+            web_ui.thread_secret.cache_clear()
+            with self.assertLogs(web_ui.logger, "WARNING"):
+                self.assertNotEqual(web_ui.thread_secret(), secret)
+
+
 if __name__ == "__main__":
     unittest.main()
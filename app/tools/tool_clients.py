@@ -0,0 +1,391 @@
+"""
+工具客户端注册表
+
+接收 ToolSchema 运行时上下文的工具（role_play、dashscope_search 等）以前每次调用都重新创建客户端，
+连接无法复用。本模块按上下文在进程内共享客户端：
+- 相同 (base_url, api_key) 共享一组带连接池的 httpx 客户端，并限制同时进行的请求数
+- 相同 (base_url, api_key, model) 共享一个聊天模型实例
+- 统计新建连接数、复用次数与握手耗时，估算复用连接省下的时间
+- 每类缓存最多保留 max_entries 个键，超出后淘汰最久未使用的
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from langchain.chat_models import init_chat_model
+
+from tools.tool_runtime import ToolSchema
+
+
+@dataclass(frozen=True)
+class ClientStats:
+    """客户端指标快照"""
+
+    requests: int = 0
+    connections: int = 0
+    handshake_time: float = 0.0
+    limited: int = 0
+    limit_wait: float = 0.0
+
+    @property
+    def reused(self) -> int:
+        """复用已有连接的请求数"""
+        return max(0, self.requests - self.connections)
+
+    @property
+    def avg_handshake(self) -> float:
+        """单次建立连接（TCP + TLS）的平均耗时"""
+        return self.handshake_time / self.connections if self.connections else 0.0
+
+    @property
+    def handshake_saved(self) -> float:
+        """复用连接省下的握手时间估计"""
+        return self.reused * self.avg_handshake
+
+    def __add__(self, other: "ClientStats") -> "ClientStats":
+        return ClientStats(
+            requests=self.requests + other.requests,
+            connections=self.connections + other.connections,
+            handshake_time=self.handshake_time + other.handshake_time,
+            limited=self.limited + other.limited,
+            limit_wait=self.limit_wait + other.limit_wait,
+        )
+
+
+class _Counters:
+    """单个连接键的计数器（线程安全）"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = ClientStats()
+
+    def add(self, **delta: Any) -> None:
+        with self._lock:
+            self._stats = self._stats + ClientStats(**delta)
+
+    def snapshot(self) -> ClientStats:
+        with self._lock:
+            return self._stats
+
+
+# httpcore 的 trace 事件：建立 TCP 连接与 TLS 握手
+_HANDSHAKE_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+
+
+class _Trace:
+    """单次请求的 httpcore trace 回调，记录是否新建连接及握手耗时"""
+
+    def __init__(self, counters: _Counters) -> None:
+        self._counters = counters
+        self._started: Dict[str, float] = {}
+
+    def __call__(self, name: str, info: Dict[str, Any]) -> None:
+        event, _, phase = name.rpartition(".")
+        if event not in _HANDSHAKE_EVENTS:
+            return
+        if phase == "started":
+            self._started[event] = time.perf_counter()
+        elif phase == "complete" and event in self._started:
+            elapsed = time.perf_counter() - self._started.pop(event)
+            if event == "connection.connect_tcp":
+                self._counters.add(connections=1, handshake_time=elapsed)
+            else:
+                self._counters.add(handshake_time=elapsed)
+
+
+class _AsyncTrace(_Trace):
+    async def __call__(self, name: str, info: Dict[str, Any]) -> None:  # type: ignore[override]
+        super().__call__(name, info)
+
+
+class _Limiter:
+    """
+    单个连接键的并发上限
+
+    同步调用与异步调用分别计数：同步侧使用线程信号量，异步侧按事件循环创建信号量。
+    """
+
+    def __init__(self, limit: int, counters: _Counters) -> None:
+        self._limit = limit
+        self._counters = counters
+        self._sync = threading.BoundedSemaphore(limit)
+        self._async: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _record_wait(self, start: float) -> None:
+        self._counters.add(limited=1, limit_wait=time.perf_counter() - start)
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        if not self._sync.acquire(blocking=False):
+            start = time.perf_counter()
+            self._sync.acquire()
+            self._record_wait(start)
+        try:
+            yield
+        finally:
+            self._sync.release()
+
+    @asynccontextmanager
+    async def ahold(self) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        semaphore = self._async.get(loop)
+        if semaphore is None:
+            semaphore = self._async[loop] = asyncio.Semaphore(self._limit)
+        if semaphore.locked():
+            start = time.perf_counter()
+            await semaphore.acquire()
+            self._record_wait(start)
+        else:
+            await semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+class _LRUDict(OrderedDict):
+    """
+    容量有限的字典，超出后淘汰最久未使用的键（由调用方加锁）
+
+    被淘汰的客户端可能仍有请求在进行，不主动关闭，连接随对象回收释放。
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key in self:
+            return self.get(key)
+        self[key] = default
+        return default
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _connection_key(context: ToolSchema) -> Tuple[str, str]:
+    return (context.base_url, context.api_key)
+
+
+def _model_key(context: ToolSchema) -> Tuple[str, str, str]:
+    return (context.base_url, context.api_key, context.model)
+
+
+class ClientRegistry:
+    """
+    按 ToolSchema 共享客户端的注册表
+
+    异步客户端与绑定了异步客户端的聊天模型按事件循环分别缓存，避免跨事件循环复用连接。
+
+    :param max_connections: 每个连接键的最大连接数
+    :param max_keepalive_connections: 每个连接键保持的空闲连接数
+    :param keepalive_expiry: 空闲连接的保留时间（秒）
+    :param max_concurrency: 每个连接键同时进行的调用数上限
+    :param timeout: 请求超时时间（秒）
+    :param max_entries: 每类缓存（每个事件循环分别计算）最多保留的键数
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 16,
+        max_keepalive_connections: int = 8,
+        keepalive_expiry: float = 60.0,
+        max_concurrency: int = 8,
+        timeout: float = 120.0,
+        max_entries: int = 8,
+    ) -> None:
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = timeout
+        self._max_concurrency = max_concurrency
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], _Counters] = _LRUDict(max_entries)
+        self._limiters: Dict[Tuple[str, str], _Limiter] = _LRUDict(max_entries)
+        self._sync_clients: Dict[Tuple[str, str], httpx.Client] = _LRUDict(max_entries)
+        # 事件循环 -> {连接键: 异步客户端}
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # 没有运行中的事件循环时使用的聊天模型及派生对象：{键: 对象}
+        self._models: Dict[Tuple, Any] = _LRUDict(max_entries)
+        # 事件循环 -> {键: 对象}
+        self._loop_models: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _counters_for(self, key: Tuple[str, str]) -> _Counters:
+        counters = self._counters.get(key)
+        if counters is None:
+            counters = self._counters[key] = _Counters()
+        return counters
+
+    # ── HTTP 客户端 ─────────────────────────────────────────────────────────────
+
+    def http_client(self, context: ToolSchema) -> httpx.Client:
+        """获取共享的同步 HTTP 客户端"""
+        key = _connection_key(context)
+        with self._lock:
+            client = self._sync_clients.get(key)
+            if client is None:
+                counters = self._counters_for(key)
+
+                def trace_request(request: httpx.Request) -> None:
+                    counters.add(requests=1)
+                    request.extensions["trace"] = _Trace(counters)
+
+                client = httpx.Client(
+                    limits=self._limits,
+                    timeout=self._timeout,
+                    event_hooks={"request": [trace_request]},
+                )
+                self._sync_clients[key] = client
+            return client
+
+    def async_http_client(self, context: ToolSchema) -> httpx.AsyncClient:
+        """获取当前事件循环中共享的异步 HTTP 客户端"""
+        key = _connection_key(context)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.get(loop)
+            if clients is None:
+                clients = self._async_clients[loop] = _LRUDict(self._max_entries)
+            client = clients.get(key)
+            if client is None:
+                counters = self._counters_for(key)
+
+                async def trace_request(request: httpx.Request) -> None:
+                    counters.add(requests=1)
+                    request.extensions["trace"] = _AsyncTrace(counters)
+
+                client = httpx.AsyncClient(
+                    limits=self._limits,
+                    timeout=self._timeout,
+                    event_hooks={"request": [trace_request]},
+                )
+                clients[key] = client
+            return client
+
+    # ── 聊天模型 ──────────────────────────────────────────────────────────────
+
+    def chat_model(self, context: ToolSchema) -> Any:
+        """获取共享的聊天模型（OpenAI 兼容接口），底层使用共享的 HTTP 客户端"""
+        loop = _running_loop()
+        key = _model_key(context)
+        with self._lock:
+            model = self._models_for(loop).get(key)
+        if model is not None:
+            return model
+
+        kwargs: Dict[str, Any] = {"http_client": self.http_client(context)}
+        if loop is not None:
+            kwargs["http_async_client"] = self.async_http_client(context)
+        model = init_chat_model(
+            model=context.model,
+            model_provider="openai",
+            base_url=context.base_url,
+            api_key=context.api_key,
+            **kwargs,
+        )
+        with self._lock:
+            return self._models_for(loop).setdefault(key, model)
+
+    def derived(self, context: ToolSchema, name: str, factory: Callable[[Any], Any]) -> Any:
+        """
+        获取基于共享聊天模型构建的对象（如编译好的工作流），与聊天模型同样按上下文缓存
+
+        :param name: 对象名称，同一上下文内唯一
+        :param factory: 接收聊天模型、返回对象的函数
+        """
+        llm = self.chat_model(context)
+        loop = _running_loop()
+        key = (_model_key(context), name)
+        with self._lock:
+            value = self._models_for(loop).get(key)
+        if value is None:
+            value = factory(llm)
+            with self._lock:
+                value = self._models_for(loop).setdefault(key, value)
+        return value
+
+    def _models_for(self, loop: Optional[asyncio.AbstractEventLoop]) -> Dict[Tuple, Any]:
+        if loop is None:
+            return self._models
+        models = self._loop_models.get(loop)
+        if models is None:
+            models = self._loop_models[loop] = _LRUDict(self._max_entries)
+        return models
+
+    # ── 并发上限 ──────────────────────────────────────────────────────────────
+
+    def _limiter(self, context: ToolSchema) -> _Limiter:
+        key = _connection_key(context)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = _Limiter(self._max_concurrency, self._counters_for(key))
+                self._limiters[key] = limiter
+            return limiter
+
+    def limit(self, context: ToolSchema):
+        """同步调用的并发上限：with registry.limit(context): ..."""
+        return self._limiter(context).hold()
+
+    def alimit(self, context: ToolSchema):
+        """异步调用的并发上限：async with registry.alimit(context): ..."""
+        return self._limiter(context).ahold()
+
+    # ── 指标与清理 ────────────────────────────────────────────────────────────
+
+    def stats(self, context: Optional[ToolSchema] = None) -> ClientStats:
+        """获取指定上下文（默认为全部）的指标快照"""
+        with self._lock:
+            if context is not None:
+                counters = self._counters.get(_connection_key(context))
+                return counters.snapshot() if counters else ClientStats()
+            return sum((c.snapshot() for c in self._counters.values()), ClientStats())
+
+    def close(self) -> None:
+        """关闭同步客户端并清空缓存（异步客户端随事件循环释放）"""
+        with self._lock:
+            clients = list(self._sync_clients.values())
+            self._sync_clients.clear()
+            self._models.clear()
+            self._loop_models.clear()
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的异步客户端"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.pop(loop, {}).values())
+            self._loop_models.pop(loop, None)
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+
+# 进程内共享的注册表
+client_registry = ClientRegistry()
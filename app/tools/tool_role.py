@@ -6,10 +6,12 @@ import operator
 
 from typing import Annotated, TypedDict
 from pydantic import BaseModel
-from langchain.tools import tool, ToolRuntime
-from langchain.chat_models import init_chat_model
+from langchain.tools import ToolRuntime
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Send
+from tools.tool_clients import client_registry
 from tools.tool_runtime import ToolSchema
 
 
@@ -26,6 +28,21 @@ best_response_prompt = """下面是几种类型的男生，面对女神{situatio
 
 MAX_ROLES = 10
 STRUCTURED_OUTPUT_METHOD = "json_mode"
+DEFAULT_ROLES = [
+    "男神",
+    "巨魔",
+    "舔狗",
+    "渣男",
+    "奶狗弟弟",
+    "社恐宅男",
+    "霸道总裁",
+    "茶茶的男生",
+    "文艺长发男",
+    "萌萌二次元",
+]
+# 同时请求模型的角色数上限：不低于 MAX_ROLES，所有角色在同一批中完成，
+# 总耗时接近最慢的单个角色；过多的请求由 roles 的数量上限与 HTTP 连接池（client_registry）约束
+MAX_CONCURRENCY = MAX_ROLES
 
 
 # 角色
@@ -69,6 +86,10 @@ class DogeOutput(TypedDict):
 # 创建 Doge 工作流
 def create_doge_graph(llm):
 
+    # 结构化输出只构建一次，供所有节点复用
+    response_llm = llm.with_structured_output(Response, method=STRUCTURED_OUTPUT_METHOD)
+    best_response_llm = llm.with_structured_output(BestResponse, method=STRUCTURED_OUTPUT_METHOD)
+
     # [MAP] 使用 Send 函数分发角色
     def continue_to_responses(state: Overall):
         return [
@@ -77,33 +98,52 @@ def create_doge_graph(llm):
         ]
 
     # [MAP] 角色回复节点：生成每个角色的回复
-    def generate_response(state: Role):
-        prompt = role_play_prompt.format(role=state["role"], situation=state["situation"])
-        response = llm.with_structured_output(
-            Response,
-            method=STRUCTURED_OUTPUT_METHOD,
-        ).invoke(prompt)
+    def _response_prompt(state: Role) -> str:
+        return role_play_prompt.format(role=state["role"], situation=state["situation"])
+
+    def _response_update(state: Role, response: Response) -> dict:
         return {"responses": [{"role": state["role"], "content": response.response}]}
 
+    def generate_response(state: Role):
+        response = response_llm.invoke(_response_prompt(state))
+        return _response_update(state, response)
+
+    async def agenerate_response(state: Role):
+        response = await response_llm.ainvoke(_response_prompt(state))
+        return _response_update(state, response)
+
     # [REDUCE] 最佳回复节点：返回最佳回复
-    def best_response(state: Overall):
+    def _best_response_prompt(state: Overall) -> str:
         responses = "\n\n".join(
             f"{index}. 【{item['role']}】{item['content']}"
             for index, item in enumerate(state["responses"])
         )
-        prompt = best_response_prompt.format(responses=responses, situation=state["situation"])
-        response = llm.with_structured_output(
-            BestResponse,
-            method=STRUCTURED_OUTPUT_METHOD,
-        ).invoke(prompt)
+        return best_response_prompt.format(responses=responses, situation=state["situation"])
+
+    def _best_response_update(state: Overall, response: BestResponse) -> dict:
         best_record = _select_best_response_record(state["responses"], response)
         return {"best_response": best_record["content"], "best_role": best_record["role"]}
 
+    def best_response(state: Overall):
+        response = best_response_llm.invoke(_best_response_prompt(state))
+        return _best_response_update(state, response)
+
+    async def abest_response(state: Overall):
+        response = await best_response_llm.ainvoke(_best_response_prompt(state))
+        return _best_response_update(state, response)
+
     doge_builder = StateGraph(Overall, output_schema=DogeOutput)
 
     # 添加节点
-    doge_builder.add_node("generate_response", generate_response)
-    doge_builder.add_node("best_response", best_response)
+    # 同时提供同步与异步实现：invoke 走同步分支，ainvoke 时各角色并发请求模型
+    doge_builder.add_node(
+        "generate_response",
+        RunnableLambda(generate_response, afunc=agenerate_response, name="generate_response"),
+    )
+    doge_builder.add_node(
+        "best_response",
+        RunnableLambda(best_response, afunc=abest_response, name="best_response"),
+    )
 
     # 添加边
     doge_builder.add_conditional_edges(START, continue_to_responses, ["generate_response"])
@@ -122,22 +162,35 @@ def _select_best_response_record(responses: list[dict], best_response: BestRespo
     return responses[best_response.id]
 
 
-@tool
-def role_play(
+def _get_doge_graph(context: ToolSchema):
+    """获取与上下文对应的工作流，聊天模型与工作流由 client_registry 按上下文共享"""
+    return client_registry.derived(context, "doge_graph", create_doge_graph)
+
+
+def _prepare(runtime: ToolRuntime[ToolSchema], roles: list[str]):
+    """校验参数并取得工作流"""
+    if not roles:
+        raise ValueError("roles 不能为空")
+    if len(roles) > MAX_ROLES:
+        raise ValueError(f"roles 最多支持 {MAX_ROLES} 个")
+
+    return _get_doge_graph(runtime.context)
+
+
+def _format_result(roles: list[str], model_name: str, response: dict) -> str:
+    return "\n".join(
+        [f"{len(roles)} 种人设的回复："]
+        + [f"\n【{item['role']}】\n{item['content']}" for item in response["responses"]]
+        + [
+            f"\n最受 {model_name} 喜爱的是【{response.get('best_role')}】的回复：\n{response['best_response']}"
+        ]
+    )
+
+
+def _role_play(
     runtime: ToolRuntime[ToolSchema],
     situation: str = "告诉你她今天要加班",
-    roles: list[str] = [
-        "男神",
-        "巨魔",
-        "舔狗",
-        "渣男",
-        "奶狗弟弟",
-        "社恐宅男",
-        "霸道总裁",
-        "茶茶的男生",
-        "文艺长发男",
-        "萌萌二次元",
-    ],
+    roles: list[str] = DEFAULT_ROLES,
 ):
     """在指定情境下，模拟多个人设与女神对话的场景
 
@@ -154,28 +207,31 @@ def role_play(
     Returns:
         str: 包含所有角色回复及最佳回复评选结果的格式化文本
     """
-    if not roles:
-        raise ValueError("roles 不能为空")
-    if len(roles) > MAX_ROLES:
-        raise ValueError(f"roles 最多支持 {MAX_ROLES} 个")
+    doge_graph = _prepare(runtime, roles)
+    response = doge_graph.invoke(
+        {"roles": roles, "situation": situation},
+        config={"max_concurrency": MAX_CONCURRENCY},
+    )
+    return _format_result(roles, runtime.context.model, response)
 
-    base_url = runtime.context.base_url
-    api_key = runtime.context.api_key
-    model_name = runtime.context.model
 
-    llm = init_chat_model(
-        model=model_name,
-        model_provider="openai",
-        base_url=base_url,
-        api_key=api_key,
+async def _arole_play(
+    runtime: ToolRuntime[ToolSchema],
+    situation: str = "告诉你她今天要加班",
+    roles: list[str] = DEFAULT_ROLES,
+):
+    """role_play 的异步实现，各角色的回复并发生成"""
+    doge_graph = _prepare(runtime, roles)
+    response = await doge_graph.ainvoke(
+        {"roles": roles, "situation": situation},
+        config={"max_concurrency": MAX_CONCURRENCY},
     )
-    doge_graph = create_doge_graph(llm)
-    response = doge_graph.invoke({"roles": roles, "situation": situation})
+    return _format_result(roles, runtime.context.model, response)
 
-    return "\n".join(
-        [f"{len(roles)} 种人设的回复："]
-        + [f"\n【{item['role']}】\n{item['content']}" for item in response["responses"]]
-        + [
-            f"\n最受 {model_name} 喜爱的是【{response.get('best_role')}】的回复：\n{response['best_response']}"
-        ]
-    )
+
+# Agent 以异步方式调用工具时走 _arole_play
+role_play = StructuredTool.from_function(
+    func=_role_play,
+    coroutine=_arole_play,
+    name="role_play",
+)
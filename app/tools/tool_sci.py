@@ -1,115 +1,123 @@
 """
 科学计算工具
+
+表达式的解析、校验与求值由 tools/eval_core.py 完成，与 math_mcp 共用同一实现。
 """
 
-import ast
-import math
-import operator
+from typing import Any, Iterable, List
 
 from langchain.tools import tool
 
+from tools.eval_core import (
+    DEFAULT_LIMITS,
+    FUNCTION_TABLES,
+    EvalError,
+    EvalLimits,
+    compile_expression,
+    register_functions,
+)
 
-class SafeEvaluator(ast.NodeVisitor):
-    # 支持的二元运算
-    BIN_OPS = {
-        ast.Add: operator.add,
-        ast.Sub: operator.sub,
-        ast.Mult: operator.mul,
-        ast.Div: operator.truediv,
-        ast.Pow: operator.pow,
-        ast.Mod: operator.mod,
-        ast.FloorDiv: operator.floordiv,
-    }
+# calculator_batch 单次最多计算的表达式数量
+MAX_BATCH_SIZE = 500
 
-    # 支持的一元运算
-    UNARY_OPS = {
-        ast.UAdd: operator.pos,
-        ast.USub: operator.neg,
-    }
+
+class SafeEvaluator:
+    """
+    安全计算白名单内的数学表达式
+
+    :param variables: 允许出现的变量名，默认不允许任何变量
+    :param vectorized: 为 True 时函数使用 NumPy 版本，变量可以是数组
+    :param limits: 资源上限
+    """
 
     # 支持的函数
-    SAFE_FUNCS = {
-        "sqrt": math.sqrt,
-        "exp": math.exp,
-        "log": math.log,
-        "log2": math.log2,
-        "log10": math.log10,
-        "sin": math.sin,
-        "cos": math.cos,
-        "tan": math.tan,
-        "abs": abs,
+    SAFE_FUNCS = FUNCTION_TABLES["math"]
+
+    # 与 SAFE_FUNCS 一一对应的 NumPy 函数名
+    NUMPY_FUNCS = {
+        "sqrt": "sqrt",
+        "exp": "exp",
+        "log": "log",
+        "log2": "log2",
+        "log10": "log10",
+        "sin": "sin",
+        "cos": "cos",
+        "tan": "tan",
+        "abs": "abs",
     }
 
-    def visit(self, node):
-        return super().visit(node)
-
-    def visit_Expression(self, node):
-        return self.visit(node.body)
-
-    def visit_Name(self, node):
-        # 明确禁止变量名
-        raise ValueError(f"不支持变量: {node.id}")
-
-    def visit_BinOp(self, node):
-        # 检查二元运算符
-        op_type = type(node.op)
-        if op_type not in self.BIN_OPS:
-            raise ValueError(f"不支持的二元运算符: {op_type}")
-        left = self.visit(node.left)
-        right = self.visit(node.right)
-        return self.BIN_OPS[op_type](left, right)
-
-    def visit_UnaryOp(self, node):
-        # 检查一元运算符
-        op_type = type(node.op)
-        if op_type not in self.UNARY_OPS:
-            raise ValueError(f"不支持的一元运算符: {op_type}")
-        operand = self.visit(node.operand)
-        return self.UNARY_OPS[op_type](operand)
-
-    def visit_Call(self, node):
-        # 检查函数调用
-        if not isinstance(node.func, ast.Name):
-            raise ValueError("函数调用格式错误")
-
-        func_name = node.func.id
-        if func_name not in self.SAFE_FUNCS:
-            raise ValueError(f"不支持的函数: {func_name}")
-
-        if len(node.args) != 1:
-            raise ValueError(f"{func_name} 函数需要且仅需要一个参数")
-
-        arg = self.visit(node.args[0])
-        return self.SAFE_FUNCS[func_name](arg)
-
-    def visit_Constant(self, node):
-        if not isinstance(node.value, (int, float)):
-            raise ValueError(f"只支持整数或浮点数，不支持 {type(node.value).__name__}")
-        return node.value
-
-    def generic_visit(self, node):
-        # 一切未列入白名单的节点，直接拒绝
-        raise ValueError(f"不支持的语法: {type(node).__name__}")
+    def __init__(
+        self,
+        variables: Iterable[str] = (),
+        vectorized: bool = False,
+        limits: EvalLimits = DEFAULT_LIMITS,
+    ) -> None:
+        self.variables = tuple(sorted(set(variables)))
+        self.vectorized = vectorized
+        self.limits = limits
+
+    @property
+    def functions(self) -> str:
+        """eval_core 中的函数表名称，NumPy 版本在第一次使用时注册"""
+        if not self.vectorized:
+            return "math"
+        if "numpy" not in FUNCTION_TABLES:
+            import numpy as np
+
+            register_functions(
+                "numpy", {name: getattr(np, attr) for name, attr in self.NUMPY_FUNCS.items()}
+            )
+        return "numpy"
+
+    def compile(self, expression: str):
+        """校验并编译表达式，结果会被缓存"""
+        return compile_expression(expression, self.variables, self.functions, self.limits)
 
     def evaluate(self, expression: str) -> float | int:
         # 安全计算数学表达式
-        if not expression.strip():
-            raise ValueError("表达式不能为空")
+        result = self.compile(expression).run()
+        if isinstance(result, (int, float)):
+            return result
+        raise ValueError(f"计算结果类型错误: {type(result)}")
+
 
+def evaluate_many(expressions: Iterable[str]) -> List[float | int | ValueError]:
+    """逐个计算多个表达式，出错的表达式对应位置为 ValueError"""
+    evaluator = SafeEvaluator()
+    results: List[float | int | ValueError] = []
+    for expression in expressions:
         try:
-            tree = ast.parse(expression, mode="eval")
-            result = self.visit(tree)
+            results.append(evaluator.evaluate(expression))
+        except ValueError as e:
+            results.append(e)
+    return results
+
 
-            if isinstance(result, (int, float)):
-                return result
-            else:
-                raise ValueError(f"计算结果类型错误: {type(result)}")
-        except ZeroDivisionError:
-            raise ValueError("除零错误")
-        except ValueError:
-            raise
-        except Exception as e:
-            raise ValueError(f"无效的数学表达式: {str(e)}")
+def evaluate_array(expression: str, **inputs: Any):
+    """
+    对一组输入数组计算同一个表达式，返回 NumPy 数组
+
+    白名单与 calculator 相同，另外允许使用 inputs 中的变量名。输入统一转换为 float64 并按 NumPy 规则广播；
+    除零、定义域错误与溢出会抛出 ValueError，而不是得到 inf / nan。
+
+    例子: evaluate_array("sqrt(x ** 2 + y ** 2)", x=[3, 5], y=[4, 12])
+    """
+    import numpy as np
+
+    arrays = {name: np.asarray(value, dtype=np.float64) for name, value in inputs.items()}
+    shape = np.broadcast_shapes(*(value.shape for value in arrays.values()))
+    evaluator = SafeEvaluator(inputs, vectorized=True)
+    try:
+        # 常量折叠发生在编译阶段，也要在 errstate 中进行
+        with np.errstate(divide="raise", invalid="raise", over="raise"):
+            result = np.asarray(evaluator.compile(expression).run(arrays), dtype=np.float64)
+    except EvalError as e:
+        if "divide by zero" in str(e):
+            raise ValueError("除零错误") from None
+        raise
+    if result.shape != shape:
+        result = np.broadcast_to(result, shape).copy()
+    return result
 
 
 @tool()
@@ -126,3 +134,22 @@ def calculator(expression: str) -> str:
     evaluator = SafeEvaluator()
     result = evaluator.evaluate(expression)
     return str(result)
+
+
+@tool()
+def calculator_batch(expressions: list[str]) -> str:
+    """
+    一次计算多个数学表达式，需要连续计算很多个表达式时使用
+
+    语法与 calculator 相同，每行返回一个结果，格式为 "表达式 = 结果"，出错的表达式返回错误信息。
+    例子: ["1 + 1", "sqrt(16)", "2 ** 10"]
+    """
+    if len(expressions) > MAX_BATCH_SIZE:
+        raise ValueError(f"expressions 最多支持 {MAX_BATCH_SIZE} 个")
+    lines = []
+    for expression, result in zip(expressions, evaluate_many(expressions)):
+        if isinstance(result, ValueError):
+            lines.append(f"{expression} = 错误: {result}")
+        else:
+            lines.append(f"{expression} = {result}")
+    return "\n".join(lines)
@@ -2,28 +2,151 @@
 联网搜索工具
 """
 
-import dashscope
+import asyncio
+import uuid
+from typing import Any, Optional
 
-from dashscope import Generation
-from langchain.tools import tool, ToolRuntime
+import requests
+from dashscope import AioGeneration, Generation
+from langchain.tools import ToolRuntime, tool
+from langchain_core.tools import StructuredTool
+from tools.tool_clients import client_registry
 from tools.tool_runtime import ToolSchema
+from utils.search_cache import SearchCache
 
 
-@tool
-def dashscope_search(
-    query: str,
-    runtime: ToolRuntime[ToolSchema],
-) -> str:
-    """使用 DashScope 提供的搜索 API 搜索互联网信息"""
-    dashscope.api_key = runtime.context.api_key
+SEARCH_MODEL = "qwen-max"
+# 单次搜索的超时时间（秒）
+SEARCH_TIMEOUT = 60
+
+# 搜索结果缓存，为 None 时不缓存
+_search_cache: Optional[SearchCache] = SearchCache()
+
+
+def set_search_cache(cache: Optional[SearchCache]) -> None:
+    """替换搜索结果缓存，传入 None 关闭缓存"""
+    global _search_cache
+    _search_cache = cache
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    return _search_cache
 
-    response = Generation.call(
-        model="qwen-max", prompt=query, enable_search=True, result_format="message"
-    )
 
+class _SearchFailed(Exception):
+    """搜索失败，消息即返回给模型的文本；失败结果不写入缓存"""
+
+
+def _check_response(response) -> str:
     if response.status_code == 200:
         return response.output.choices[0].message.content
     else:
-        return (
+        raise _SearchFailed(
             f"Search failed with status code: {response.status_code}, message: {response.message}"
         )
+
+
+def _search(
+    query: str,
+    runtime: ToolRuntime[ToolSchema],
+) -> str:
+    """使用 DashScope 提供的搜索 API 搜索互联网信息"""
+
+    def fetch() -> str:
+        # api_key 随请求传入，不修改全局的 dashscope.api_key；连接由 dashscope 的共享会话复用
+        with client_registry.limit(runtime.context):
+            try:
+                response = Generation.call(
+                    model=SEARCH_MODEL,
+                    prompt=query,
+                    api_key=runtime.context.api_key,
+                    enable_search=True,
+                    result_format="message",
+                    request_timeout=SEARCH_TIMEOUT,
+                )
+            except requests.exceptions.Timeout:
+                raise _SearchFailed(f"Search timed out after {SEARCH_TIMEOUT} seconds") from None
+        return _check_response(response)
+
+    cache = _search_cache
+    try:
+        if cache is None:
+            return fetch()
+        return cache.get(f"dashscope_search:{SEARCH_MODEL}", query, fetch)
+    except _SearchFailed as exc:
+        return str(exc)
+
+
+async def _asearch(
+    query: str,
+    runtime: ToolRuntime[ToolSchema],
+) -> str:
+    """dashscope_search 的异步实现，搜索期间不阻塞事件循环"""
+
+    async def fetch() -> str:
+        # 用户停止生成时，取消会沿着 Agent 传到这里并中断请求
+        async with client_registry.alimit(runtime.context):
+            try:
+                response = await asyncio.wait_for(
+                    AioGeneration.call(
+                        model=SEARCH_MODEL,
+                        prompt=query,
+                        api_key=runtime.context.api_key,
+                        enable_search=True,
+                        result_format="message",
+                    ),
+                    timeout=SEARCH_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                raise _SearchFailed(f"Search timed out after {SEARCH_TIMEOUT} seconds") from None
+        return _check_response(response)
+
+    cache = _search_cache
+    try:
+        if cache is None:
+            return await fetch()
+        return await cache.aget(f"dashscope_search:{SEARCH_MODEL}", query, fetch)
+    except _SearchFailed as exc:
+        return str(exc)
+
+
+# Agent 以异步方式调用工具时走 _asearch
+dashscope_search = StructuredTool.from_function(
+    func=_search,
+    coroutine=_asearch,
+    name="dashscope_search",
+)
+
+
+def make_search_brief_tool(
+    subagent: Any,
+    cache: Optional[SearchCache],
+    namespace: str,
+    description: str,
+) -> StructuredTool:
+    """
+    创建 subagent_search_brief 工具：调用搜索子 Agent 搜索并摘要
+
+    :param subagent: 搜索子 Agent
+    :param cache: 摘要结果缓存，为 None 时不缓存
+    :param namespace: 缓存命名空间，摘要由哪个模型生成就用哪个模型区分
+    :param description: 工具描述
+    """
+
+    @tool("subagent_search_brief", description=description)
+    async def search_brief(query: str, runtime: ToolRuntime[ToolSchema]) -> str:
+        """调用搜索子 Agent，返回摘要后的搜索结果"""
+
+        async def fetch() -> str:
+            result = await subagent.ainvoke(
+                {"messages": [{"role": "user", "content": query}]},
+                config={"configurable": {"thread_id": str(uuid.uuid4())}},
+                context=runtime.context,
+            )
+            return result["messages"][-1].content
+
+        if cache is None:
+            return await fetch()
+        return await cache.aget(namespace, query, fetch)
+
+    return search_brief
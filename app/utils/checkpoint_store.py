@@ -0,0 +1,750 @@
+# -*- coding: utf-8 -*-
+
+"""
+会话持久化
+
+主 Agent 的对话状态以 LangGraph checkpoint 的形式保存在 SQLite 中，界面每轮只需发送新消息与会话 ID，
+服务重启后按会话 ID 继续对话，不必重放历史。
+
+与 langgraph-checkpoint-sqlite 的 SqliteSaver 表结构相近，区别在于：
+- 使用 WAL 模式，读写互不阻塞
+- 通道值按版本单独保存（与 InMemorySaver 相同），未变化的通道不会在每个 checkpoint 中重复写入
+- 使用 msgpack 序列化，较大的值再用 zlib 压缩
+- 写入先进入缓冲区，攒够 batch_size 条或等待 flush_interval 秒后在一个事务中提交（组提交）；
+  读取前会先提交缓冲区，读到的总是最新状态
+
+长时间运行后的体积控制：
+- 只追加的列表通道（例如 messages）只保存新增的元素与上一个版本的引用（增量），
+  每 snapshot_every 个版本保存一次完整快照，读取时最多回放 snapshot_every - 1 个增量
+- compact() 按数量（keep_last）与时间（max_age）清理旧的 checkpoint，并删除不再被引用的通道值；
+  仍被保留的增量所依赖的快照不会被删除
+- vacuum() 把数据库切换为增量回收模式，释放清理后的空闲页并截断 WAL 文件
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    created REAL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    base_version TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# 早期版本的表中没有的列：(表, 列, 类型)
+_MIGRATIONS = [("checkpoints", "created", "REAL"), ("blobs", "base_version", "TEXT")]
+
+_ZLIB_SUFFIX = "+zlib"
+_MISSING = object()
+
+Statement = Tuple[str, tuple]
+
+
+class _Head(NamedTuple):
+    """某个通道最近写入的版本，用于判断下一个版本能否只保存增量"""
+
+    version: str
+    value: list
+    depth: int  # 距离最近的完整快照的增量个数
+
+
+@dataclass(frozen=True)
+class CompactionStats:
+    """一次 compact() 删除的数据量"""
+
+    checkpoints: int = 0
+    threads: int = 0  # 全部 checkpoint 都被删除的会话数
+    blobs: int = 0
+    writes: int = 0
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    SQLite（WAL 模式）checkpoint 存储，线程安全
+
+    :param path: 数据库文件路径，为 ":memory:" 时只保存在内存中
+    :param batch_size: 缓冲的写入达到该条数时立即提交
+    :param flush_interval: 缓冲的写入最多等待的时间（秒），进程异常退出时最多丢失这段时间内的写入
+    :param compress_min: 序列化后达到该字节数的值用 zlib 压缩
+    :param snapshot_every: 只追加的列表通道每隔多少个版本保存一次完整快照，为 1 时总是保存完整的值
+    :param serde: 序列化器，默认使用 JsonPlusSerializer（msgpack）
+    :param clock: 时间函数，用于记录 checkpoint 的创建时间，便于测试
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        batch_size: int = 64,
+        flush_interval: float = 0.2,
+        compress_min: int = 512,
+        snapshot_every: int = 20,
+        serde: Any = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress_min = compress_min
+        self.snapshot_every = max(1, snapshot_every)
+        self._clock = clock
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # 只对新建的数据库生效，已有的数据库在第一次 vacuum() 时切换
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最近的事务，不会损坏数据库
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.RLock()
+        self._pending: List[Statement] = []
+        self._timer: Optional[threading.Timer] = None
+        # (thread_id, checkpoint_ns, channel) -> 最近写入的列表值，按最近使用排序
+        self._heads: OrderedDict[Tuple[str, str, str], _Head] = OrderedDict()
+        self._heads_maxsize = 1024
+        self.commits = 0  # 提交的事务数
+        self.statements = 0  # 提交的写入语句数
+
+    def _migrate(self) -> None:
+        for table, column, type_ in _MIGRATIONS:
+            columns = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type_}")
+                if column == "created":
+                    # 无法得知旧数据的创建时间，按迁移时间计算保留期限
+                    self._db.execute("UPDATE checkpoints SET created = ?", (time.time(),))
+
+    # ── 序列化 ────────────────────────────────────────────────────────────────
+
+    def _dumps(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= self.compress_min:
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                return type_ + _ZLIB_SUFFIX, packed
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(_ZLIB_SUFFIX):
+            type_, data = type_[: -len(_ZLIB_SUFFIX)], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # ── 组提交 ────────────────────────────────────────────────────────────────
+
+    def _enqueue(self, statements: List[Statement]) -> None:
+        with self._lock:
+            self._pending.extend(statements)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """在一个事务中提交缓冲区中的写入"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._db.execute("BEGIN")
+        try:
+            for sql, params in pending:
+                self._db.execute(sql, params)
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        self.commits += 1
+        self.statements += len(pending)
+
+    def close(self) -> None:
+        """提交缓冲区并关闭数据库"""
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """先提交缓冲区再查询，保证读到自己的写入"""
+        with self._lock:
+            self._flush_locked()
+            return self._db.execute(sql, params).fetchall()
+
+    # ── 读取 ──────────────────────────────────────────────────────────────────
+
+    def _load_blob(
+        self, thread_id: str, checkpoint_ns: str, channel: str, version: str, memo: dict
+    ) -> Any:
+        """读取通道值，增量沿引用链找到最近的快照后依次追加；memo 缓存本次读取中已还原的版本"""
+        deltas: List[Tuple[str, list]] = []
+        value: Any = _MISSING
+        while version is not None:
+            if (channel, version) in memo:
+                value = memo[channel, version]
+                break
+            rows = self._query(
+                "SELECT type, blob, base_version FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            )
+            if not rows or rows[0][0] == "empty":
+                break
+            type_, blob, base_version = rows[0]
+            if base_version is None:
+                value = self._loads(type_, blob)
+                memo[channel, version] = value
+                break
+            deltas.append((version, self._loads(type_, blob)))
+            version = base_version
+        if value is _MISSING:
+            return _MISSING
+        for delta_version, items in reversed(deltas):
+            value = [*value, *items]
+            memo[channel, delta_version] = value
+        return value
+
+    def _load_blobs(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        versions: ChannelVersions,
+        memo: Optional[dict] = None,
+    ) -> dict:
+        memo = {} if memo is None else memo
+        values: Dict[str, Any] = {}
+        for channel, version in versions.items():
+            value = self._load_blob(thread_id, checkpoint_ns, channel, str(version), memo)
+            if value is not _MISSING:
+                # 同一次读取中的多个 checkpoint 可能共用还原出的列表，各自返回一份副本
+                values[channel] = list(value) if isinstance(value, list) else value
+        return values
+
+    def _load_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> List[Tuple[str, str, Any]]:
+        rows = self._query(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+        rows.sort(key=lambda row: writes_sort_key(row[5], row[0], row[1]))
+        return [
+            (task_id, channel, self._loads(type_, value))
+            for task_id, _, channel, type_, value, _ in rows
+        ]
+
+    def _make_tuple(
+        self, thread_id: str, checkpoint_ns: str, row: tuple, memo: Optional[dict] = None
+    ) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        checkpoint: Checkpoint = self._loads(type_, data)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"], memo
+                ),
+            },
+            metadata=self._loads(metadata_type, metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """获取指定的 checkpoint，config 中没有 checkpoint_id 时获取会话最新的 checkpoint"""
+        thread_id: str = config["configurable"]["thread_id"]
+        checkpoint_ns: str = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        if checkpoint_id := get_checkpoint_id(config):
+            rows = self._query(
+                f"SELECT {columns} FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        else:
+            rows = self._query(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            )
+        if not rows:
+            return None
+        return self._make_tuple(thread_id, checkpoint_ns, rows[0])
+
+    def has_thread(self, thread_id: str) -> bool:
+        """会话是否已有 checkpoint，只查询索引，不读取和反序列化会话状态"""
+        rows = self._query(
+            "SELECT 1 FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' LIMIT 1",
+            (thread_id,),
+        )
+        return bool(rows)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """按时间倒序列出 checkpoint"""
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+        sql = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+            "checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY checkpoint_id DESC"
+        # 元数据在 Python 中过滤，有 filter 时不能在 SQL 中限制条数
+        if limit is not None and not filter:
+            sql += f" LIMIT {int(limit)}"
+
+        # 相邻的 checkpoint 大多共用通道值与增量的快照，同一次列出时只还原一次
+        memos: Dict[Tuple[str, str], dict] = {}
+        for thread_id, checkpoint_ns, *row in self._query(sql, tuple(params)):
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._loads(row[4], row[5])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            memo = memos.setdefault((thread_id, checkpoint_ns), {})
+            yield self._make_tuple(thread_id, checkpoint_ns, tuple(row), memo)
+
+    # ── 写入 ──────────────────────────────────────────────────────────────────
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """保存 checkpoint，只写入本次有新版本的通道"""
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        type_, data = self._dumps(c)
+        metadata_type, metadata_data = self._dumps(get_checkpoint_metadata(config, metadata))
+        # 判断增量与写入缓冲区在同一把锁内完成，compact() 不会删掉刚被引用的快照
+        with self._lock:
+            statements: List[Statement] = []
+            for channel, version in new_versions.items():
+                type_b, blob, base = self._dump_channel(
+                    thread_id, checkpoint_ns, channel, str(version), values.get(channel, _MISSING)
+                )
+                statements.append(
+                    (
+                        "INSERT OR REPLACE INTO blobs "
+                        "(thread_id, checkpoint_ns, channel, version, type, blob, base_version) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, channel, str(version), type_b, blob, base),
+                    )
+                )
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+                    "checkpoint, metadata_type, metadata, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),  # 父 checkpoint
+                        type_,
+                        data,
+                        metadata_type,
+                        metadata_data,
+                        self._clock(),
+                    ),
+                )
+            )
+            self._enqueue(statements)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _dump_channel(
+        self, thread_id: str, checkpoint_ns: str, channel: str, version: str, value: Any
+    ) -> Tuple[str, bytes, Optional[str]]:
+        """序列化通道值，返回 (类型, 数据, 增量所基于的版本)；调用方持有锁"""
+        if value is _MISSING:
+            return "empty", b"", None
+        key = (thread_id, checkpoint_ns, channel)
+        head = self._heads.pop(key, None)
+        if not isinstance(value, list):
+            type_, blob = self._dumps(value)
+            return type_, blob, None
+        self._heads[key] = _Head(version, list(value), 0)
+        while len(self._heads) > self._heads_maxsize:
+            self._heads.popitem(last=False)
+        if (
+            head is not None
+            and head.depth + 1 < self.snapshot_every
+            and len(value) >= len(head.value)
+            and all(a is b or a == b for a, b in zip(head.value, value))
+        ):
+            self._heads[key] = _Head(version, list(value), head.depth + 1)
+            type_, blob = self._dumps(value[len(head.value) :])
+            return type_, blob, head.version
+        type_, blob = self._dumps(value)
+        return type_, blob, None
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """保存某个任务在 checkpoint 之后产生的写入"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # 特殊通道（错误、中断等）覆盖旧值，普通写入已存在时保留旧值
+        verb = "REPLACE" if all(c in WRITES_IDX_MAP for c, _ in writes) else "IGNORE"
+        statements: List[Statement] = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self._dumps(value)
+            statements.append(
+                (
+                    f"INSERT OR {verb} INTO writes "
+                    "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+                    "task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint_id,
+                        task_id,
+                        WRITES_IDX_MAP.get(channel, idx),
+                        channel,
+                        type_,
+                        blob,
+                        task_path,
+                    ),
+                )
+            )
+        self._enqueue(statements)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """删除会话的全部 checkpoint 与写入"""
+        with self._lock:
+            self._flush_locked()
+            self._forget_heads({thread_id})
+            self._db.execute("BEGIN")
+            for table in ("checkpoints", "blobs", "writes"):
+                self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._db.execute("COMMIT")
+
+    def _forget_heads(self, thread_ids: Set[str]) -> None:
+        for key in [key for key in self._heads if key[0] in thread_ids]:
+            del self._heads[key]
+
+    # ── 压缩与清理 ────────────────────────────────────────────────────────────
+
+    def compact(
+        self,
+        keep_last: Optional[int] = None,
+        max_age: Optional[float] = None,
+        thread_ids: Optional[Iterable[str]] = None,
+    ) -> CompactionStats:
+        """
+        清理旧的 checkpoint
+
+        每个会话（按命名空间分别计算）只保留最近的 keep_last 个、且创建时间在 max_age 秒以内的 checkpoint；
+        全部过期的会话整个删除。被删除的 checkpoint 的写入、不再被引用的通道值一并删除，
+        保留下来的最早的 checkpoint 不再指向父 checkpoint。
+        每个会话单独提交，清理期间其他会话的读写只需等待一个会话的清理。
+
+        :param keep_last: 每个会话最多保留的 checkpoint 数，为 None 时不限
+        :param max_age: checkpoint 的最长保留时间（秒），为 None 时不限
+        :param thread_ids: 只清理这些会话，为 None 时清理全部会话
+        """
+        cutoff = self._clock() - max_age if max_age is not None else None
+        where, params = "", ()
+        if thread_ids is not None:
+            thread_ids = list(thread_ids)
+            where = f" WHERE thread_id IN ({', '.join('?' * len(thread_ids))})"
+            params = tuple(thread_ids)
+        rows = self._query(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, created FROM checkpoints"
+            + where
+            + " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC",
+            params,
+        )
+
+        # (thread_id, checkpoint_ns) -> 需要删除的 checkpoint_id
+        plan: Dict[Tuple[str, str], List[str]] = {}
+        kept: Dict[Tuple[str, str], int] = {}
+        for thread_id, checkpoint_ns, checkpoint_id, created in rows:
+            key = (thread_id, checkpoint_ns)
+            count = kept.setdefault(key, 0)
+            expired = cutoff is not None and created is not None and created < cutoff
+            if expired or (keep_last is not None and count >= keep_last):
+                plan.setdefault(key, []).append(checkpoint_id)
+            else:
+                kept[key] = count + 1
+
+        totals = dict.fromkeys(CompactionStats.__dataclass_fields__, 0)
+        for (thread_id, checkpoint_ns), checkpoint_ids in plan.items():
+            with self._lock:
+                self._flush_locked()
+                self._forget_heads({thread_id})
+                self._db.execute("BEGIN")
+                try:
+                    deleted = self._compact_thread(thread_id, checkpoint_ns, checkpoint_ids)
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+                self._db.execute("COMMIT")
+            for name, value in deleted.items():
+                totals[name] += value
+        return CompactionStats(**totals)
+
+    def _compact_thread(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> Dict[str, int]:
+        """删除一个会话中的指定 checkpoint 并回收通道值（调用方持有锁并开启事务）"""
+        db, scope = self._db, (thread_id, checkpoint_ns)
+        marks = ", ".join("?" * len(checkpoint_ids))
+        deleted = dict.fromkeys(CompactionStats.__dataclass_fields__, 0)
+        deleted["checkpoints"] = db.execute(
+            f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            f"AND checkpoint_id IN ({marks})",
+            (*scope, *checkpoint_ids),
+        ).rowcount
+        deleted["writes"] = db.execute(
+            f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            f"AND checkpoint_id IN ({marks})",
+            (*scope, *checkpoint_ids),
+        ).rowcount
+        db.execute(
+            f"UPDATE checkpoints SET parent_checkpoint_id = NULL "
+            f"WHERE thread_id = ? AND checkpoint_ns = ? AND parent_checkpoint_id IN ({marks})",
+            (*scope, *checkpoint_ids),
+        )
+
+        # 仍被引用的通道值：保留的 checkpoint 用到的版本，以及这些版本的增量所依赖的版本
+        referenced: Set[Tuple[str, str]] = set()
+        remaining = db.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+            scope,
+        ).fetchall()
+        for type_, data in remaining:
+            for channel, version in self._loads(type_, data)["channel_versions"].items():
+                referenced.add((channel, str(version)))
+        bases = dict(
+            ((channel, version), base)
+            for channel, version, base in db.execute(
+                "SELECT channel, version, base_version FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND base_version IS NOT NULL",
+                scope,
+            )
+        )
+        stack = list(referenced)
+        while stack:
+            channel, version = stack.pop()
+            base = bases.get((channel, version))
+            if base is not None and (channel, base) not in referenced:
+                referenced.add((channel, base))
+                stack.append((channel, base))
+
+        unused = [
+            (channel, version)
+            for channel, version in db.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                scope,
+            )
+            if (channel, version) not in referenced
+        ]
+        db.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND channel = ? AND version = ?",
+            [(*scope, channel, version) for channel, version in unused],
+        )
+        deleted["blobs"] = len(unused)
+        deleted["threads"] = int(not remaining)
+        return deleted
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """按 BaseCheckpointSaver 的约定清理会话：keep_latest 只保留最新的 checkpoint，delete 删除会话"""
+        if strategy == "keep_latest":
+            self.compact(keep_last=1, thread_ids=thread_ids)
+        elif strategy == "delete":
+            for thread_id in thread_ids:
+                self.delete_thread(thread_id)
+        else:
+            raise ValueError(f"未知的清理策略：{strategy!r}")
+
+    def vacuum(self) -> None:
+        """
+        释放空闲页并截断 WAL 文件
+
+        增量回收模式下只需 incremental_vacuum，很快；旧数据库第一次调用时执行一次完整的 VACUUM 切换模式，
+        期间会阻塞读写，应在后台线程中调用。
+        """
+        with self._lock:
+            self._flush_locked()
+            if self._db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+                self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self._db.execute("VACUUM")
+            else:
+                # 每释放一页返回一行，需要取完结果才会执行到底
+                self._db.execute("PRAGMA incremental_vacuum").fetchall()
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ── 异步接口 ──────────────────────────────────────────────────────────────
+    # 读写都放到线程中执行：写入需要与提交、compact()、vacuum() 争用同一把锁，
+    # 在事件循环中等锁会卡住全部会话
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return await asyncio.to_thread(self.has_thread, thread_id)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+对话历史窗口
+
+Gradio 每一轮都会把完整的对话历史交给 generate_response。如果原样发给 Agent，请求体随对话线性增长，
+Agent 内的 SummarizationMiddleware 也会在每一轮重新摘要同一段早期对话。
+
+ConversationStore 在服务端保存对话的滚动摘要：
+- 较早的消息并入摘要，每条消息只参与一次摘要；之后每轮只发送「摘要 + 最近的消息 + 本轮输入」
+- 摘要以「被摘要的对话前缀」的哈希链为键：只要界面上的历史与摘要覆盖的内容一致就能复用，
+  用户中止回复、刷新页面或多个会话并发都不会串用摘要，也不需要额外传递会话标识
+- 未摘要部分的 token 数超过 trigger_tokens 时才调用一次 LLM，把较早的部分并入摘要，
+  只保留不超过 keep_tokens 的最近消息
+
+只作用于不保存会话的请求：启用会话持久化时历史保存在 checkpoint 中，每轮只发送新消息，
+由 Agent 内的 SummarizationMiddleware 负责摘要；本模块只在用界面历史初始化新会话时压缩一次历史。
+"""
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from prompts import conversation_summary
+
+Message = Dict[str, Any]
+# (已有摘要, 需要并入摘要的消息) -> 新摘要
+Summarizer = Callable[[str, List[Message]], Awaitable[str]]
+
+
+def _approximate_tokens(message: Message) -> int:
+    """与 SummarizationMiddleware 默认一致的近似 token 数"""
+    from langchain_core.messages.utils import count_tokens_approximately
+
+    return count_tokens_approximately([message])
+
+
+def prefix_digests(messages: List[Message]) -> List[str]:
+    """
+    对话前缀的哈希链
+
+    第 k 项是前 k 条消息的哈希（第 0 项对应空前缀），前缀相同则哈希相同。
+    """
+    digests = [""]
+    for message in messages:
+        payload = json.dumps(
+            [message.get("role"), message.get("content")],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        digests.append(hashlib.sha256((digests[-1] + payload).encode("utf-8")).hexdigest())
+    return digests
+
+
+def format_transcript(messages: List[Message]) -> str:
+    """把消息整理为摘要提示词中的对话文本"""
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "".join(
+                item.get("text", "") if isinstance(item, dict) else str(item) for item in content
+            )
+        lines.append(f"{message.get('role', 'user')}: {content}")
+    return "\n".join(lines)
+
+
+class ConversationStore:
+    """
+    按对话内容索引的滚动摘要
+
+    :param summarize: 合并摘要的协程函数，参数为 (已有摘要, 需要并入的消息)
+    :param trigger_tokens: 未摘要部分超过该 token 数时触发摘要，应低于 Agent 内 SummarizationMiddleware 的触发值
+    :param keep_tokens: 摘要后保留的最近消息的 token 数上限，本轮输入总会保留
+    :param maxsize: 最多保存的摘要数
+    :param count_tokens: 单条消息的 token 计数函数
+    """
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        trigger_tokens: int = 1500,
+        keep_tokens: int = 600,
+        maxsize: int = 1024,
+        count_tokens: Callable[[Message], int] = _approximate_tokens,
+    ) -> None:
+        self._summarize = summarize
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self.maxsize = maxsize
+        self._count_tokens = count_tokens
+        # 前缀哈希 -> 该前缀的摘要，按最近使用排序
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        # 前缀哈希 -> 进行中的摘要任务，相同前缀只摘要一次
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 运行期间保持对后台任务的引用
+        self._tasks: set = set()
+        self.summaries = 0  # 调用 LLM 摘要的次数
+        self.reused = 0  # 复用已有摘要的轮数
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    async def prepare(self, messages: List[Message]) -> List[Message]:
+        """
+        返回本轮发送给 Agent 的消息：摘要（如有）+ 最近的消息
+
+        :param messages: 完整的对话历史，最后一条为本轮输入
+        """
+        digests = prefix_digests(messages)
+        start, summary = 0, ""
+        # 找到已有摘要覆盖的最长前缀，本轮输入不会被摘要
+        for k in range(len(messages) - 1, 0, -1):
+            cached = self._summaries.get(digests[k])
+            if cached is not None:
+                self._summaries.move_to_end(digests[k])
+                start, summary = k, cached
+                self.reused += 1
+                break
+
+        tokens = [self._count_tokens(message) for message in messages[start:]]
+        if sum(tokens) > self.trigger_tokens:
+            split = self._split(start, tokens, len(messages))
+            if split > start:
+                folded = await self._fold(digests[split], summary, messages[start:split])
+                if folded is not None:
+                    start, summary = split, folded
+
+        recent = list(messages[start:])
+        if not summary:
+            return recent
+        content = conversation_summary.get_summary_message(summary)
+        return [{"role": "user", "content": content}, *recent]
+
+    def schedule(self, messages: List[Message]) -> None:
+        """在后台为下一轮提前准备摘要，避免下一轮开始时等待摘要"""
+        task = asyncio.ensure_future(self.prepare(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _split(self, start: int, tokens: List[int], total: int) -> int:
+        """从末尾向前保留不超过 keep_tokens 的消息，返回保留部分的起始位置"""
+        split, kept = total - 1, tokens[-1]  # 本轮输入总会保留
+        while split > start and kept + tokens[split - 1 - start] <= self.keep_tokens:
+            split -= 1
+            kept += tokens[split - start]
+        return split
+
+    async def _fold(self, key: str, summary: str, messages: List[Message]) -> Optional[str]:
+        """把 messages 并入摘要，失败时返回 None，本轮改为发送未摘要的消息"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._summarize_and_store(key, summary, messages))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            # 调用方被取消时摘要继续完成，结果仍会写入
+            return await asyncio.shield(future)
+        except Exception as exc:
+            print(f"对话摘要失败，本轮发送未摘要的历史: {exc}")
+            return None
+
+    async def _summarize_and_store(self, key: str, summary: str, messages: List[Message]) -> str:
+        folded = (await self._summarize(summary, messages)).strip()
+        self.summaries += 1
+        if not folded:
+            raise ValueError("摘要为空")
+        self._summaries[key] = folded
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.maxsize:
+            self._summaries.popitem(last=False)
+        return folded
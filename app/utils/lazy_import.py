@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+按需导入
+
+langchain、langchain_openai、mcp、dashscope 等依赖加起来要导入一两秒。
+app.py 顶部只导入轻量模块，其余模块用 LazyModule 包装，第一次访问属性时才真正导入：
+- 未启用的功能（例如非 dashscope 提供商下的搜索工具、没有配置的 MCP 服务）对应的模块不会被导入
+- Web 服务可以先绑定端口，再在后台线程中用 preload() 导入创建 Agent 所需的模块
+"""
+
+import importlib
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Iterable, Optional
+
+
+class LazyModule:
+    """
+    第一次访问属性时才导入的模块代理
+
+    :param name: 模块的完整名称，例如 "langchain.agents"
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def loaded(self) -> bool:
+        """模块是否已经导入（包括被其他代码导入）"""
+        return self._module is not None or self._name in sys.modules
+
+    def load(self) -> ModuleType:
+        """导入并返回模块，多个线程同时调用时只导入一次"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        # 只有实例上找不到的属性才会走到这里，_name / _module 不会触发导入
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def preload(modules: Iterable[LazyModule]) -> None:
+    """依次导入多个模块，通常放在后台线程中执行"""
+    for module in modules:
+        module.load()
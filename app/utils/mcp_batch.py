@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+MCP 工具调用合并
+
+Agent 在同一步中并行发起多个同名工具调用时（例如一次算十个式子），每个调用都是一次独立的 JSON-RPC 往返。
+如果服务端为工具 T 提供了批量版本 T_batch，本模块的拦截器会把短时间窗口内到达的 T 调用合并为一次 T_batch 调用，
+再把结果按顺序拆回给各个调用方。
+
+- 只合并同一会话（thread_id）的调用，批量调用沿用第一个调用的运行时上下文，不能混入其他会话的请求
+- 没有同类调用在进行时不等待合并窗口，只合并同一轮事件循环中到达的调用
+
+批量工具的约定（参考 mcp_server/math_mcp/server.py 中的 math_batch）：
+- T 只有一个参数；T_batch 只有一个数组参数，元素依次是各次调用 T 的参数值
+- T_batch 按顺序返回列表，每一项为 {"result": 结果} 或 {"error": 错误信息}
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from mcp.types import CallToolResult, TextContent
+
+Handler = Callable[[MCPToolCallRequest], Awaitable[Any]]
+# (事件循环, 服务名称, 工具名称, 会话)
+GroupKey = Tuple[Any, str, str, Optional[str]]
+
+
+@dataclass(frozen=True)
+class BatchSpec:
+    """工具 T 与其批量版本的对应关系"""
+
+    batch_name: str  # 批量工具名称
+    arg: str  # T 的参数名
+    batch_arg: str  # 批量工具的数组参数名
+
+
+def find_batch_tools(tools: Iterable[BaseTool]) -> Dict[str, BatchSpec]:
+    """从工具列表中找出所有提供了批量版本的工具"""
+    args = {tool.name: tool.args for tool in tools}
+    specs = {}
+    for name, params in args.items():
+        batch_params = args.get(f"{name}_batch")
+        if batch_params is None or len(params) != 1 or len(batch_params) != 1:
+            continue
+        ((batch_arg, schema),) = batch_params.items()
+        if schema.get("type") == "array":
+            specs[name] = BatchSpec(f"{name}_batch", next(iter(params)), batch_arg)
+    return specs
+
+
+def _batch_items(result: Any, size: int) -> Optional[List[dict]]:
+    """取出批量调用的逐项结果，格式不符时返回 None"""
+    if not isinstance(result, CallToolResult) or result.isError:
+        return None
+    structured = result.structuredContent or {}
+    items = structured.get("result")
+    if not isinstance(items, list) or len(items) != size:
+        return None
+    if not all(isinstance(item, dict) and ("result" in item or "error" in item) for item in items):
+        return None
+    return items
+
+
+def _item_result(name: str, item: dict) -> CallToolResult:
+    """把批量结果中的一项还原为单独调用 name 时的返回格式"""
+    if "error" in item:
+        text = f"Error calling tool '{name}': {item['error']}"
+        return CallToolResult(content=[TextContent(type="text", text=text)], isError=True)
+    value = item["result"]
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return CallToolResult(
+        content=[TextContent(type="text", text=text)],
+        structuredContent={"result": value},
+        isError=False,
+    )
+
+
+def _session_id(request: MCPToolCallRequest) -> Optional[str]:
+    """调用所属的会话（LangGraph thread_id），在图外调用时为 None"""
+    config = getattr(request.runtime, "config", None) or {}
+    return (config.get("configurable") or {}).get("thread_id")
+
+
+class ToolCallCoalescer:
+    """
+    把同一服务、同一工具的并发调用合并为一次批量调用
+
+    需要放在拦截器列表的第一位，合并后的调用会继续经过其余拦截器（例如常驻会话）。
+    工具加载完成后调用 register() 登记可合并的工具；未登记的工具、修改过请求头的调用直接放行。
+
+    :param window: 合并窗口（秒），已有同类调用在进行时，新到达的调用等待这么久再统一发出
+    :param max_batch_size: 单次批量调用的最大条数，达到后立即发出
+    """
+
+    def __init__(self, window: float = 0.005, max_batch_size: int = 100) -> None:
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._specs: Dict[str, BatchSpec] = {}
+        # 等待合并的调用
+        self._pending: Dict[GroupKey, List[Tuple[MCPToolCallRequest, Any]]] = {}
+        # 已发出、尚未完成的调用次数
+        self._in_flight: Dict[GroupKey, int] = {}
+        # 运行期间保持对后台任务的引用
+        self._tasks: set = set()
+        self.batches = 0  # 发出的批量调用次数
+        self.batched_calls = 0  # 经批量调用完成的单个调用数
+
+    def register(self, tools: Iterable[BaseTool]) -> None:
+        """登记可合并的工具"""
+        self._specs.update(find_batch_tools(tools))
+
+    async def __call__(self, request: MCPToolCallRequest, handler: Handler) -> Any:
+        spec = self._specs.get(request.name)
+        if spec is None or request.headers is not None or set(request.args) != {spec.arg}:
+            return await handler(request)
+
+        loop = asyncio.get_running_loop()
+        key = (loop, request.server_name, request.name, _session_id(request))
+        future = loop.create_future()
+        group = self._pending.get(key)
+        if group is None:
+            group = self._pending[key] = []
+            if self._in_flight.get(key):
+                loop.call_later(self.window, self._flush, key, spec, handler)
+            else:
+                # 空闲时不额外等待
+                loop.call_soon(self._flush, key, spec, handler)
+        group.append((request, future))
+        if len(group) >= self.max_batch_size:
+            self._flush(key, spec, handler)
+        return await future
+
+    def _flush(self, key: GroupKey, spec: BatchSpec, handler: Handler) -> None:
+        group = self._pending.pop(key, None)
+        if not group:
+            return
+        if len(group) == 1:
+            coroutine = self._run_single(*group[0], handler)
+        else:
+            coroutine = self._run_batch(group, spec, handler)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._finish(key))
+
+    def _finish(self, key: GroupKey) -> None:
+        self._in_flight[key] -= 1
+        if not self._in_flight[key]:
+            del self._in_flight[key]
+
+    async def _run_single(self, request: MCPToolCallRequest, future: Any, handler: Handler) -> None:
+        try:
+            result = await handler(request)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            if not future.done():
+                future.set_exception(exc)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_batch(
+        self, group: List[Tuple[MCPToolCallRequest, Any]], spec: BatchSpec, handler: Handler
+    ) -> None:
+        first = group[0][0]
+        batch_request = first.override(
+            name=spec.batch_name,
+            args={spec.batch_arg: [request.args[spec.arg] for request, _ in group]},
+        )
+        try:
+            items = _batch_items(await handler(batch_request), len(group))
+        except asyncio.CancelledError:
+            for _, future in group:
+                future.cancel()
+            raise
+        except Exception:
+            items = None
+
+        if items is None:
+            # 批量调用失败时逐个调用，避免影响本可以成功的调用
+            await asyncio.gather(
+                *(self._run_single(request, future, handler) for request, future in group)
+            )
+            return
+
+        self.batches += 1
+        self.batched_calls += len(group)
+        for (request, future), item in zip(group, items):
+            if not future.done():
+                future.set_result(_item_result(request.name, item))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+MCP 常驻会话
+
+MultiServerMCPClient.get_tools() 得到的工具每次调用都会新建会话，
+对 stdio 服务而言就是每次调用都重新启动一个子进程。
+本模块提供一个工具调用拦截器，让指定服务的调用复用常驻会话。
+"""
+
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+import anyio
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+
+# 说明连接本身已断开的异常；工具返回的错误（McpError 等）不影响会话，其他调用可以继续使用
+TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    EOFError,
+)
+
+
+class _SessionHolder:
+    """在独立任务中持有一个会话，保证会话的进入与退出发生在同一个任务里"""
+
+    def __init__(self, client: MultiServerMCPClient, server_name: str) -> None:
+        self._client = client
+        self._server_name = server_name
+        self._ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._hold())
+        self.users = 0  # 正在使用该会话的调用数
+        self.retired = False  # 连接已断开，不再分配给新的调用
+
+    async def _hold(self) -> None:
+        try:
+            async with self._client.session(self._server_name) as session:
+                self._ready.set_result(session)
+                await self._stop.wait()
+        except BaseException as exc:
+            if not self._ready.done():
+                self._ready.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+
+    @property
+    def alive(self) -> bool:
+        return not self._task.done()
+
+    async def get(self) -> Any:
+        return await asyncio.shield(self._ready)
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class PersistentSessionInterceptor:
+    """
+    让指定 MCP 服务的工具调用复用常驻会话
+
+    会话按事件循环分别维护：事件循环变化（例如先用 asyncio.run 预热，再交给 Gradio）
+    时会自动重新连接。会话断开后，下一次调用会重新建立连接。
+
+    :param connections: MCP 连接配置字典
+    :param servers: 需要复用会话的服务名称
+    """
+
+    def __init__(self, connections: Dict[str, Any], servers: Iterable[str]) -> None:
+        self._client = MultiServerMCPClient(connections)
+        self._servers = frozenset(servers)
+        # 事件循环 -> {服务名称: 会话}
+        self._holders: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def __call__(
+        self,
+        request: MCPToolCallRequest,
+        handler: Callable[[MCPToolCallRequest], Awaitable[Any]],
+    ) -> Any:
+        # 修改过请求头的调用需要新的连接，交给默认流程处理
+        if request.server_name not in self._servers or request.headers is not None:
+            return await handler(request)
+
+        holder = self._get_holder(request.server_name)
+        holder.users += 1
+        try:
+            session = await holder.get()
+            return await session.call_tool(request.name, request.args)
+        except TRANSPORT_ERRORS:
+            # 连接已断开：下一次调用重建会话，旧会话等其他调用结束后再关闭
+            self._retire(request.server_name, holder)
+            raise
+        finally:
+            holder.users -= 1
+            if holder.retired and not holder.users:
+                await holder.aclose()
+
+    def _get_holder(self, server_name: str) -> _SessionHolder:
+        holders = self._holders.setdefault(asyncio.get_running_loop(), {})
+        holder = holders.get(server_name)
+        if holder is None or not holder.alive:
+            holder = _SessionHolder(self._client, server_name)
+            holders[server_name] = holder
+        return holder
+
+    def _retire(self, server_name: str, holder: _SessionHolder) -> None:
+        holders = self._holders.get(asyncio.get_running_loop(), {})
+        if holders.get(server_name) is holder:
+            del holders[server_name]
+        holder.retired = True
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的全部常驻会话"""
+        holders = self._holders.pop(asyncio.get_running_loop(), {})
+        await asyncio.gather(*(holder.aclose() for holder in holders.values()))
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+"""
+MCP 工具列表缓存
+
+MultiServerMCPClient.get_tools() 要先连上每一个服务才能拿到工具定义，
+通过 npx 启动的 stdio 服务或远程 HTTP 服务往往要等上好几秒。
+本模块把每个服务的工具定义按连接配置的哈希缓存到磁盘：
+- 启动时直接用缓存的定义创建工具，不连接任何服务；连接在第一次调用工具时才建立
+- 没有缓存的服务并发连接，每个服务有各自的等待期限；超时的服务在后台继续连接，连上后再补充进来，
+  连接失败的服务不影响其他服务
+- 随后在后台重新获取工具列表，有变化时更新缓存，由调用方替换工具集
+
+缓存只保存工具定义（名称、描述、参数），不保存连接配置本身，配置中的密钥不会写入磁盘。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import Tool
+
+
+def config_hash(server_name: str, connection: Dict[str, Any]) -> str:
+    """服务名称与连接配置的哈希，配置变化后旧缓存自动失效"""
+    payload = json.dumps([server_name, connection], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dump(tools: Sequence[Tool]) -> List[dict]:
+    return [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+
+
+class MCPToolCache:
+    """
+    按服务缓存工具定义的 JSON 文件
+
+    :param path: 缓存文件路径，为 None 时只在内存中缓存
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._entries: Dict[str, dict] = {}
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                # 文件损坏时当作没有缓存
+                self._entries = {}
+
+    def get(self, server_name: str, connection: Dict[str, Any]) -> Optional[List[Tool]]:
+        """读取缓存的工具定义，没有时返回 None"""
+        entry = self._entries.get(config_hash(server_name, connection))
+        if entry is None:
+            return None
+        return [Tool.model_validate(tool) for tool in entry["tools"]]
+
+    def put(self, server_name: str, connection: Dict[str, Any], tools: Sequence[Tool]) -> None:
+        """写入工具定义，与已缓存的相同时不写文件"""
+        key = config_hash(server_name, connection)
+        dumped = _dump(tools)
+        old = self._entries.get(key)
+        if old is not None and old["tools"] == dumped:
+            return
+        self._entries[key] = {"server": server_name, "updated": time.time(), "tools": dumped}
+        self._save()
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再替换，避免进程中断时留下半个文件
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp, self._path)
+
+
+async def list_tools(client: MultiServerMCPClient, server_name: str) -> List[Tool]:
+    """连接服务并取回完整的工具定义列表"""
+    tools: List[Tool] = []
+    async with client.session(server_name) as session:
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+
+class MCPToolLoader:
+    """
+    先用缓存、后台刷新的 MCP 工具加载器
+
+    :param connections: MCP 连接配置字典
+    :param cache: 工具定义缓存
+    :param tool_interceptors: 工具调用拦截器
+    :param timeout: 启动时等待每个服务的时间（秒），为 None 时一直等待
+    :param server_timeouts: 按服务名称覆盖 timeout，例如通过 npx 启动的服务需要更久
+    :param fetch_timeout: 单次获取工具列表的时间上限（秒），包括在后台继续进行的获取
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, Any],
+        cache: MCPToolCache,
+        tool_interceptors: Optional[list] = None,
+        timeout: Optional[float] = None,
+        server_timeouts: Optional[Dict[str, float]] = None,
+        fetch_timeout: Optional[float] = None,
+    ) -> None:
+        self._connections = connections
+        self._cache = cache
+        self._interceptors = tool_interceptors or []
+        self._timeout = timeout
+        self._server_timeouts = server_timeouts or {}
+        self._fetch_timeout = fetch_timeout
+        self._client = MultiServerMCPClient(connections)
+        # 服务名称 -> 当前使用的工具定义
+        self._definitions: Dict[str, List[Tool]] = {}
+        # 定义来自缓存、尚未与服务核对过的服务
+        self._stale: set = set()
+        # 启动时超过等待期限、仍在后台获取的服务
+        self._late: Dict[str, asyncio.Future] = {}
+        # 最近一次获取失败的服务 -> 异常
+        self._failed: Dict[str, BaseException] = {}
+
+    @property
+    def cached_servers(self) -> List[str]:
+        """当前定义来自缓存、尚未与服务核对过的服务"""
+        return [name for name in self._connections if name in self._stale]
+
+    @property
+    def late_servers(self) -> List[str]:
+        """启动时未在期限内连上、仍在后台连接的服务"""
+        return [name for name in self._connections if name in self._late]
+
+    @property
+    def failed_servers(self) -> Dict[str, BaseException]:
+        """最近一次获取失败的服务及其异常"""
+        return dict(self._failed)
+
+    def _server_timeout(self, server_name: str) -> Optional[float]:
+        return self._server_timeouts.get(server_name, self._timeout)
+
+    async def _fetch(self, server_name: str) -> List[Tool]:
+        return await asyncio.wait_for(list_tools(self._client, server_name), self._fetch_timeout)
+
+    def _store(self, server_name: str, result: Any) -> bool:
+        """记录一次获取的结果，返回工具定义是否有变化"""
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            self._failed[server_name] = result
+            return False
+        self._failed.pop(server_name, None)
+        self._stale.discard(server_name)
+        self._cache.put(server_name, self._connections[server_name], result)
+        if server_name in self._definitions and _dump(result) == _dump(
+            self._definitions[server_name]
+        ):
+            return False
+        self._definitions[server_name] = result
+        return True
+
+    async def load(self) -> List[BaseTool]:
+        """
+        创建全部工具
+
+        有缓存的服务直接使用缓存，不建立连接；没有缓存的服务并发获取并写入缓存。
+        每个服务最多等到各自的期限，用时取决于期限内能连上的服务中最慢的一个；
+        超过期限的服务留在后台继续获取（见 attach_late），失败的服务记入 failed_servers。
+        """
+        self._stale.clear()
+        missing = []
+        for name, connection in self._connections.items():
+            cached = self._cache.get(name, connection)
+            if cached is None:
+                missing.append(name)
+            else:
+                self._definitions[name] = cached
+                self._stale.add(name)
+
+        tasks = {name: asyncio.ensure_future(self._fetch(name)) for name in missing}
+        start = time.monotonic()
+        # 按期限从短到长依次等待，各服务的期限都从同一时刻算起
+        for name in sorted(tasks, key=lambda n: self._server_timeout(n) or float("inf")):
+            timeout = self._server_timeout(name)
+            remaining = None if timeout is None else start + timeout - time.monotonic()
+            if remaining is None or remaining > 0:
+                await asyncio.wait({tasks[name]}, timeout=remaining)
+
+        for name, task in tasks.items():
+            if task.done():
+                self._store(name, task.exception() or task.result())
+            else:
+                self._late[name] = task
+        return self.build()
+
+    async def attach_late(self) -> Optional[List[BaseTool]]:
+        """
+        等待启动时超过期限的服务
+
+        有服务连上时返回新的工具集，否则返回 None。
+        任务随创建它的事件循环结束而被取消时，在当前事件循环中重新获取。
+        """
+        names = list(self._late)
+        futures = [
+            asyncio.ensure_future(self._fetch(name)) if self._late[name].cancelled() else task
+            for name, task in self._late.items()
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        self._late.clear()
+        changed = [self._store(name, result) for name, result in zip(names, results)]
+        return self.build() if any(changed) else None
+
+    async def refresh(self) -> Optional[List[BaseTool]]:
+        """
+        重新获取全部服务的工具列表并更新缓存
+
+        有服务的工具发生变化时返回新的工具集，否则返回 None。
+        获取失败的服务沿用之前的定义，异常不会抛出，记入 failed_servers。
+        仍在后台获取的服务（见 attach_late）不重复获取。
+        """
+        names = [name for name in self._connections if name not in self._late]
+        results = await asyncio.gather(
+            *(self._fetch(name) for name in names), return_exceptions=True
+        )
+        changed = [self._store(name, result) for name, result in zip(names, results)]
+        return self.build() if any(changed) else None
+
+    def build(self) -> List[BaseTool]:
+        """用当前的工具定义创建 LangChain 工具，调用时才连接服务"""
+        return [
+            convert_mcp_tool_to_langchain_tool(
+                None,
+                tool,
+                connection=self._connections[name],
+                tool_interceptors=self._interceptors,
+                server_name=name,
+            )
+            for name in self._connections
+            for tool in self._definitions.get(name, [])
+        ]
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+模型调用并发限制
+
+编译好的 Agent 不保存单次请求的状态，所有会话共用同一个 Agent，
+真正需要限流的是共享的模型服务（连接数、供应商的并发配额）：
+- 同时进行的模型调用不超过 limit，其余调用按到达顺序排队（有界并发）
+- 排队人数达到上限时直接拒绝，不再无限堆积（背压）
+- 记录排队深度与等待耗时，便于观察负载
+
+只在模型调用期间占用名额，工具执行、流式输出等不受限制。
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Optional
+
+
+class ModelBusyError(RuntimeError):
+    """排队已满或等待超时"""
+
+
+@dataclass(frozen=True)
+class LimiterStats:
+    """模型调用限流的运行指标快照"""
+
+    limit: int
+    in_flight: int
+    waiting: int
+    peak_waiting: int
+    acquired: int
+    rejected: int
+    total_wait: float
+    max_wait: float
+
+    @property
+    def avg_wait(self) -> float:
+        """平均等待耗时（秒）"""
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+
+class ModelCallLimiter:
+    """
+    公平的模型调用并发限制
+
+    :param limit: 同时进行的模型调用数上限
+    :param max_waiting: 排队上限，超过后立即抛出 ModelBusyError
+    :param acquire_timeout: 排队等待超时（秒），None 表示一直等待
+    """
+
+    def __init__(
+        self,
+        limit: int = 32,
+        max_waiting: int = 256,
+        acquire_timeout: Optional[float] = 60.0,
+    ) -> None:
+        if limit < 1:
+            raise ValueError("limit 至少为 1")
+        self._limit = limit
+        self._max_waiting = max_waiting
+        self._acquire_timeout = acquire_timeout
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self._acquired = 0
+        self._rejected = 0
+        self._peak_waiting = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    # ── 占用与释放 ────────────────────────────────────────────────────────────
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """占用一个调用名额，退出上下文时自动释放"""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        start = time.perf_counter()
+
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+        else:
+            if len(self._waiters) >= self._max_waiting:
+                self._rejected += 1
+                raise ModelBusyError(f"排队人数已达上限 {self._max_waiting}")
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._peak_waiting = max(self._peak_waiting, len(self._waiters))
+            try:
+                # 名额由 _release 直接转交，in_flight 已经计入
+                await asyncio.wait_for(waiter, self._acquire_timeout)
+            except asyncio.TimeoutError:
+                self._rejected += 1
+                raise ModelBusyError(f"等待模型调用超时（{self._acquire_timeout}s）") from None
+            except BaseException:
+                # 已分配到名额但调用方被取消时，把名额交给下一位
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        waited = time.perf_counter() - start
+        self._acquired += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def _release(self) -> None:
+        # 优先直接交给排队中的调用，避免被新来的请求插队
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    # ── 指标 ──────────────────────────────────────────────────────────────────
+
+    def stats(self) -> LimiterStats:
+        """获取当前运行指标"""
+        return LimiterStats(
+            limit=self._limit,
+            in_flight=self._in_flight,
+            waiting=len(self._waiters),
+            peak_waiting=self._peak_waiting,
+            acquired=self._acquired,
+            rejected=self._rejected,
+            total_wait=self._total_wait,
+            max_wait=self._max_wait,
+        )
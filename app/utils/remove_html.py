@@ -6,20 +6,32 @@
 - 删除工具块的 HTML，但保留 <pre> 内的工具输出，并替换为明确标签：
   - 默认：```tool_return\n...\n```（工具名省略）
   - include_tool_name=True 时：```tool_return name="..."\n...\n```（name 来自 <code>）
+
+实现为对 <details> 结构的单次线性扫描，片段拼接一次完成，
+多 MB 的工具输出也不会产生多轮整串替换的中间副本。
+<details> 嵌套或残缺时，单次扫描与逐类替换的结果可能不同，此时退回逐类替换，
+保证任意输入的清洗结果都与逐类替换一致。
+
+多轮对话中历史消息不会变化，可使用 get_cleaned_text_cached 按内容缓存清洗结果。
 """
 
+import functools
+import hashlib
 import html
 import re
-from typing import Final
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Final, Iterable, Iterator, List, Optional, Tuple
 
 
-def _compile_details_block_re(details_class: str) -> re.Pattern[str]:
-    safe = re.escape(details_class)
-    return re.compile(
-        rf'<details\s+class="{safe}"[\s\S]*?</details>\s*',
-        re.IGNORECASE,
-    )
+_OPEN_DETAILS_RE: Final[re.Pattern[str]] = re.compile(
+    r'<details\s+class="(?P<cls>[^"]*)"',
+    re.IGNORECASE,
+)
+
+_CLOSE_DETAILS_RE: Final[re.Pattern[str]] = re.compile(r"</details>", re.IGNORECASE)
 
+_DETAILS_TAG_RE: Final[re.Pattern[str]] = re.compile(r"<details", re.IGNORECASE)
 
 _CODE_TAG_RE: Final[re.Pattern[str]] = re.compile(
     r"<code[^>]*>(?P<code>[\s\S]*?)</code>",
@@ -31,8 +43,166 @@ _PRE_TAG_RE: Final[re.Pattern[str]] = re.compile(
     re.IGNORECASE,
 )
 
+_TRAILING_SPACE_RE: Final[re.Pattern[str]] = re.compile(r"\s*")
 _MULTI_BLANK_LINES_RE: Final[re.Pattern[str]] = re.compile(r"\n{3,}")
-_BACKTICKS_RE: Final[re.Pattern[str]] = re.compile(r"`+")
+
+# 块类型：None 表示整块删除
+_THINK: Final = None
+_TOOL_RETURN: Final = "tool_return"
+_TOOL_CALL: Final = "tool_call"
+
+# 删除思维链块后，前面至多这么多个字符可能与后文拼成新的标签（"</details" 的长度）
+_JOIN_WINDOW: Final = 9
+
+
+def _fence_for(text: str) -> str:
+    """返回比正文中最长的连续反引号更长的围栏（至少三个）"""
+    fence = "```"
+    while fence in text:
+        fence += "`"
+    return fence
+
+
+def _render_block(text: str, start: int, end: int, kind: str, include_tool_name: bool) -> str:
+    """将 text[start:end] 的工具块渲染为代码围栏，不复制整个块"""
+    tool_name = ""
+    m_code = _CODE_TAG_RE.search(text, start, end)
+    if m_code:
+        tool_name = html.unescape(m_code.group("code")).strip()
+
+    tool_output = ""
+    m_pre = _PRE_TAG_RE.search(text, start, end)
+    if m_pre:
+        tool_output = html.unescape(m_pre.group("pre")).strip()
+
+    if include_tool_name and tool_name:
+        info = '{} name="{}"'.format(kind, tool_name)
+    else:
+        info = kind
+    fence = _fence_for(tool_output)
+    return f"\n\n{fence}{info}\n{tool_output}\n{fence}\n\n"
+
+
+def _details_kinds(
+    think_details_class: str, tool_details_class: str, tool_call_details_class: str
+) -> List[Tuple[str, Optional[str]]]:
+    """按逐类替换的顺序列出 (class, 块类型)"""
+    return [
+        (think_details_class, _THINK),
+        (tool_details_class, _TOOL_RETURN),
+        (tool_call_details_class, _TOOL_CALL),
+    ]
+
+
+@functools.lru_cache(maxsize=32)
+def _details_block_re(details_class: str) -> re.Pattern[str]:
+    return re.compile(
+        rf'<details\s+class="{re.escape(details_class)}"[\s\S]*?</details>\s*',
+        re.IGNORECASE,
+    )
+
+
+def _replace_by_class(
+    text: str, kinds: List[Tuple[str, Optional[str]]], include_tool_name: bool
+) -> str:
+    """逐类整串替换：先删思维链块，再替换工具结果块，最后替换工具调用块"""
+    for details_class, kind in kinds:
+        pattern = _details_block_re(details_class)
+        if kind is None:
+            text = pattern.sub("", text)
+        else:
+            text = pattern.sub(
+                lambda m, kind=kind: _render_block(
+                    m.string, m.start(), m.end(), kind, include_tool_name
+                ),
+                text,
+            )
+    return text
+
+
+def _scan_blocks(
+    text: str, kinds: Dict[str, Optional[str]], include_tool_name: bool
+) -> Optional[List[Tuple[int, int, str]]]:
+    """
+    单次扫描出所有块，返回 (起点, 终点, 替换内容) 列表。
+
+    只有在每个 <details 都是一个完整、互不嵌套的待处理块时，单次扫描才与逐类替换等价；
+    否则返回 None：
+    - 块内出现其他 <details，或 <details 无法识别、缺少闭合标签
+    - 删除思维链块后，前后文字可能拼成新的标签
+    - 工具结果的输出经反转义后含有 <details，逐类替换时会被下一轮再次处理
+    """
+    blocks = []
+    pos = 0
+    for m_tag in _DETAILS_TAG_RE.finditer(text):
+        if m_tag.start() < pos:
+            return None
+        m_open = _OPEN_DETAILS_RE.match(text, m_tag.start())
+        if m_open is None or m_open.group("cls").lower() not in kinds:
+            return None
+        m_close = _CLOSE_DETAILS_RE.search(text, m_open.end())
+        if m_close is None:
+            return None
+
+        kind = kinds[m_open.group("cls").lower()]
+        if kind is None:
+            if "<" in text[max(0, m_open.start() - _JOIN_WINDOW) : m_open.start()]:
+                return None
+            rendered = ""
+        else:
+            rendered = _render_block(text, m_open.start(), m_close.end(), kind, include_tool_name)
+            if kind == _TOOL_RETURN and _DETAILS_TAG_RE.search(rendered):
+                return None
+
+        pos = _TRAILING_SPACE_RE.match(text, m_close.end()).end()
+        blocks.append((m_open.start(), pos, rendered))
+    return blocks
+
+
+def iter_cleaned_segments(
+    text: str,
+    *,
+    think_details_class: str = "think-result-details",
+    tool_details_class: str = "tool-result-details",
+    tool_call_details_class: str = "tool-call-details",
+    include_tool_name: bool = True,
+) -> Iterator[str]:
+    """
+    单次线性扫描 text，依次产出清洗后的片段。
+
+    片段直接拼接即为清洗结果（尚未合并空行）。扫描只前进、不回溯，
+    <details> 块之外的正文按原样切片输出。<details> 嵌套或残缺时，
+    整段按逐类替换清洗后作为一个片段产出。
+    """
+    ordered = _details_kinds(think_details_class, tool_details_class, tool_call_details_class)
+    kinds: Dict[str, Optional[str]] = {}
+    for details_class, kind in ordered:
+        # 多个参数取同一 class 时，与逐类替换一样由先处理的类型生效
+        kinds.setdefault(details_class.lower(), kind)
+
+    blocks = _scan_blocks(text, kinds, include_tool_name)
+    if blocks is None:
+        yield _replace_by_class(text, ordered, include_tool_name)
+        return
+
+    pos = 0
+    for start, end, rendered in blocks:
+        if start > pos:
+            yield text[pos:start]
+        if rendered:
+            yield rendered
+        pos = end
+
+    if pos < len(text):
+        yield text[pos:]
+
+
+def _normalize(text: str, decode_escaped_newlines: bool) -> str:
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if decode_escaped_newlines and "\\n" in text:
+        text = text.replace("\\n", "\n")
+    return text
 
 
 def get_cleaned_text(
@@ -47,48 +217,108 @@ def get_cleaned_text(
     if not text:
         return ""
 
-    normalized = text.replace("\r\n", "\n").replace("\r", "\n")
-    if decode_escaped_newlines:
-        normalized = normalized.replace("\\n", "\n")
+    replaced = "".join(
+        iter_cleaned_segments(
+            _normalize(text, decode_escaped_newlines),
+            think_details_class=think_details_class,
+            tool_details_class=tool_details_class,
+            tool_call_details_class=tool_call_details_class,
+            include_tool_name=include_tool_name,
+        )
+    )
 
-    think_details_re = _compile_details_block_re(think_details_class)
-    tool_details_re = _compile_details_block_re(tool_details_class)
-    tool_call_details_re = _compile_details_block_re(tool_call_details_class)
+    if "\n\n\n" in replaced:
+        replaced = _MULTI_BLANK_LINES_RE.sub("\n\n", replaced)
+    return replaced.strip()
 
-    without_think = think_details_re.sub("", normalized)
 
-    def _fence_for(text: str) -> str:
-        max_run = 0
-        for m in _BACKTICKS_RE.finditer(text):
-            max_run = max(max_run, len(m.group(0)))
-        return "`" * max(3, max_run + 1)
+def iter_cleaned_texts(texts: Iterable[str], **kwargs: Any) -> Iterator[str]:
+    """
+    逐条清洗一段历史消息，按需产出结果。
 
-    def _replace_details_block(match: re.Match[str], *, kind: str) -> str:
-        block = match.group(0)
+    适合在清洗超长历史时分批处理，每产出一条即可让出控制权。
+    参数与 get_cleaned_text 相同。
+    """
+    for text in texts:
+        yield get_cleaned_text(text, **kwargs)
 
-        tool_name = ""
-        m_code = _CODE_TAG_RE.search(block)
-        if m_code:
-            tool_name = html.unescape(m_code.group("code")).strip()
 
-        tool_output = ""
-        m_pre = _PRE_TAG_RE.search(block)
-        if m_pre:
-            tool_output = html.unescape(m_pre.group("pre")).strip()
+class CleanedTextCache:
+    """
+    按内容寻址的清洗结果缓存（LRU）
 
-        if include_tool_name and tool_name:
-            info = '{} name="{}"'.format(kind, tool_name)
-        else:
-            info = kind
-        fence = _fence_for(tool_output)
-        return f"\n\n{fence}{info}\n{tool_output}\n{fence}\n\n"
+    键为原文的摘要，避免长期持有体积较大的原始 HTML。线程安全。
+    缓存同时受条目数与清洗结果的总字符数限制；超长的原文（例如整页的工具输出）不缓存，
+    避免少数几条大结果占满内存。
+
+    :param maxsize: 最多缓存的条目数
+    :param max_chars: 缓存的清洗结果的总字符数上限
+    :param max_item_chars: 原文超过该字符数时不缓存，每次重新清洗
+    """
+
+    def __init__(
+        self, maxsize: int = 2048, max_chars: int = 16_000_000, max_item_chars: int = 1_000_000
+    ) -> None:
+        self.maxsize = maxsize
+        self.max_chars = max_chars
+        self.max_item_chars = max_item_chars
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[bytes, str] = OrderedDict()
+        self._chars = 0  # 已缓存的清洗结果的总字符数
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, text: str) -> str:
+        """获取清洗结果，未命中时清洗并写入缓存"""
+        if len(text) > self.max_item_chars:
+            with self._lock:
+                self.misses += 1
+            return get_cleaned_text(text)
+
+        key = self._key(text)
+        with self._lock:
+            cleaned = self._data.get(key)
+            if cleaned is not None:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return cleaned
+            self.misses += 1
+
+        # 清洗耗时较长，不在锁内进行
+        cleaned = get_cleaned_text(text)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._data[key] = cleaned
+            self._chars += len(cleaned)
+            while self._data and (len(self._data) > self.maxsize or self._chars > self.max_chars):
+                self._chars -= len(self._data.popitem(last=False)[1])
+        return cleaned
+
+    @property
+    def chars(self) -> int:
+        """已缓存的清洗结果的总字符数"""
+        return self._chars
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._chars = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_default_cache = CleanedTextCache()
 
-    replaced = tool_details_re.sub(
-        lambda m: _replace_details_block(m, kind="tool_return"), without_think
-    )
-    replaced = tool_call_details_re.sub(
-        lambda m: _replace_details_block(m, kind="tool_call"), replaced
-    )
 
-    cleaned = _MULTI_BLANK_LINES_RE.sub("\n\n", replaced)
-    return cleaned.strip()
+def get_cleaned_text_cached(text: str) -> str:
+    """与 get_cleaned_text 的默认参数一致，但会复用已清洗过的内容"""
+    return _default_cache.get(text)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+搜索结果缓存
+
+相同或仅有大小写、空白、结尾标点差异的查询，在有效期内直接返回缓存结果，不再调用搜索模型。
+- 一级：进程内 LRU
+- 二级（可选）：SQLite 文件，进程重启后仍可命中
+- 过期但仍在宽限期内的结果先返回，同时在后台刷新（stale-while-revalidate）
+"""
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " ?？!！。.,，;；、~～"
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询文本：全角转半角、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+class _Entry(NamedTuple):
+    value: str
+    created: float  # 写入时间
+    cost: float  # 获取该结果的耗时（秒）
+
+
+@dataclass(frozen=True)
+class SearchCacheStats:
+    """缓存指标快照"""
+
+    hits: int = 0  # 命中有效结果（含二级缓存）
+    stale_hits: int = 0  # 命中过期结果并在后台刷新
+    disk_hits: int = 0  # 其中来自二级缓存的次数
+    misses: int = 0
+    coalesced: int = 0  # 未命中但合并到进行中的相同查询，不计入命中
+    refreshes: int = 0  # 后台刷新次数
+    errors: int = 0  # 获取结果失败的次数（失败结果不缓存）
+    saved_time: float = 0.0  # 命中省下的获取耗时（秒）
+
+    @property
+    def saved_calls(self) -> int:
+        """省下的搜索调用次数"""
+        return self.hits + self.stale_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.saved_calls + self.misses
+        return self.saved_calls / total if total else 0.0
+
+
+class SearchCache:
+    """
+    搜索结果缓存，线程安全
+
+    :param maxsize: 进程内最多缓存的条目数
+    :param ttl: 结果的有效期（秒）
+    :param stale_ttl: 过期后的宽限期（秒），宽限期内先返回旧结果再后台刷新
+    :param path: SQLite 文件路径，为 None 时不使用二级缓存
+    :param clock: 时间函数，便于测试
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 600.0,
+        stale_ttl: float = 3600.0,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._data: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts: Dict[str, float] = dict.fromkeys(SearchCacheStats.__dataclass_fields__, 0)
+        # 正在获取中的键 -> 获取任务，合并并发的相同查询
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 获取任务 -> 仍在等待它的调用方数量
+        self._waiting: Dict[asyncio.Task, int] = {}
+        self._refreshing: set = set()
+        self._tasks: set = set()
+        # 二级缓存的连接可能在线程中写入，读写都需持有该锁
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache "
+                "(key TEXT PRIMARY KEY, value TEXT, created REAL, cost REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(namespace: str, query: str) -> str:
+        """缓存键：命名空间（工具与模型）加归一化后的查询"""
+        raw = f"{namespace}\0{normalize_query(query)}".encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    # ── 读写 ──────────────────────────────────────────────────────────────────
+
+    def _count(self, **delta: float) -> None:
+        for name, value in delta.items():
+            self._counts[name] += value
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self._clock() - entry.created >= self.ttl + self.stale_ttl
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        """在进程内缓存中查找未超出宽限期的条目（调用方持有锁，不读磁盘）"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _load(self, key: str) -> Optional[_Entry]:
+        """从二级缓存读取条目（会阻塞，不持有 self._lock，异步接口在线程中调用）"""
+        if self._db is None:
+            return None
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, created, cost FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return _Entry(*row) if row is not None else None
+
+    def _accept(self, key: str, entry: Optional[_Entry]) -> Optional[_Entry]:
+        """把二级缓存中读到的条目放入进程内缓存（调用方持有锁）"""
+        # 读磁盘期间其他调用可能已写入更新的结果
+        current = self._lookup(key)
+        if current is not None:
+            return current
+        # 二级缓存中的旧行在重新获取后被覆盖，这里不必删除
+        if entry is None or self._expired(entry):
+            return None
+        self._count(disk_hits=1)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _store(self, key: str, value: str, cost: float) -> _Entry:
+        """写入进程内缓存，返回写入的条目"""
+        entry = _Entry(value, self._clock(), cost)
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def _persist(self, key: str, entry: _Entry) -> None:
+        """写入二级缓存（会阻塞，异步接口在线程中调用）"""
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?)", (key, *entry)
+            )
+            self._db.commit()
+
+    def _is_fresh(self, entry: _Entry) -> bool:
+        return self._clock() - entry.created < self.ttl
+
+    # ── 同步接口 ──────────────────────────────────────────────────────────────
+
+    def get(self, namespace: str, query: str, fetch: Callable[[], str]) -> str:
+        """
+        获取结果，未命中时调用 fetch 并写入缓存
+
+        同步接口不做后台刷新：过期结果视为未命中。fetch 抛出的异常会原样抛出，且不会被缓存。
+        """
+        key = self.key(namespace, query)
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is None and self._db is not None:
+            loaded = self._load(key)
+            with self._lock:
+                entry = self._accept(key, loaded)
+        with self._lock:
+            if entry is not None and self._is_fresh(entry):
+                self._count(hits=1, saved_time=entry.cost)
+                return entry.value
+            self._count(misses=1)
+        return self._fetch(key, fetch)
+
+    def _fetch(self, key: str, fetch: Callable[[], str]) -> str:
+        start = time.perf_counter()
+        try:
+            value = fetch()
+        except BaseException:
+            with self._lock:
+                self._count(errors=1)
+            raise
+        self._persist(key, self._store(key, value, time.perf_counter() - start))
+        return value
+
+    # ── 异步接口 ──────────────────────────────────────────────────────────────
+
+    async def aget(self, namespace: str, query: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        """
+        获取结果，未命中时调用 fetch 并写入缓存
+
+        - 同一时刻的相同查询只会调用一次 fetch：fetch 在独立的任务中运行，
+          某个调用方被取消不影响其他调用方；所有调用方都取消后才取消 fetch
+        - 宽限期内的过期结果直接返回，并在后台调用 fetch 刷新
+        """
+        key = self.key(namespace, query)
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is None and self._db is not None and key not in self._inflight:
+            # 二级缓存在线程中读取，不在事件循环中等待磁盘
+            loaded = await asyncio.to_thread(self._load, key)
+            with self._lock:
+                entry = self._accept(key, loaded)
+        with self._lock:
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self._count(hits=1, saved_time=entry.cost)
+                    return entry.value
+                self._count(stale_hits=1, saved_time=entry.cost)
+                self._schedule_refresh(key, fetch)
+                return entry.value
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            with self._lock:
+                self._count(coalesced=1)
+        else:
+            with self._lock:
+                self._count(misses=1)
+            task = loop.create_task(self._afetch(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await self._join(task)
+
+    async def _join(self, task: asyncio.Task) -> str:
+        """等待获取任务；调用方被取消时只取消自己的等待"""
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+                if not task.done():
+                    # 所有调用方都已取消，不再需要这次获取
+                    task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _afetch(self, key: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        start = time.perf_counter()
+        try:
+            value = await fetch()
+        except BaseException:
+            with self._lock:
+                self._count(errors=1)
+            raise
+        entry = self._store(key, value, time.perf_counter() - start)
+        if self._db is not None:
+            # 提交会等待磁盘写入，不在事件循环中进行
+            await asyncio.to_thread(self._persist, key, entry)
+        return value
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[str]]) -> None:
+        """后台刷新过期条目（调用方持有锁），同一个键同时只刷新一次"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._count(refreshes=1)
+
+        async def refresh() -> None:
+            try:
+                await self._afetch(key, fetch)
+            except Exception:
+                pass  # 刷新失败时保留旧结果，下次命中时再试
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        # 持有任务引用，避免被提前回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ── 其它 ──────────────────────────────────────────────────────────────────
+
+    def stats(self) -> SearchCacheStats:
+        with self._lock:
+            counts = dict(self._counts)
+        for name in (
+            "hits",
+            "stale_hits",
+            "disk_hits",
+            "misses",
+            "coalesced",
+            "refreshes",
+            "errors",
+        ):
+            counts[name] = int(counts[name])
+        return SearchCacheStats(**counts)
+
+    def clear(self) -> None:
+        """清空缓存与计数（包括二级缓存）"""
+        with self._lock:
+            self._data.clear()
+            self._counts = dict.fromkeys(self._counts, 0)
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM search_cache")
+                    self._db.commit()
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+流式输出合并
+
+模型每产生一个 token 就刷新一次界面时，Gradio 需要对整段对话重新序列化并计算差异。
+StreamBuffer 先把片段攒起来，达到时间窗口或字节上限时再一次性追加到消息中。
+模型停顿时下一个片段迟迟不到，with_flush_ticks 在时间窗口到期时产出一次 None，
+调用方借此刷新已攒下的内容，而不必等到下一个片段。
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StreamBuffer:
+    """
+    按时间窗口或字节数合并流式片段
+
+    :param message: 需要追加内容的消息，形如 {"role": ..., "content": ...}
+    :param interval: 时间窗口（秒），从第一个未刷新的片段开始计时
+    :param max_bytes: 未刷新内容达到该字节数（UTF-8）时立即刷新
+    :param clock: 计时函数，便于测试
+    """
+
+    def __init__(
+        self,
+        message: Dict[str, str],
+        interval: float = 0.03,
+        max_bytes: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.message = message
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._pending_since: Optional[float] = None
+
+    @property
+    def pending(self) -> bool:
+        """是否有未刷新的内容"""
+        return bool(self._pending)
+
+    def append(self, text: str) -> None:
+        """追加片段（暂不写入消息）"""
+        if not text:
+            return
+        if self._pending_since is None:
+            self._pending_since = self._clock()
+        self._pending.append(text)
+        self._pending_bytes += len(text.encode("utf-8"))
+
+    def due(self) -> bool:
+        """是否已达到刷新条件"""
+        if not self._pending:
+            return False
+        return (
+            self._pending_bytes >= self.max_bytes
+            or self._clock() - self._pending_since >= self.interval
+        )
+
+    def remaining(self) -> Optional[float]:
+        """距离时间窗口到期的秒数；没有未刷新的内容时返回 None"""
+        if not self._pending:
+            return None
+        return max(0.0, self._pending_since + self.interval - self._clock())
+
+    def flush(self) -> str:
+        """把未刷新的内容追加到消息中，返回本次追加的增量（无内容时为空串）"""
+        if not self._pending:
+            return ""
+        delta = "".join(self._pending)
+        self.message["content"] += delta
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._pending_since = None
+        return delta
+
+
+async def with_flush_ticks(
+    events: AsyncIterator[T], remaining: Callable[[], Optional[float]]
+) -> AsyncIterator[Optional[T]]:
+    """
+    逐个产出 events 中的事件；在 remaining() 秒内没有新事件时先产出一次 None
+
+    等待下一个事件的任务在超时后继续保留，不会被取消，事件不会丢失。
+
+    :param events: 原始事件流
+    :param remaining: 返回本次最多等待的秒数，None 表示一直等待（如 StreamBuffer.remaining）
+    """
+    iterator = events.__aiter__()
+    next_event: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+            timeout = remaining()
+            if timeout is not None and not next_event.done():
+                await asyncio.wait((next_event,), timeout=timeout)
+                if not next_event.done():
+                    yield None
+                    continue
+            try:
+                event = await next_event
+            except StopAsyncIteration:
+                return
+            finally:
+                next_event = None
+            yield event
+    finally:
+        if next_event is not None:
+            next_event.cancel()
@@ -7,9 +7,15 @@ Gradio 聊天界面
 """
 
 import gradio as gr
+import logging
 import random
 import time
 import os
+import secrets
+import uuid
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
 
 
 # 模拟大语言模型生成回复
@@ -375,8 +381,92 @@ def _stop_generation(history):
     return send_update, stop_update, _clear_active_typing_indicator(history)
 
 
-def create_ui(llm_func, tab_name, main_title, initial_message=None):
-    """创建聊天界面"""
+def _stop_thread_generation(history):
+    """会话模式下的中止：对话历史同时写入 chatbot 与服务端保存的历史"""
+    send_update, stop_update, history = _stop_generation(history)
+    return send_update, stop_update, history, history
+
+
+def _refresh_initial_message(initial_message, is_ready, copies=1):
+    """
+    返回定时器回调：就绪后用新的开场消息替换第一条消息，并停止定时器
+
+    copies 为对话历史输出的个数（会话模式下同时输出到 chatbot 与服务端保存的历史）
+    """
+
+    def refresh(history):
+        if not is_ready():
+            return (gr.skip(),) * (copies + 1)
+        greeting = initial_message()
+        if history and greeting and history[0] != greeting[0]:
+            history = [greeting[0], *history[1:]]
+        else:
+            history = gr.skip()
+        return (*(history,) * copies, gr.Timer(active=False))
+
+    return refresh
+
+
+# 浏览器中保存会话 ID 的键与加密密钥
+THREAD_STORAGE_KEY = "agent-thread-id"
+
+
+@lru_cache(maxsize=1)
+def thread_secret() -> str:
+    """
+    读取 GRADIO_THREAD_SECRET；未设置时随机生成，同一进程内保持不变
+
+    在创建会话模式的界面时才读取，导入本模块没有副作用。随机密钥在重启后会变化，
+    浏览器中保存的会话 ID 将无法读取，需要跨重启恢复会话时应设置该变量。
+    """
+    secret = os.getenv("GRADIO_THREAD_SECRET")
+    if secret:
+        return secret
+    logger.warning("未设置 GRADIO_THREAD_SECRET，使用随机密钥，重启后浏览器中的会话将无法恢复")
+    return secrets.token_hex(32)
+
+
+def _restore_thread(load_thread, initial_message):
+    """返回页面加载回调：按浏览器中保存的会话 ID 恢复对话，没有时新建会话"""
+
+    async def restore(thread_id):
+        history = list((initial_message() if callable(initial_message) else initial_message) or [])
+        if thread_id:
+            try:
+                history += await load_thread(thread_id)
+            except Exception as exc:
+                print(f"恢复会话失败，开始新的会话: {exc}")
+                thread_id = ""
+        return history, history, thread_id or uuid.uuid4().hex
+
+    return restore
+
+
+def _bind_thread(llm_func):
+    """会话模式下的 llm_func 包装：对话历史同时写入 chatbot 与服务端保存的历史"""
+
+    async def respond(message, history, thread_id):
+        async for text, updated in llm_func(message, history, thread_id):
+            yield text, updated, updated
+
+    return respond
+
+
+def create_ui(
+    llm_func, tab_name, main_title, initial_message=None, is_ready=None, load_thread=None
+):
+    """
+    创建聊天界面
+
+    initial_message 可以是返回消息列表的函数，每次打开页面时调用。
+    同时传入 is_ready 时，页面每秒检查一次，就绪后重新生成并替换第一条消息。
+
+    传入 load_thread 时使用会话模式：会话 ID 保存在浏览器中，对话历史保存在服务端，
+    每轮只发送新消息与会话 ID，不再上传完整的对话历史。此时 llm_func 是签名为
+    (message, history, thread_id) 的异步生成器，load_thread 是按会话 ID 返回对话历史的协程函数，
+    页面加载时用它恢复对话。
+    """
+    threaded = load_thread is not None
     with gr.Blocks(title=tab_name, fill_width=True) as ui:
         # 标题区域
         gr.Markdown(
@@ -406,6 +496,30 @@ def create_ui(llm_func, tab_name, main_title, initial_message=None):
             buttons=[],  # 禁用右上角的所有按钮（分享、复制、清空等）
         )
 
+        if threaded:
+            # 服务端保存的对话历史，不随请求上传
+            history_state = gr.State([])
+            thread_id = gr.BrowserState("", storage_key=THREAD_STORAGE_KEY, secret=thread_secret())
+            ui.load(
+                _restore_thread(load_thread, initial_message),
+                [thread_id],
+                [chatbot, history_state, thread_id],
+                show_progress="hidden",
+            )
+            history_input, history_outputs = history_state, [chatbot, history_state]
+        else:
+            history_input, history_outputs = chatbot, [chatbot]
+
+        if callable(initial_message) and is_ready is not None:
+            timer = gr.Timer(1.0)
+            timer.tick(
+                _refresh_initial_message(initial_message, is_ready, copies=len(history_outputs)),
+                [history_input],
+                [*history_outputs, timer],
+                queue=False,
+                show_progress="hidden",
+            )
+
         # 输入区域
         with gr.Row(elem_classes=["input-row", "dark"]):
             msg = gr.Textbox(
@@ -422,6 +536,16 @@ def create_ui(llm_func, tab_name, main_title, initial_message=None):
                 elem_classes=["button", "stop-button"],
             )
 
+        if threaded:
+            generate = _bind_thread(llm_func)
+            generation_inputs = [msg, history_state, thread_id]
+            stop_func = _stop_thread_generation
+        else:
+            generate = llm_func
+            generation_inputs = [msg, chatbot]
+            stop_func = _stop_generation
+        generation_outputs = [msg, *history_outputs]
+
         enter_start = msg.submit(
             _show_stop_button,
             None,
@@ -429,7 +553,7 @@ def create_ui(llm_func, tab_name, main_title, initial_message=None):
             queue=False,
             show_progress="hidden",
         )
-        enter_generation = enter_start.then(llm_func, [msg, chatbot], [msg, chatbot])
+        enter_generation = enter_start.then(generate, generation_inputs, generation_outputs)
         enter_generation.then(
             _show_send_button,
             None,
@@ -445,7 +569,7 @@ def create_ui(llm_func, tab_name, main_title, initial_message=None):
             queue=False,
             show_progress="hidden",
         )
-        click_generation = click_start.then(llm_func, [msg, chatbot], [msg, chatbot])
+        click_generation = click_start.then(generate, generation_inputs, generation_outputs)
         click_generation.then(
             _show_send_button,
             None,
@@ -455,9 +579,9 @@ def create_ui(llm_func, tab_name, main_title, initial_message=None):
         )
 
         stop_btn.click(
-            _stop_generation,
-            [chatbot],
-            [submit_btn, stop_btn, chatbot],
+            stop_func,
+            [history_input],
+            [submit_btn, stop_btn, *history_outputs],
             queue=False,
             show_progress="hidden",
             cancels=[enter_generation, click_generation],
@@ -0,0 +1,233 @@
+"""
+Batched, concurrent and cached embeddings
+
+- Texts are grouped into batches by count and by total characters; when the API rejects
+  a batch as too large, it is split in half and later batches use the smaller size
+- Batches are sent from a thread pool, at most max_concurrency requests in flight and
+  at most requests_per_second requests started per second
+- Rate limits, timeouts, connection errors and 5xx responses are retried with exponential backoff
+- Vectors are cached in SQLite by a hash of (model, dimensions, text), so re-indexing
+  unchanged chunks sends no request
+
+Run this file directly to measure throughput against a simulated API:
+    python examples/embedding_client.py
+"""
+
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import openai
+from langchain_core.embeddings import Embeddings
+
+# Errors worth retrying: the request may succeed if sent again later
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+# Phrases in a 400 response that mean the batch is too big; other bad requests are not split
+SIZE_ERROR_HINTS = ("token", "too long", "too large", "too many", "larger than", "length", "exceed")
+
+
+def is_size_error(error: openai.BadRequestError) -> bool:
+    """Whether the API rejected the request because of its size or token count"""
+    return any(hint in str(error).lower() for hint in SIZE_ERROR_HINTS)
+
+
+class RateLimiter:
+    """Spaces out request start times so that at most `rate` requests start per second"""
+
+    def __init__(self, rate: float | None):
+        self.interval = 1 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+class EmbeddingCache:
+    """Persistent vector cache: sha256(namespace + text) -> float32 vector"""
+
+    def __init__(self, path: str = ".cache/embeddings.sqlite"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(namespace: str, text: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: dict[str, list[float]]) -> None:
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings base class: subclasses implement `_embed_batch` (one API request)
+    and `namespace` (identifies the model and its settings in the cache)
+    """
+
+    namespace = ""
+
+    def __init__(
+        self,
+        batch_size: int = 10,
+        max_batch_chars: int = 30000,
+        max_concurrency: int = 4,
+        requests_per_second: float | None = None,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        cache: EmbeddingCache | None = None,
+    ):
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self._limiter = RateLimiter(requests_per_second)
+        # Guards the counters and batch_size, which worker threads update
+        self._stats_lock = threading.Lock()
+        self.requests = 0  # API requests sent, including retries
+        self.retries = 0
+        self.cache_hits = 0
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        batches, batch, chars = [], [], 0
+        for text in texts:
+            if batch and (
+                len(batch) >= self.batch_size or chars + len(text) > self.max_batch_chars
+            ):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _send(self, texts: list[str]) -> list[list[float]]:
+        """Send one batch, retrying transient errors and splitting batches that are too large"""
+        for attempt in range(self.max_retries + 1):
+            self._limiter.wait()
+            with self._stats_lock:
+                self.requests += 1
+            try:
+                return self._embed_batch(texts)
+            except openai.BadRequestError as error:
+                if len(texts) == 1 or not is_size_error(error):
+                    raise
+                # The batch is over the API's size limit: split it and use smaller batches from now on
+                half = len(texts) // 2
+                with self._stats_lock:
+                    self.batch_size = min(self.batch_size, half)
+                return self._send(texts[:half]) + self._send(texts[half:])
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(self.backoff * 2**attempt * (0.5 + random.random()))
+        raise AssertionError("unreachable")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [EmbeddingCache.key(self.namespace, text) for text in texts]
+        vectors = self.cache.get_many(keys) if self.cache else {}
+        self.cache_hits += sum(key in vectors for key in keys)
+
+        # Embed each distinct missing text once
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            batches = self._batches(list(missing.values()))
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                # Each batch is cached as soon as it is collected, so an interrupted run keeps its progress
+                for batch, result in zip(batches, pool.map(self._send, batches)):
+                    fresh = {
+                        EmbeddingCache.key(self.namespace, t): v for t, v in zip(batch, result)
+                    }
+                    if self.cache:
+                        self.cache.put_many(fresh)
+                    vectors.update(fresh)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+if __name__ == "__main__":
+
+    class SimulatedEmbeddings(BatchedEmbeddings):
+        """Simulated API: fixed latency per request, no network"""
+
+        namespace = "simulated"
+
+        def _embed_batch(self, texts):
+            time.sleep(0.05)
+            return [[float(len(text)), 1.0] for text in texts]
+
+    texts = [f"chunk {i} " + "x" * random.randrange(200, 1000) for i in range(400)]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Indexing {len(texts)} chunks, 50ms per request, batches of 10:")
+        for concurrency in (1, 2, 4, 8):
+            embeddings = SimulatedEmbeddings(max_concurrency=concurrency)
+            start = time.perf_counter()
+            embeddings.embed_documents(texts)
+            elapsed = time.perf_counter() - start
+            print(
+                f"  concurrency {concurrency}: {elapsed:5.2f}s  "
+                f"{len(texts) / elapsed:7.0f} chunks/s  requests {embeddings.requests}"
+            )
+
+        cache = EmbeddingCache(os.path.join(tmp, "embeddings.sqlite"))
+        SimulatedEmbeddings(max_concurrency=8, cache=cache).embed_documents(texts)
+        embeddings = SimulatedEmbeddings(max_concurrency=8, cache=cache)
+        start = time.perf_counter()
+        embeddings.embed_documents(texts + ["new chunk"])
+        print(
+            f"  re-index with cache: {time.perf_counter() - start:5.2f}s  "
+            f"requests {embeddings.requests}  cache hits {embeddings.cache_hits}"
+        )
+        cache.close()
@@ -11,12 +11,13 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from langchain_openai import ChatOpenAI
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_core.embeddings import Embeddings
-from langchain_core.vectorstores import InMemoryVectorStore
 from langchain.agents import create_agent
 from langchain.tools import tool
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from embedding_client import BatchedEmbeddings, EmbeddingCache
+from vector_index import NumpyVectorStore
+
 
 # Load model configuration
 load_dotenv()
@@ -38,35 +39,33 @@ client = OpenAI(
 
 
 # DashScope compatible OpenAIEmbeddings implementation
-class DashScopeEmbeddings(Embeddings):
-    def __init__(self, model: str = "text-embedding-v4", dimensions: int = 1024):
+# Batching, concurrency, retries and caching come from BatchedEmbeddings (see embedding_client.py)
+class DashScopeEmbeddings(BatchedEmbeddings):
+    def __init__(self, model: str = "text-embedding-v4", dimensions: int = 1024, **kwargs):
+        # text-embedding-v4 accepts at most 10 texts per request
+        kwargs.setdefault("batch_size", 10)
+        super().__init__(**kwargs)
         self.model = model
         self.dimensions = dimensions
+        self.namespace = f"dashscope:{model}:{dimensions}"
 
-    def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        out: list[list[float]] = []
-        for i in range(0, len(texts), 10):
-            chunk = texts[i : i + 10]
-            r = client.embeddings.create(
-                model=self.model,
-                input=chunk,
-                dimensions=self.dimensions,
-            )
-            out.extend([d.embedding for d in r.data])
-        return out
-
-    def embed_query(self, text: str) -> list[float]:
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
         r = client.embeddings.create(
             model=self.model,
-            input=[text],
+            input=texts,
             dimensions=self.dimensions,
         )
-        return r.data[0].embedding
+        return [d.embedding for d in sorted(r.data, key=lambda d: d.index)]
 
 
 # Initialize in-memory vector store
-embeddings = DashScopeEmbeddings()
-vector_store = InMemoryVectorStore(embedding=embeddings)
+# Vectors are cached on disk, so running this script again does not re-embed unchanged chunks
+embeddings = DashScopeEmbeddings(
+    max_concurrency=4,
+    requests_per_second=10,
+    cache=EmbeddingCache(".cache/embeddings.sqlite"),
+)
+vector_store = NumpyVectorStore(embedding=embeddings)
 
 bs4_strainer = bs4.SoupStrainer(class_=("post"))
 loader = WebBaseLoader(
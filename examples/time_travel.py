@@ -1,11 +1,16 @@
+import hashlib
+import json
 import os
+import time
 import uuid
 
 from dotenv import load_dotenv
 from typing_extensions import TypedDict, NotRequired
 from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
+from langgraph.cache.memory import InMemoryCache
 from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import CachePolicy
 
 
 # Load model configuration
@@ -26,6 +31,42 @@ class State(TypedDict):
     joke: NotRequired[str]
 
 
+# Opt-in node memo (MEMOIZE_NODES=1): when replaying from a fork, a node whose inputs
+# are unchanged returns its previous output instead of calling the LLM again.
+# Off by default, since a memoized LLM call always returns the same answer for the same state.
+MEMOIZE_NODES = os.getenv("MEMOIZE_NODES", "").lower() in ("1", "true", "yes")
+
+# The state keys in each node's memo key; the key is the node name plus a hash of this slice.
+# generate_topic takes no input, so its key covers the whole state: a fork whose state was
+# edited generates a new topic, while a run from the same state reuses the memoized one.
+NODE_INPUTS = {
+    "generate_topic": ("topic", "joke"),
+    "write_joke": ("topic",),
+}
+
+# Execution time of each (node, input hash), used to report the latency saved by the memo
+node_seconds = {}
+
+
+def input_hash(node, state):
+    """Hash of the state slice a node reads"""
+    state_slice = {key: state.get(key) for key in NODE_INPUTS[node]}
+    data = json.dumps(state_slice, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def timed(node, fn):
+    """Record how long a node takes for each input"""
+
+    def run(state: State):
+        start = time.perf_counter()
+        result = fn(state)
+        node_seconds[node, input_hash(node, state)] = time.perf_counter() - start
+        return result
+
+    return run
+
+
 def generate_topic(state: State):
     """Call LLM to generate a joke topic"""
     msg = llm.invoke("请写一个有趣的笑话主题")
@@ -42,8 +83,11 @@ def write_joke(state: State):
 workflow = StateGraph(State)
 
 # Add nodes
-workflow.add_node("generate_topic", generate_topic)
-workflow.add_node("write_joke", write_joke)
+for name, node in [("generate_topic", generate_topic), ("write_joke", write_joke)]:
+    policy = None
+    if MEMOIZE_NODES:
+        policy = CachePolicy(key_func=lambda state, name=name: input_hash(name, state))
+    workflow.add_node(name, timed(name, node), cache_policy=policy)
 
 # Connect node edges
 workflow.add_edge(START, "generate_topic")
@@ -52,7 +96,34 @@ workflow.add_edge("write_joke", END)
 
 # Compile
 checkpointer = InMemorySaver()
-graph = workflow.compile(checkpointer=checkpointer)
+graph = workflow.compile(
+    checkpointer=checkpointer,
+    cache=InMemoryCache() if MEMOIZE_NODES else None,
+)
+
+
+def run(input, config):
+    """Run the graph, report which nodes were skipped by the memo, and return the final state"""
+    inputs = {}
+    saved = 0.0
+    for mode, chunk in graph.stream(input, config, stream_mode=["tasks", "updates"]):
+        if mode == "tasks":
+            if "input" in chunk:  # Task start event
+                inputs[chunk["name"]] = chunk["input"]
+            continue
+        cached = chunk.pop("__metadata__", {}).get("cached", False)
+        for node in chunk:
+            seconds = node_seconds.get((node, input_hash(node, inputs[node])), 0.0)
+            if cached:
+                saved += seconds
+                print(f"[memo] {node}: inputs unchanged, skipped (saved {seconds:.2f}s)")
+            else:
+                print(f"[memo] {node}: executed in {seconds:.2f}s")
+    if saved:
+        print(f"[memo] latency saved: {saved:.2f}s")
+    thread = {"configurable": {"thread_id": config["configurable"]["thread_id"]}}
+    return graph.get_state(thread).values
+
 
 # Execute workflow
 config = {
@@ -60,7 +131,7 @@ config = {
         "thread_id": uuid.uuid4(),
     }
 }
-state = graph.invoke({}, config)
+state = run({}, config)
 
 print(state["topic"])
 print()
@@ -79,13 +150,18 @@ selected_state = states[1]
 print(selected_state.next)
 print(selected_state.values)
 
+# Replay from the selected checkpoint without changes: write_joke's input (topic) is
+# the same as in the first run, so with MEMOIZE_NODES=1 it is served from the memo
+replayed = run(None, selected_state.config)
+print(replayed["joke"])
+
 # Create a new checkpoint, which will be associated with the same thread but with a new checkpoint ID
 new_config = graph.update_state(selected_state.config, values={"topic": "蘑菇"})
 new_config = graph.update_state(new_config, values={"joke": ""})
 print(new_config)
 
-# Resume execution from checkpoint
-new_state = graph.invoke(None, new_config)
+# Resume execution from checkpoint; the topic changed, so write_joke runs again
+new_state = run(None, new_config)
 
 print(new_state["topic"])
 print()
@@ -0,0 +1,311 @@
+"""
+NumPy vector store for RAG retrieval
+
+- Embeddings are L2-normalized once when added and kept in one contiguous float32 matrix,
+  so cosine similarity for all chunks is a single matrix-vector product
+- Top-k uses argpartition (O(n)) and only sorts the k best scores
+- Appends grow the matrix geometrically; deletes move the last row into the freed slot,
+  so both are amortized O(1) per chunk and the matrix stays contiguous
+- save() writes the matrix as a .npy file and the documents as JSON; load() memory-maps
+  the matrix instead of reading it, pages are read from disk on demand and copied into
+  memory only when the loaded store is modified
+
+Run this file directly to benchmark against InMemoryVectorStore:
+    python examples/vector_index.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+class NumpyVectorStore(VectorStore):
+    """Cosine-similarity vector store backed by a contiguous float32 matrix"""
+
+    def __init__(self, embedding: Embeddings, dimensions: int | None = None):
+        self.embedding = embedding
+        self._matrix = np.empty((0, dimensions or 0), dtype=np.float32)
+        self._size = 0  # Rows in use; rows beyond this are spare capacity
+        self._ids: list[str] = []
+        self._docs: list[tuple[str, dict]] = []  # (page_content, metadata) per row
+        self._rows: dict[str, int] = {}  # id -> row
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, rows: int, dimensions: int) -> None:
+        if self._size and dimensions != self._matrix.shape[1]:
+            raise ValueError(f"expected {self._matrix.shape[1]}-dim vectors, got {dimensions}")
+        needed = self._size + rows
+        if (
+            needed <= self._matrix.shape[0]
+            and dimensions == self._matrix.shape[1]
+            and self._matrix.flags.writeable
+        ):
+            return
+        # Grow geometrically; a read-only memory-mapped matrix is copied into memory on the first write
+        capacity = max(needed, int(self._matrix.shape[0] * 1.5), 1024)
+        matrix = np.empty((capacity, dimensions), dtype=np.float32)
+        if self._size:
+            matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]] | np.ndarray,
+        metadatas: Sequence[dict] | None = None,
+        ids: Sequence[str] | None = None,
+    ) -> list[str]:
+        """
+        Add chunks whose vectors are already computed; existing ids are replaced,
+        and when an id appears more than once in one call the last chunk wins
+        """
+        if not len(texts):
+            return []
+        vectors = _normalize(embeddings).reshape(len(texts), -1)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        returned = ids
+        last = {id_: i for i, id_ in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+        replaced = [i for i in ids if i in self._rows]
+        if replaced:
+            self.delete(replaced)
+
+        self._reserve(len(texts), vectors.shape[1])
+        start = self._size
+        self._matrix[start : start + len(texts)] = vectors
+        self._size += len(texts)
+        self._ids.extend(ids)
+        self._docs.extend(zip(texts, metadatas))
+        self._rows.update((id_, start + i) for i, id_ in enumerate(ids))
+        return returned
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        if ids and self._size:
+            self._reserve(0, self._matrix.shape[1])
+        for id_ in ids or []:
+            row = self._rows.pop(id_, None)
+            if row is None:
+                continue
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the gap so the used rows stay contiguous
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._docs[row] = self._docs[last]
+                self._rows[self._ids[row]] = row
+            self._ids.pop()
+            self._docs.pop()
+            self._size = last
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        return [self._document(self._rows[i]) for i in ids if i in self._rows]
+
+    def _document(self, row: int) -> Document:
+        text, metadata = self._docs[row]
+        return Document(id=self._ids[row], page_content=text, metadata=metadata)
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: Sequence[float] | np.ndarray,
+        k: int = 4,
+        filter: Callable[[Document], bool] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Top-k documents by cosine similarity; `filter` is applied to candidates in score order"""
+        if not self._size or k <= 0:
+            return []
+        scores = self._matrix[: self._size] @ _normalize(embedding)
+        if filter is None:
+            k = min(k, self._size)
+            top = np.argpartition(scores, self._size - k)[self._size - k :]
+            rows = top[np.argsort(scores[top])[::-1]]
+        else:
+            rows = np.argsort(scores)[::-1]
+        results = []
+        for row in rows:
+            doc = self._document(int(row))
+            if filter is None or filter(doc):
+                results.append((doc, float(scores[row])))
+                if len(results) == k:
+                    break
+        return results
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [
+            doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1]; relevance scores are expected in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def save(self, path: str) -> None:
+        """Write the index to a directory: vectors.npy (float32 matrix) and docs.json"""
+        os.makedirs(path, exist_ok=True)
+        matrix = np.lib.format.open_memmap(
+            os.path.join(path, "vectors.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(self._size, self._matrix.shape[1]),
+        )
+        matrix[:] = self._matrix[: self._size]
+        matrix.flush()
+        del matrix
+        with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "docs": self._docs}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "NumpyVectorStore":
+        """Open an index written by save(); the matrix is memory-mapped read-only"""
+        store = cls(embedding)
+        store._matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        store._ids = data["ids"]
+        store._docs = [tuple(doc) for doc in data["docs"]]
+        store._rows = {id_: row for row, id_ in enumerate(store._ids)}
+        store._size = len(store._ids)
+        return store
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from langchain_core.vectorstores import InMemoryVectorStore
+
+    class RandomEmbeddings(Embeddings):
+        """Random query vectors; the benchmark measures search, not embedding"""
+
+        def __init__(self, dimensions: int):
+            self.dimensions = dimensions
+            self.rng = np.random.default_rng(1)
+
+        def embed_documents(self, texts):
+            return self.rng.standard_normal((len(texts), self.dimensions)).tolist()
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    def best_time(fn, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    parser = argparse.ArgumentParser(description="NumpyVectorStore vs InMemoryVectorStore")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="Queries per measurement")
+    parser.add_argument(
+        "--baseline-max", type=int, default=100_000, help="Largest size for InMemoryVectorStore"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embedding = RandomEmbeddings(args.dimensions)
+    query = embedding.embed_query("query")
+    print(f"{args.dimensions}-dim vectors, top-{args.k}, best of {args.repeat} queries")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dimensions), dtype=np.float32)
+        texts = [f"chunk {i}" for i in range(size)]
+        store = NumpyVectorStore(embedding)
+        start = time.perf_counter()
+        store.add_embeddings(texts, vectors)
+        added = time.perf_counter() - start
+        search = best_time(lambda: store.similarity_search_by_vector(query, args.k), args.repeat)
+        line = f"{size:>9,} chunks  add {added * 1000:8.1f}ms  search {search * 1000:8.2f}ms"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store.save(tmp)
+            start = time.perf_counter()
+            loaded = NumpyVectorStore.load(tmp, embedding)
+            opened = time.perf_counter() - start
+            mapped = best_time(
+                lambda: loaded.similarity_search_by_vector(query, args.k), args.repeat
+            )
+            assert [d.id for d in loaded.similarity_search_by_vector(query, args.k)] == [
+                d.id for d in store.similarity_search_by_vector(query, args.k)
+            ]
+            del loaded
+        line += f"  load {opened * 1000:6.1f}ms  search (mmap) {mapped * 1000:8.2f}ms"
+
+        if size <= args.baseline_max:
+            baseline = InMemoryVectorStore(embedding)
+            # Fill the store directly instead of calling the embedding model
+            baseline.store = {
+                str(i): {"id": str(i), "vector": v, "text": t, "metadata": {}}
+                for i, (v, t) in enumerate(zip(vectors.tolist(), texts))
+            }
+            slow = best_time(
+                lambda: baseline.similarity_search_by_vector(query, args.k), args.repeat
+            )
+            line += f"  InMemoryVectorStore {slow * 1000:9.2f}ms ({slow / search:.0f}x)"
+        print(line)
+        del store, vectors
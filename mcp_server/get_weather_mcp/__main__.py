@@ -7,6 +7,18 @@ from . import server
 
 host = os.getenv("HOST", "127.0.0.1")
 port = int(os.getenv("PORT", 8000))
+# Number of worker processes for the http transport
+workers = int(os.getenv("WORKERS", 1))
+
+
+def create_app():
+    """ASGI app for multi-worker serving.
+
+    Each worker process builds its own app. MCP sessions live in process memory
+    and cannot follow a request to another worker, so the app is stateless: every
+    request is self-contained and any worker can answer it.
+    """
+    return server.mcp.http_app(path="/mcp", stateless_http=True, json_response=True)
 
 
 def stdio():
@@ -16,6 +28,19 @@ def stdio():
 
 def http():
     """streamable-http entry point for the package."""
+    if workers > 1:
+        import uvicorn
+
+        # Workers share one listening socket; the kernel spreads connections across them
+        uvicorn.run(
+            f"{__package__}.__main__:create_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            log_level="warning",
+        )
+        return
     asyncio.run(server.mcp.run(transport="http", host=host, port=port, path="/mcp"))
 
 
@@ -4,6 +4,8 @@ from fastmcp import FastMCP
 
 mcp = FastMCP("get_weather_mcp")
 
+MAX_BATCH_SIZE = 100  # cities per get_weather_batch call
+
 
 @mcp.tool
 def get_weather(city: str) -> str:
@@ -11,5 +13,15 @@ def get_weather(city: str) -> str:
     return f"It's always sunny in {city}!"
 
 
+@mcp.tool
+def get_weather_batch(cities: list[str]) -> list[dict]:
+    """Get weather for several cities in one call.
+    Returns one item per city, in order: {"result": weather} or {"error": message}.
+    """
+    if len(cities) > MAX_BATCH_SIZE:
+        raise ValueError(f"Too many cities. Maximum {MAX_BATCH_SIZE} allowed.")
+    return [{"result": get_weather(city)} for city in cities]
+
+
 if __name__ == "__main__":
     mcp.run()
@@ -1,50 +1,49 @@
 # -*- coding: utf-8 -*-
 from fastmcp import FastMCP
-import ast
 import re
 
+# The arithmetic engine is app/tools/eval_core.py (stdlib only), shared with the app under the
+# same module name; start the server with the repository's app/ directory on PYTHONPATH.
+from tools.eval_core import EvalError, EvalLimits, evaluate
+
 
 mcp = FastMCP("math_mcp")
 
+# Resource limits for a single evaluation
+MAX_OPERATIONS = 500  # AST nodes
+MAX_RESULT_BITS = 4096  # size of any integer result (~1233 decimal digits)
+EVAL_TIMEOUT = 1.0  # seconds
+MAX_BATCH_SIZE = 100  # questions per math_batch call
+
+LIMITS = EvalLimits(max_nodes=MAX_OPERATIONS, max_bits=MAX_RESULT_BITS, timeout=EVAL_TIMEOUT)
+
+# EvalError kinds that mean the expression exceeded the evaluation budget
+_LIMIT_MESSAGES = {
+    "too_long": "Expression too complex after normalization",
+    "too_complex": "Expression too complex - operation budget exceeded",
+    "too_large": f"Result too large - exceeds {MAX_RESULT_BITS} bits",
+    "timeout": "Expression took too long to evaluate",
+}
+
 
-def _eval_ast(node):
-    """Safely evaluate a restricted arithmetic AST node."""
-    if isinstance(node, ast.Expression):
-        return _eval_ast(node.body)
-    if isinstance(node, ast.BinOp):
-        left = _eval_ast(node.left)
-        right = _eval_ast(node.right)
-        op = node.op
-        if isinstance(op, ast.Add):
-            return left + right
-        if isinstance(op, ast.Sub):
-            return left - right
-        if isinstance(op, ast.Mult):
-            return left * right
-        if isinstance(op, ast.Div):
-            return left / right
-        if isinstance(op, ast.Mod):
-            return left % right
-        if isinstance(op, ast.Pow):
-            return left**right
-        if isinstance(op, ast.FloorDiv):
-            return left // right
-        raise ValueError("Unsupported operation")
-    if isinstance(node, ast.UnaryOp):
-        operand = _eval_ast(node.operand)
-        if isinstance(node.op, ast.UAdd):
-            return +operand
-        if isinstance(node.op, ast.USub):
-            return -operand
-        raise ValueError("Unsupported unary operation")
-    if isinstance(node, ast.Constant):
-        if isinstance(node.value, (int, float)):
-            return node.value
-        raise ValueError("Unsupported constant type")
-    # For compatibility if ast.Num appears (older Python)
-    if isinstance(node, ast.Num):
-        return node.n
-    raise ValueError("Unsupported expression element")
+class EvaluationLimitError(ValueError):
+    """Raised when an expression exceeds the evaluation budget."""
+
+
+def _evaluate(expr: str) -> int | float:
+    """Evaluate a normalized arithmetic expression with the shared eval_core engine."""
+    try:
+        result = evaluate(expr, functions="none", limits=LIMITS)
+    except EvalError as e:
+        if e.kind == "zero_division":
+            raise ValueError("Division by zero is not allowed") from None
+        if e.kind in _LIMIT_MESSAGES:
+            raise EvaluationLimitError(_LIMIT_MESSAGES[e.kind]) from None
+        raise ValueError(f"Failed to evaluate expression: {expr}") from e
+    # e.g. (-8) ** 0.5 is a complex number
+    if not isinstance(result, (int, float)):
+        raise ValueError(f"Failed to evaluate expression: {expr}")
+    return result
 
 
 def _normalize_expression(text: str) -> str:
@@ -62,11 +61,7 @@ def _normalize_expression(text: str) -> str:
     return expr
 
 
-@mcp.tool
-def math(question: str) -> int | float:
-    """Solve a natural-language arithmetic question, e.g. "what's (3 + 5) x 12?".
-    Returns a number; integers are returned without a decimal.
-    """
+def _solve(question: str) -> int | float:
     # Security: Limit input length to prevent DoS attacks
     if len(question) > 1000:
         raise ValueError("Input too long. Maximum 1000 characters allowed.")
@@ -79,15 +74,7 @@ def math(question: str) -> int | float:
     if len(expr) > 200:
         raise ValueError("Expression too complex after normalization")
 
-    try:
-        parsed = ast.parse(expr, mode="eval")
-        result = _eval_ast(parsed)
-    except ZeroDivisionError:
-        raise ValueError("Division by zero is not allowed")
-    except RecursionError:
-        raise ValueError("Expression too complex - recursion depth exceeded")
-    except Exception as e:
-        raise ValueError(f"Failed to evaluate expression: {expr}") from e
+    result = _evaluate(expr)
 
     # Return int if it is an integer value, else float
     if isinstance(result, float) and result.is_integer():
@@ -95,5 +82,30 @@ def math(question: str) -> int | float:
     return result
 
 
+@mcp.tool
+def math(question: str) -> int | float:
+    """Solve a natural-language arithmetic question, e.g. "what's (3 + 5) x 12?".
+    Returns a number; integers are returned without a decimal.
+    """
+    return _solve(question)
+
+
+@mcp.tool
+def math_batch(questions: list[str]) -> list[dict]:
+    """Solve several arithmetic questions in one call, e.g. ["1 + 1", "what's 3 * 4?"].
+    Returns one item per question, in order: {"result": number} or {"error": message}.
+    """
+    if len(questions) > MAX_BATCH_SIZE:
+        raise ValueError(f"Too many questions. Maximum {MAX_BATCH_SIZE} allowed.")
+    # Evaluation is pure CPU work, so running the items in order is the fastest way here
+    results = []
+    for question in questions:
+        try:
+            results.append({"result": _solve(question)})
+        except ValueError as e:
+            results.append({"error": str(e)})
+    return results
+
+
 if __name__ == "__main__":
     mcp.run()
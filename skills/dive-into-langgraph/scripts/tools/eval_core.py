@@ -0,0 +1,326 @@
+"""
+算术表达式求值核心
+
+app/tools/tool_sci.py、mcp_server/math_mcp/server.py 与 skills 中的 tool_math.py 共用这一实现。
+math_mcp 以 tools.eval_core 导入本文件（PYTHONPATH 包含 app/）；skill 单独安装，
+带一份相同的副本 skills/dive-into-langgraph/scripts/tools/eval_core.py，由测试保证两者一致。
+这里只依赖标准库。
+
+- 解析结果按 (表达式, 变量, 函数表, 资源上限) 缓存
+- 编译时做常量折叠：不含变量的子表达式只计算一次
+- 编译与求值都用显式栈迭代完成，不会因嵌套过深而递归溢出
+- 整数幂与乘法在计算前估算结果位数，配合节点数与时间上限限制单次计算的开销
+"""
+
+import ast
+import math
+import operator
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class EvalLimits:
+    """
+    计算的资源上限
+
+    表达式中没有循环，每个节点只计算一次，所以节点数就是运算次数的上限；
+    整数运算在计算前按位数估算结果大小，超出上限时直接拒绝，避免 9**9**9 这样的输入占满 CPU 和内存。
+    """
+
+    max_length: int = 10_000  # 表达式的最大长度（字符）
+    max_nodes: int = 1_000  # 语法树节点数上限
+    max_bits: int = 4_096  # 整数结果的最大位数（约 1233 位十进制）
+    timeout: float = 1.0  # 单次计算的时间上限（秒）
+
+
+DEFAULT_LIMITS = EvalLimits()
+
+# 编译结果缓存的条目数
+COMPILE_CACHE_SIZE = 1024
+
+
+class EvalError(ValueError):
+    """
+    表达式无法计算
+
+    kind 便于调用方按类别转换错误信息：
+    empty / syntax / unsupported / zero_division / math / too_long / too_complex / too_large / timeout
+    """
+
+    def __init__(self, message: str, kind: str) -> None:
+        super().__init__(message)
+        self.kind = kind
+
+
+# 支持的二元运算
+BIN_OPS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.Mod: operator.mod,
+    ast.FloorDiv: operator.floordiv,
+}
+
+# 支持的一元运算
+UNARY_OPS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# 函数表：名称 -> {函数名: 单参数函数}
+FUNCTION_TABLES: Dict[str, Mapping[str, Callable[[Any], Any]]] = {
+    "math": {
+        "sqrt": math.sqrt,
+        "exp": math.exp,
+        "log": math.log,
+        "log2": math.log2,
+        "log10": math.log10,
+        "sin": math.sin,
+        "cos": math.cos,
+        "tan": math.tan,
+        "abs": abs,
+    },
+    "none": {},
+}
+
+
+def register_functions(name: str, functions: Mapping[str, Callable[[Any], Any]]) -> None:
+    """注册函数表，之后可以在 compile_expression 中按名称使用"""
+    FUNCTION_TABLES[name] = dict(functions)
+
+
+# ── 受限运算 ──────────────────────────────────────────────────────────────────
+
+
+def _too_large(max_bits: int) -> EvalError:
+    return EvalError(f"结果过大: 超过 {max_bits} 位", "too_large")
+
+
+def _guarded_ops(limits: EvalLimits) -> Dict[type, Callable[[Any, Any], Any]]:
+    """把可能产生巨大整数的运算替换为先估算结果大小的版本"""
+    max_bits = limits.max_bits
+
+    def pow_(left, right):
+        # 整数幂的结果位数约为 底数位数 × 指数；用下界估算，实际位数不超过该值的两倍
+        if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1:
+            if (left.bit_length() - 1) * right > max_bits:
+                raise _too_large(max_bits)
+            result = left**right
+            if result.bit_length() > max_bits:
+                raise _too_large(max_bits)
+            return result
+        return left**right
+
+    def mul(left, right):
+        # 整数乘积的位数不超过两个因数位数之和
+        if isinstance(left, int) and isinstance(right, int):
+            if left.bit_length() + right.bit_length() - 1 > max_bits:
+                raise _too_large(max_bits)
+        return left * right
+
+    return {**BIN_OPS, ast.Pow: pow_, ast.Mult: mul}
+
+
+# ── 编译 ──────────────────────────────────────────────────────────────────────
+
+# 指令
+_CONST = 0  # 压入常量
+_LOAD = 1  # 压入变量
+_UNARY = 2  # 弹出一个值，压入 arg(值)：一元运算与函数调用
+_BINARY = 3  # 弹出两个值，压入 arg(左, 右)
+_POW = 4  # 同 _BINARY，计算前检查是否超时
+
+Instruction = Tuple[int, Any]
+
+
+def _fold(code: list, arity: int, func: Callable[..., Any]) -> bool:
+    """操作数都是常量时直接计算；计算出错则保留指令，让错误在求值时按原样抛出"""
+    if len(code) < arity or any(op != _CONST for op, _ in code[-arity:]):
+        return False
+    args = [arg for _, arg in code[-arity:]]
+    try:
+        value = func(*args)
+    except Exception:
+        return False
+    del code[-arity:]
+    code.append((_CONST, value))
+    return True
+
+
+def _compile_tree(
+    tree: ast.Expression,
+    variables: frozenset,
+    functions: Mapping[str, Callable[[Any], Any]],
+    limits: EvalLimits,
+) -> Tuple[Instruction, ...]:
+    """
+    把语法树编译为后缀指令序列
+
+    校验按从左到右的先序进行，遇到的第一个不支持的元素即为报错内容；指令按后序生成。
+    常量折叠与求值受同样的资源上限约束。
+    """
+    bin_ops = _guarded_ops(limits)
+    deadline = time.perf_counter() + limits.timeout
+    code: list = []
+    # (节点, 子节点是否已处理)
+    stack: list = [(tree.body, False)]
+    while stack:
+        node, children_done = stack.pop()
+        node_type = type(node)
+
+        if children_done:
+            if node_type is ast.BinOp:
+                op_type = type(node.op)
+                func = bin_ops[op_type]
+                if op_type is ast.Pow and time.perf_counter() > deadline:
+                    raise EvalError("计算超时", "timeout")
+                if not _fold(code, 2, func):
+                    code.append((_POW if op_type is ast.Pow else _BINARY, func))
+            elif node_type is ast.UnaryOp:
+                func = UNARY_OPS[type(node.op)]
+                if not _fold(code, 1, func):
+                    code.append((_UNARY, func))
+            else:  # ast.Call
+                func = functions[node.func.id]
+                if not _fold(code, 1, func):
+                    code.append((_UNARY, func))
+            continue
+
+        if node_type is ast.BinOp:
+            op_type = type(node.op)
+            if op_type not in bin_ops:
+                raise EvalError(f"不支持的二元运算符: {op_type}", "unsupported")
+            stack.append((node, True))
+            stack.append((node.right, False))
+            stack.append((node.left, False))
+        elif node_type is ast.UnaryOp:
+            op_type = type(node.op)
+            if op_type not in UNARY_OPS:
+                raise EvalError(f"不支持的一元运算符: {op_type}", "unsupported")
+            stack.append((node, True))
+            stack.append((node.operand, False))
+        elif node_type is ast.Call:
+            if not isinstance(node.func, ast.Name):
+                raise EvalError("函数调用格式错误", "unsupported")
+            func_name = node.func.id
+            if func_name not in functions:
+                raise EvalError(f"不支持的函数: {func_name}", "unsupported")
+            if len(node.args) != 1:
+                raise EvalError(f"{func_name} 函数需要且仅需要一个参数", "unsupported")
+            stack.append((node, True))
+            stack.append((node.args[0], False))
+        elif node_type is ast.Constant:
+            if not isinstance(node.value, (int, float)):
+                raise EvalError(
+                    f"只支持整数或浮点数，不支持 {type(node.value).__name__}", "unsupported"
+                )
+            code.append((_CONST, node.value))
+        elif node_type is ast.Name:
+            if node.id not in variables:
+                raise EvalError(f"不支持变量: {node.id}", "unsupported")
+            code.append((_LOAD, node.id))
+        else:
+            # 一切未列入白名单的节点，直接拒绝
+            raise EvalError(f"不支持的语法: {node_type.__name__}", "unsupported")
+
+    return tuple(code)
+
+
+# ── 求值 ──────────────────────────────────────────────────────────────────────
+
+
+class Program:
+    """编译后的表达式，可以反复求值"""
+
+    __slots__ = ("code", "limits")
+
+    def __init__(self, code: Tuple[Instruction, ...], limits: EvalLimits) -> None:
+        self.code = code
+        self.limits = limits
+
+    @property
+    def is_constant(self) -> bool:
+        """整个表达式是否已折叠为常量"""
+        return len(self.code) == 1 and self.code[0][0] == _CONST
+
+    def run(self, env: Optional[Mapping[str, Any]] = None) -> Any:
+        """求值；运行时错误统一转换为 EvalError"""
+        code = self.code
+        if len(code) == 1 and code[0][0] == _CONST:
+            return code[0][1]
+
+        deadline = time.perf_counter() + self.limits.timeout
+        stack: list = []
+        push = stack.append
+        pop = stack.pop
+        try:
+            for op, arg in code:
+                if op == _CONST:
+                    push(arg)
+                elif op == _LOAD:
+                    push(env[arg])
+                elif op == _UNARY:
+                    stack[-1] = arg(stack[-1])
+                else:
+                    right = pop()
+                    if op == _POW and time.perf_counter() > deadline:
+                        raise EvalError("计算超时", "timeout")
+                    stack[-1] = arg(stack[-1], right)
+        except EvalError:
+            raise
+        except ZeroDivisionError:
+            raise EvalError("除零错误", "zero_division") from None
+        except ValueError as e:
+            # 如 math domain error
+            raise EvalError(str(e), "math") from None
+        except Exception as e:
+            raise EvalError(f"无效的数学表达式: {str(e)}", "math") from None
+        return stack[-1]
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(
+    expression: str,
+    variables: Tuple[str, ...] = (),
+    functions: str = "math",
+    limits: EvalLimits = DEFAULT_LIMITS,
+) -> Program:
+    """
+    校验并编译表达式，结果会被缓存；校验失败时抛出 EvalError（不缓存）
+
+    :param variables: 允许出现的变量名
+    :param functions: FUNCTION_TABLES 中的函数表名称
+    :param limits: 资源上限
+    """
+    if not expression.strip():
+        raise EvalError("表达式不能为空", "empty")
+    if len(expression) > limits.max_length:
+        raise EvalError(f"表达式过长: 超过 {limits.max_length} 个字符", "too_long")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise EvalError(f"无效的数学表达式: {str(e)}", "syntax") from None
+    except (MemoryError, RecursionError):
+        # 解析器对极深的嵌套会直接放弃
+        raise EvalError("表达式过于复杂: 嵌套过深", "too_complex") from None
+    if sum(1 for _ in ast.walk(tree)) > limits.max_nodes:
+        raise EvalError(f"表达式过于复杂: 超过 {limits.max_nodes} 个节点", "too_complex")
+
+    code = _compile_tree(tree, frozenset(variables), FUNCTION_TABLES[functions], limits)
+    return Program(code, limits)
+
+
+def evaluate(
+    expression: str,
+    env: Optional[Mapping[str, Any]] = None,
+    functions: str = "math",
+    limits: EvalLimits = DEFAULT_LIMITS,
+) -> Any:
+    """编译（命中缓存时跳过）并求值"""
+    variables = tuple(sorted(env)) if env else ()
+    return compile_expression(expression, variables, functions, limits).run(env)